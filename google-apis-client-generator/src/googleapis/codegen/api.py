@@ -26,6 +26,13 @@ in the template which are language specific.
 The current way to make use of this class is to create a programming language
 specific subclass of Api, which adds annotations and template variables
 appropriate for that language.
+
+The parts of the tree are made when they are first used: the methods and sub
+resources of a resource when they are listed, and the schemas when one is
+looked up. So the discovery document must not be changed once an Api has been
+made from it. Anonymous schemas whose names clash are shared by whichever
+method or schema is made first, so all_schemas, ModelClasses and VisitAll make
+the whole tree first, in the order of the discovery document.
 TODO(user): Refactor this so that the API can be loaded first, then annotated.
 """
 
@@ -33,6 +40,7 @@ __author__ = 'aiuto@google.com (Tony Aiuto)'
 
 import copy
 import logging
+import threading
 
 
 from googleapis.codegen import data_types
@@ -94,6 +102,16 @@ class Api(template_objects.CodeObject):
     self._template_dir = None
     self._surface_features = {}
     self._schemas = {}
+    # Whether the named schemas have been made, or are being made.
+    self._schemas_built = False
+    self._building_schemas = False
+    # Whether every part of the tree has been made.
+    self._complete = False
+    # The anonymous schemas by their definitions, if identical ones are merged.
+    self._schemas_by_definition = None
+    self._merged_schema_count = 0
+    # Held while the parts of the tree are made.
+    self._lock = threading.RLock()
     self.void_type = data_types.Void(self)
 
     self.SetTemplateValue('className', self._class_name)
@@ -102,22 +120,22 @@ class Api(template_objects.CodeObject):
     self.SetTemplateValue('dataWrapper',
                           'dataWrapper' in discovery_doc.get('features', []))
 
-    self._BuildSchemaDefinitions()
-    self._BuildResourceDefinitions()
+    self._resource_dicts = self.values.get('resources', {})
+    self._resources = _LazyList(self, '_BuildResourceDefinitions')
     self.SetTemplateValue('resources', self._resources)
 
     # Make data models part of the api dictionary
-    self.SetTemplateValue('models', self.ModelClasses())
+    self.SetTemplateValue('models', _LazyList(self, 'ModelClasses'))
 
     # Replace methods dict with Methods
-    self._methods = []
-    for name, method_dict in self.values.get('methods', {}).iteritems():
-      self._methods.append(Method(self, name, method_dict))
+    self._method_dicts = self.values.get('methods', {})
+    self._methods = _LazyList(self, '_BuildMethods')
     self.SetTemplateValue('methods', self._methods)
 
     # Global parameters
     self._parameters = []
-    for name, param_dict in self.values.get('parameters', {}).iteritems():
+    for name, param_dict in sorted(
+        self.values.get('parameters', {}).iteritems()):
       self._parameters.append(Parameter(self, name, param_dict, self))
     self.SetTemplateValue('parameters', self._parameters)
 
@@ -131,30 +149,139 @@ class Api(template_objects.CodeObject):
         self._authscopes.append(AuthScope(self, value, auth_dict))
       self.SetTemplateValue('authscopes', self._authscopes)
 
+  def __getstate__(self):
+    state = dict(self.__dict__)
+    del state['_lock']
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._lock = threading.RLock()
+
   @property
   def all_schemas(self):
     """The dictonary of all the schema objects found in the API."""
+    self.BuildAll()
     return self._schemas
 
+  def BuildAll(self):
+    """Make every part of the API which has not been made yet.
+
+    The parts are made in the order of the discovery document: the named
+    schemas, then each resource's methods before its sub resources, then the
+    top level methods.
+    """
+    if not self._complete:
+      self.Build(self._BuildAll)
+
+  def Build(self, function):
+    """Call a function which makes part of the API tree.
+
+    Only one part of the tree is made at a time, and no Overlay is active
+    while it is made, so the part is shared by every Overlay.
+
+    Args:
+      function: (callable) The function to call.
+    Returns:
+      The result of function.
+    """
+    self._lock.acquire()
+    try:
+      return template_objects.CallOutsideOverlay(function)
+    finally:
+      self._lock.release()
+
+  def _BuildAll(self):
+    if self._complete:
+      return
+    self._BuildSchemaDefinitions()
+    for resource in self._resources:
+      resource.BuildAll()
+    len(self._methods)
+    self._complete = True
+
   def _BuildResourceDefinitions(self):
     """Loop over the resources in the discovery doc and build definitions."""
-    self._resources = []
-    for name, def_dict in self.values.get('resources', {}).iteritems():
-      resource = Resource(self, name, def_dict)
-      self._resources.append(resource)
+    return [Resource(self, name, def_dict) for name, def_dict
+            in sorted(self._resource_dicts.iteritems())]
+
+  def _BuildMethods(self):
+    """Loop over the top level methods in the discovery doc and build them."""
+    # They come after all the resources.
+    for resource in self._resources:
+      resource.BuildAll()
+    return [Method(self, name, method_dict) for name, method_dict
+            in sorted(self._method_dicts.iteritems())]
 
   def _BuildSchemaDefinitions(self):
     """Loop over the schemas in the discovery doc and build definitions."""
+    # Schemas looked up while the schemas are being made see those made so far.
+    if self._schemas_built or self._building_schemas:
+      return
+    self._building_schemas = True
     schemas = self.values.get('schemas')
     if schemas:
-      for name, def_dict in schemas.iteritems():
+      for name, def_dict in sorted(schemas.iteritems()):
         # Upgrade the string format schema to a dict.
         if isinstance(def_dict, unicode):
           def_dict = simplejson.loads(def_dict)
         self._schemas[name] = self.DataTypeFromJson(def_dict, name)
+    self._schemas_built = True
+
+  def MergeIdenticalSchemas(self):
+    """Make the anonymous schemas which are defined identically one class.
+
+    Objects defined in line, in method requests and responses or in schema
+    properties, are each made a class of their own. Once this is called, an
+    object defined exactly like one already made, descriptions included, uses
+    its class instead. The class keeps the name it was made with, which is the
+    name of its first use in the discovery document, but is no longer nested
+    in another class. It must be called before any schema is made.
+
+    Raises:
+      ValueError: if schemas have already been made.
+    """
+    if self._schemas_built or self._building_schemas:
+      raise ValueError('Schemas must be merged before any is made')
+    self._schemas_by_definition = {}
+
+  @property
+  def merged_schema_count(self):
+    """The number of anonymous schemas which used an identical one's class."""
+    self.BuildAll()
+    return self._merged_schema_count
+
+  def IdenticalSchema(self, def_dict):
+    """Returns the anonymous schema made from an identical definition.
+
+    Args:
+      def_dict: (dict) The definition of an anonymous object schema.
+    Returns:
+      (Schema) The schema made from an identical definition, now not nested
+      in any other, or None if there is none or schemas are not merged.
+    """
+    if self._schemas_by_definition is None:
+      return None
+    schema = self._schemas_by_definition.get(_DefinitionKey(def_dict))
+    if schema:
+      Trace('Merging identical schema %s' % schema.values['className'])
+      self._merged_schema_count += 1
+      schema.SetParent(None)
+    return schema
+
+  def AddAnonymousSchema(self, def_dict, schema):
+    """Note the schema made from an anonymous definition, to merge others with.
+
+    Args:
+      def_dict: (dict) The definition of an anonymous object schema.
+      schema: (Schema) The schema made from it.
+    """
+    if self._schemas_by_definition is not None:
+      self._schemas_by_definition.setdefault(_DefinitionKey(def_dict), schema)
 
   def ModelClasses(self):
     """Return all the top level model classes."""
+    self.BuildAll()
     ret = []
     for schema in self._schemas.values():
       if schema not in ret:
@@ -215,6 +342,8 @@ class Api(template_objects.CodeObject):
     Returns:
       Schema object or None if not found.
     """
+    if not self._schemas_built:
+      self.Build(self._BuildSchemaDefinitions)
     return self._schemas.get(schema_name, None)
 
   def VisitAll(self, func):
@@ -227,6 +356,7 @@ class Api(template_objects.CodeObject):
       func: (function) Method to call on each object.
     """
     Trace('Applying function to all nodes')
+    self.BuildAll()
     for resource in self.values['resources']:
       self._VisitResource(resource, func)
     # Top level methods
@@ -392,11 +522,19 @@ class Schema(data_types.DataType):
         props = def_dict.get('properties')
         if props:
           # This case 1 from above
+          # Schemas defined in line in another element are anonymous.
+          anonymous = parent is not None and not schema_id
+          if anonymous:
+            schema = api.IdenticalSchema(def_dict)
+            if schema:
+              return schema
           properties = []
           schema = Schema(api, name, def_dict, parent=parent)
+          if anonymous:
+            api.AddAnonymousSchema(def_dict, schema)
           if wire_name:
             schema.SetTemplateValue('wireName', wire_name)
-          for prop_name, prop_dict in props.iteritems():
+          for prop_name, prop_dict in sorted(props.iteritems()):
             Trace('  adding prop: %s to %s' % (prop_name, name))
             properties.append(Property(api, schema, prop_name, prop_dict))
           Trace('Marking %s fully defined' % schema.values['className'])
@@ -496,25 +634,36 @@ class Resource(template_objects.CodeObject):
   def __init__(self, api, name, def_dict):
     super(Resource, self).__init__(def_dict, api)
     self.ValidateName(name)
-    self._raw_def_dict = copy.deepcopy(def_dict)
     class_name = api.ToClassName(name, element_type='resource')
     self.SetTemplateValue('className', class_name)
     self.SetTemplateValue('wireName', name)
-    # Replace methods dict with Methods
-    self._methods = []
-    for name, method_dict in self.values.get('methods', {}).iteritems():
-      self._methods.append(Method(api, name, method_dict))
+    # Replace methods dict with Methods, when they are first used
+    self._method_dicts = self.values.get('methods', {})
+    self._methods = _LazyList(self, '_BuildMethods')
     self.SetTemplateValue('methods', self._methods)
-    # Get sub resources
-    self._resources = []
-    for name, r_def_dict in self.values.get('resources', {}).iteritems():
-      self._resources.append(Resource(api, name, r_def_dict))
+    # Get sub resources, when they are first used
+    self._resource_dicts = self.values.get('resources', {})
+    self._resources = _LazyList(self, '_BuildResources')
     self.SetTemplateValue('resources', self._resources)
 
   @property
   def methods(self):
     return self._methods
 
+  def BuildAll(self):
+    """Make the methods of this resource and its sub resources, recursively."""
+    len(self._methods)
+    for resource in self._resources:
+      resource.BuildAll()
+
+  def _BuildMethods(self):
+    return [Method(self._api, name, method_dict) for name, method_dict
+            in sorted(self._method_dicts.iteritems())]
+
+  def _BuildResources(self):
+    return [Resource(self._api, name, def_dict) for name, def_dict
+            in sorted(self._resource_dicts.iteritems())]
+
 
 class AuthScope(template_objects.CodeObject):
   """The definition of an auth scope."""
@@ -594,7 +743,7 @@ class Method(template_objects.CodeObject):
     order = self.values.get('parameterOrder', [])
     req_parameters = []
     opt_parameters = []
-    for name, def_dict in self.values.get('parameters', {}).items():
+    for name, def_dict in sorted(self.values.get('parameters', {}).items()):
       # Standard params are part of the generic request class
       if name not in ['alt']:
         param = Parameter(api, name, def_dict, self)
@@ -604,7 +753,7 @@ class Method(template_objects.CodeObject):
         if param.values['wireName'] in order:
           req_parameters.append(param)
         else:
-          # optional parameters are appended in the order they're declared.
+          # optional parameters are appended in order of their names.
           opt_parameters.append(param)
     # pylint: disable-msg=C6402
     req_parameters.sort(lambda x, y: cmp(order.index(x.values['wireName']),
@@ -794,6 +943,64 @@ class Enum(template_objects.CodeObject):
     self.SetTemplateValue('pairs', zip(names, values, descriptions))
 
 
+class _LazyList(object):
+  """A list of template objects, made the first time it is used.
+
+  The objects are made by a method of their owner, which is named rather than
+  held so the list can be pickled. They are made with Api.Build, so the list
+  may be used from several threads and Overlays at once.
+  """
+
+  def __init__(self, owner, builder):
+    """Create a _LazyList.
+
+    Args:
+      owner: (CodeObject) The object the list belongs to.
+      builder: (str) The name of the method of owner which returns the list.
+    """
+    self._owner = owner
+    self._builder = builder
+    self._items = None
+
+  def _Items(self):
+    if self._items is None:
+      self._owner.api.Build(self._Build)
+    return self._items
+
+  def _Build(self):
+    # Another thread may have made the list while this one waited for it.
+    if self._items is None:
+      self._items = getattr(self._owner, self._builder)()
+
+  def __iter__(self):
+    return iter(self._Items())
+
+  def __len__(self):
+    return len(self._Items())
+
+  def __getitem__(self, index):
+    return self._Items()[index]
+
+  def __contains__(self, item):
+    return item in self._Items()
+
+  def __eq__(self, other):
+    if isinstance(other, _LazyList):
+      other = other._Items()  # pylint: disable-msg=W0212
+    return self._Items() == other
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __repr__(self):
+    return repr(self._Items())
+
+
+def _DefinitionKey(def_dict):
+  """Returns a string which is the same for identical schema definitions."""
+  return simplejson.dumps(def_dict, sort_keys=True)
+
+
 def Trace(s):
   """Logic tracer for debuging."""
   logging.debug('>>> %s', s)
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A cache of loaded Apis.
+
+Loading a large discovery document, parsing it, validating the names and
+linking the schemas, costs much more than reading back the Api it made. An
+ApiCache keeps each Api it loads, pickled, in a directory, keyed by the
+SHA-256 of the discovery document and the version of the generator.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import cPickle as pickle
+import errno
+import hashlib
+import logging
+import os
+import tempfile
+
+from googleapis.codegen import discovery_subset
+from googleapis.codegen.anyjson import simplejson
+from googleapis.codegen.generator import ToolInformation
+
+# The version of the layout of the pickled Apis. Change it whenever the Api
+# classes change in a way that makes the Apis already cached unusable.
+_FORMAT_VERSION = 2
+
+# The extension of the cached Api files.
+_EXTENSION = '.api'
+
+
+class ApiCache(object):
+  """A directory of pickled Apis, each named by the key it was loaded for.
+
+  Apis are written to a temporary file and renamed into place, so several
+  generators may use the same cache at once. When the cache grows beyond its
+  size limit, the least recently used Apis are removed.
+  """
+
+  def __init__(self, root_path, max_size=None):
+    """Create a new ApiCache.
+
+    Args:
+      root_path: (str) The directory holding the cache. It will be created if
+        it does not exist.
+      max_size: (int) The number of bytes the cache may hold, or None for no
+        limit.
+    """
+    self._root_path = root_path
+    self._max_size = max_size
+    try:
+      os.makedirs(root_path, 0755)
+    except OSError, e:
+      if e.errno != errno.EEXIST:
+        raise
+
+  def LoadApi(self, discovery_json, api_class, resources=None, methods=None,
+              merge_identical_schemas=False):
+    """Returns the Api for a discovery document, from the cache if it is there.
+
+    Args:
+      discovery_json: (str) The text of the discovery document.
+      api_class: (class) The Api class to load the document as.
+      resources: (list) If given, the names or globs of the resources to load.
+        See discovery_subset.SelectParts.
+      methods: (list) If given, the names or globs of the methods to load.
+      merge_identical_schemas: (bool) If True, anonymous schemas defined
+        identically are made one class. See Api.MergeIdenticalSchemas.
+    Returns:
+      (Api) The Api.
+    Raises:
+      ValueError: if a resource or method selected matches nothing.
+    """
+    path = self.Path(discovery_json, api_class, resources, methods,
+                     merge_identical_schemas)
+    the_api = self._Read(path, api_class)
+    if the_api is None:
+      the_api = api_class(discovery_subset.SelectParts(
+          simplejson.loads(discovery_json), resources, methods))
+      if merge_identical_schemas:
+        the_api.MergeIdenticalSchemas()
+      # Cache the whole tree, not just the parts made when it is loaded.
+      the_api.BuildAll()
+      self._Write(path, the_api)
+      self.Evict()
+    return the_api
+
+  def Path(self, discovery_json, api_class, resources=None, methods=None,
+           merge_identical_schemas=False):
+    """Returns the path an Api is cached at.
+
+    Args:
+      discovery_json: (str) The text of the discovery document.
+      api_class: (class) The Api class the document is loaded as.
+      resources: (list) The names or globs of the resources loaded, if any.
+      methods: (list) The names or globs of the methods loaded, if any.
+      merge_identical_schemas: (bool) Whether identical schemas were merged.
+    Returns:
+      (str) The path of the cached Api.
+    """
+    sha = hashlib.sha256()
+    sha.update('%s\0%d\0%s.%s\0' % (ToolInformation()['version'],
+                                     _FORMAT_VERSION, api_class.__module__,
+                                     api_class.__name__))
+    if resources or methods or merge_identical_schemas:
+      sha.update(simplejson.dumps([sorted(resources or []),
+                                   sorted(methods or []),
+                                   bool(merge_identical_schemas)]) + '\0')
+    sha.update(discovery_json)
+    return os.path.join(self._root_path, sha.hexdigest() + _EXTENSION)
+
+  def Evict(self):
+    """Remove the least recently used Apis, until the cache fits its limit."""
+    if self._max_size is None:
+      return
+    entries = []
+    total_size = 0
+    for file_name in os.listdir(self._root_path):
+      if not file_name.endswith(_EXTENSION):
+        continue
+      path = os.path.join(self._root_path, file_name)
+      try:
+        stat = os.stat(path)
+      except OSError:
+        # Removed by another generator since it was listed.
+        continue
+      entries.append((stat.st_mtime, path, stat.st_size))
+      total_size += stat.st_size
+    for unused_mtime, path, size in sorted(entries):
+      if total_size <= self._max_size:
+        break
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      total_size -= size
+
+  def _Read(self, path, api_class):
+    """Returns the Api cached at a path, or None if there is not one."""
+    try:
+      f = open(path, 'rb')
+    except IOError:
+      return None
+    try:
+      try:
+        the_api = pickle.load(f)
+      finally:
+        f.close()
+    # A damaged or out of date entry is loaded again, and replaced.
+    except Exception, e:  # pylint: disable-msg=W0703
+      logging.warning('Ignoring unreadable cached API %s: %s', path, e)
+      return None
+    if not isinstance(the_api, api_class):
+      return None
+    # Mark it as recently used.
+    try:
+      os.utime(path, None)
+    except OSError:
+      pass
+    return the_api
+
+  def _Write(self, path, the_api):
+    """Write an Api to the cache. It is not cached if it can not be pickled."""
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=self._root_path)
+    try:
+      out = os.fdopen(fd, 'wb')
+      try:
+        pickle.dump(the_api, out, pickle.HIGHEST_PROTOCOL)
+      finally:
+        out.close()
+      os.rename(temp_path, path)
+    except (pickle.PicklingError, RuntimeError), e:
+      # Pickling a very deeply nested API exceeds the recursion limit.
+      logging.warning('Not caching API: %s', e)
+    finally:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
@@ -0,0 +1,97 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for api_cache."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import os
+import shutil
+import tempfile
+
+from google.apputils import basetest
+from googleapis.codegen import api_cache
+from googleapis.codegen.java_generator import JavaApi
+from googleapis.codegen.php_generator import PHPApi
+
+
+class ApiCacheTest(basetest.TestCase):
+
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def setUp(self):
+    self._root = tempfile.mkdtemp()
+    f = open(os.path.join(self._TEST_DATA_DIR, 'moderator.v1.json'))
+    self._discovery_json = f.read()
+    f.close()
+
+  def tearDown(self):
+    shutil.rmtree(self._root)
+
+  def _ClassNames(self, the_api):
+    return [schema.class_name for schema in the_api.ModelClasses()]
+
+  def testLoadApi(self):
+    cache = api_cache.ApiCache(self._root)
+    the_api = cache.LoadApi(self._discovery_json, JavaApi)
+    path = cache.Path(self._discovery_json, JavaApi)
+    self.assertTrue(os.path.exists(path))
+    self.assertEquals([os.path.basename(path)], os.listdir(self._root))
+
+    cached_api = api_cache.ApiCache(self._root).LoadApi(self._discovery_json,
+                                                        JavaApi)
+    self.assertTrue(isinstance(cached_api, JavaApi))
+    self.assertFalse(cached_api is the_api)
+    self.assertEquals(self._ClassNames(the_api), self._ClassNames(cached_api))
+    self.assertTrue(cached_api.SchemaByName('Series'))
+
+  def testKey(self):
+    cache = api_cache.ApiCache(self._root)
+    path = cache.Path(self._discovery_json, JavaApi)
+    self.assertNotEquals(path, cache.Path(self._discovery_json, PHPApi))
+    self.assertNotEquals(path, cache.Path(self._discovery_json + ' ', JavaApi))
+    self.assertNotEquals(path, cache.Path(self._discovery_json, JavaApi,
+                                          resources=['series']))
+    self.assertNotEquals(path, cache.Path(self._discovery_json, JavaApi,
+                                          merge_identical_schemas=True))
+
+  def testDamagedEntryIsReplaced(self):
+    cache = api_cache.ApiCache(self._root)
+    path = cache.Path(self._discovery_json, JavaApi)
+    f = open(path, 'wb')
+    f.write('not a pickle')
+    f.close()
+    the_api = cache.LoadApi(self._discovery_json, JavaApi)
+    self.assertTrue(self._ClassNames(the_api))
+    self.assertTrue(os.path.getsize(path) > len('not a pickle'))
+
+  def testEviction(self):
+    cache = api_cache.ApiCache(self._root)
+    cache.LoadApi(self._discovery_json, JavaApi)
+    java_path = cache.Path(self._discovery_json, JavaApi)
+    size = os.path.getsize(java_path)
+    os.utime(java_path, (0, 0))
+
+    # Only the most recently used Api fits.
+    cache = api_cache.ApiCache(self._root, max_size=size * 3 / 2)
+    cache.LoadApi(self._discovery_json, PHPApi)
+    self.assertEquals(
+        [os.path.basename(cache.Path(self._discovery_json, PHPApi))],
+        os.listdir(self._root))
+
+
+if __name__ == '__main__':
+  basetest.main()
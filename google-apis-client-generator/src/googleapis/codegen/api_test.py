@@ -62,12 +62,12 @@ class ApiTest(basetest.TestCase):
     """
     api = self.ApiFromDiscoveryDoc(self.__TEST_DISCOVERY_DOC)
     for schema in ['Activity', 'Comment', 'ActivityObject']:
-      self.assertTrue(isinstance(api._schemas[schema], Schema))
+      self.assertTrue(isinstance(api.all_schemas[schema], Schema))
 
   def SchemaRefInProperties(self):
     """Make sure that an object ref works in a schema properties list."""
     api = self.ApiFromDiscoveryDoc(self.__TEST_DISCOVERY_DOC)
-    activity_schema = api._schemas['Activity']
+    activity_schema = api.all_schemas['Activity']
     for prop in activity_schema.values['properties']:
       if prop.values['wireName'] == 'object':
         self.assertTrue(prop.object_type)
@@ -96,8 +96,8 @@ class ApiTest(basetest.TestCase):
         }
         """)
     gen = Api(discovery_doc)
-    self.assertTrue('Named' in gen._schemas)
-    self.assertTrue('Unnamed' in gen._schemas)
+    self.assertTrue('Named' in gen.all_schemas)
+    self.assertTrue('Unnamed' in gen.all_schemas)
 
   def testUnknownHttpMethod(self):
     """Make sure we get an exception on unknown HTTP types."""
@@ -128,8 +128,8 @@ class ApiTest(basetest.TestCase):
           if method.values['wireName'] == 'get':
             optional_names = [p.values['wireName']
                               for p in method.optional_parameters]
-            self.assertEquals(['truncateAtom', 'max-comments', 'hl',
-                               'max-liked'],
+            self.assertEquals(['hl', 'max-comments', 'max-liked',
+                               'truncateAtom'],
                               optional_names)
             tests_executed += 1
     self.assertEquals(6, tests_executed)
@@ -137,7 +137,7 @@ class ApiTest(basetest.TestCase):
   def testSchemaLoadingAsString(self):
     """Test for the "schema as strings" representation."""
     api = self.ApiFromDiscoveryDoc('latitude.v1.json')
-    self.assertEquals(4, len(api._schemas))
+    self.assertEquals(4, len(api.all_schemas))
 
   def testSubResources(self):
     """Test for the APIs with subresources."""
@@ -209,7 +209,7 @@ class ApiTest(basetest.TestCase):
     api = Api(discovery_doc)
     self.language_model = FakeLanguageModel()
     api.VisitAll(lambda o: o.SetLanguageModel(self.language_model))
-    response_schema = api._schemas.get('AdsenseReportsGenerateResponse')
+    response_schema = api.all_schemas.get('AdsenseReportsGenerateResponse')
     self.assertTrue(response_schema)
     prop = [prop for prop in response_schema.values['properties']
             if prop.values['wireName'] == 'array_of_arrays']
@@ -223,11 +223,12 @@ class ApiTest(basetest.TestCase):
     bad_discovery['schemas'] = {
         'NoItemsInArray': {'id': 'noitems', 'type': 'array'}
         }
-    self.assertRaises(ApiException, Api, bad_discovery)
+    # Schemas are made when they are first used.
+    self.assertRaises(ApiException, Api(bad_discovery).ModelClasses)
     bad_discovery['schemas'] = {
         'NoPropertiesInObject': {'id': 'noprops', 'type': 'object'}
         }
-    self.assertRaises(ApiException, Api, bad_discovery)
+    self.assertRaises(ApiException, Api(bad_discovery).ModelClasses)
 
   def testUndefinedSchema(self):
     # This should generated an empty "Bar" class.
@@ -245,13 +246,13 @@ class ApiTest(basetest.TestCase):
         }
     gen = Api(discovery_doc)
     # We expect foo to be in the list because the id is 'foo'
-    self.assertTrue('foo' in gen._schemas.keys())
+    self.assertTrue('foo' in gen.all_schemas.keys())
     # We expect 'Foo' to be in the list because that is the class name we would
     # create for foo
-    self.assertTrue('Foo' in gen._schemas.keys())
+    self.assertTrue('Foo' in gen.all_schemas.keys())
     # We do not expect Bar to be in the list because we only have a ref to it
     # but no definition.
-    self.assertFalse('Bar' in gen._schemas.keys())
+    self.assertFalse('Bar' in gen.all_schemas.keys())
 
   def testEnums(self):
     gen = self.ApiFromDiscoveryDoc('enums.json')
@@ -300,14 +301,98 @@ class ApiTest(basetest.TestCase):
     gen = self.ApiFromDiscoveryDoc(self.__TEST_DISCOVERY_DOC)
     # Check that top level schemas have no parent
     for schema in ['Activity', 'Comment']:
-      self.assertIsNone(gen._schemas[schema].parent)
+      self.assertIsNone(gen.all_schemas[schema].parent)
     for schema in ['PersonUrls', 'ActivityObject', 'ActivityObjectAttachments']:
-      self.assertTrue(gen._schemas[schema].parent)
-    for name, schema in gen._schemas.items():
+      self.assertTrue(gen.all_schemas[schema].parent)
+    for name, schema in gen.all_schemas.items():
       if schema.parent and schema.parent != gen:
         self.assertTrue(name.startswith(schema.parent.values['className']))
         self.assertNotEquals(name, schema.parent.values['className'])
 
+  def testLazyLoading(self):
+    """Check that the tree is made as it is used, in the discovery order."""
+    gen = self.ApiFromDiscoveryDoc(self.__TEST_DISCOVERY_DOC)
+    self.assertFalse(gen._schemas)
+    resources = gen.values['resources']
+    self.assertFalse(gen._schemas)
+    activities = FindByWireName(resources, 'activities')
+    self.assertTrue(FindByWireName(activities.values['methods'], 'get'))
+    self.assertTrue(gen.SchemaByName('Activity'))
+
+    # Using the resources in reverse order makes the same models.
+    for resource in reversed(resources):
+      resource.BuildAll()
+    expected = self.ApiFromDiscoveryDoc(self.__TEST_DISCOVERY_DOC)
+    self.assertEquals([m.class_name for m in expected.ModelClasses()],
+                      [m.class_name for m in gen.ModelClasses()])
+    self.assertEquals(len(expected.values['models']), len(gen.values['models']))
+
+  def testMergeIdenticalSchemas(self):
+    discovery_doc = simplejson.loads(
+        """
+        {
+         "name": "fake",
+         "version": "v1",
+         "schemas": {
+           "Named": {
+             "id": "Named",
+             "type": "object",
+             "properties": {
+               "owner": {
+                 "type": "object",
+                 "properties": { "name": { "type": "string" } }
+               },
+               "other": {
+                 "type": "object",
+                 "properties": { "title": { "type": "string" } }
+               }
+             }
+           }
+         },
+         "resources": {
+           "things": {
+             "methods": {
+               "get": {
+                 "httpMethod": "GET",
+                 "id": "fake.things.get",
+                 "response": {
+                   "type": "object",
+                   "properties": { "name": { "type": "string" } }
+                 }
+               },
+               "list": {
+                 "httpMethod": "GET",
+                 "id": "fake.things.list",
+                 "response": {
+                   "type": "object",
+                   "properties": { "name": { "type": "string" } }
+                 }
+               }
+             }
+           }
+         }
+        }
+        """)
+    gen = Api(discovery_doc)
+    self.assertEquals(['GetResponse', 'ListResponse', 'Named', 'NamedOther',
+                       'NamedOwner'],
+                      [m.class_name for m in gen.ModelClasses()])
+    self.assertEquals(0, gen.merged_schema_count)
+    self.assertRaises(ValueError, gen.MergeIdenticalSchemas)
+
+    gen = Api(discovery_doc)
+    gen.MergeIdenticalSchemas()
+    self.assertEquals(['Named', 'NamedOther', 'NamedOwner'],
+                      [m.class_name for m in gen.ModelClasses()])
+    self.assertEquals(2, gen.merged_schema_count)
+    owner = gen.SchemaByName('NamedOwner')
+    self.assertIsNone(owner.parent)
+    self.assertEquals([gen.SchemaByName('NamedOther')],
+                      gen.SchemaByName('Named').children)
+    methods = gen.values['resources'][0].values['methods']
+    self.assertEquals([owner, owner],
+                      [m.values['responseType'] for m in methods])
+
 
 def FindByWireName(list_of_resource_or_method, wire_name):
   """Find an element in a list by its "wireName".
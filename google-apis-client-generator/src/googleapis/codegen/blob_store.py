@@ -0,0 +1,130 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A content addressed store of files.
+
+Libraries generated from the same templates include the same dependency
+files. A BlobStore keeps one copy of each, named by the SHA-256 of its
+contents, which packages may link to rather than copy.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import errno
+import hashlib
+import os
+import tempfile
+
+# How much of a file to hash or copy at a time.
+_CHUNK_SIZE = 1 << 16
+
+
+class BlobStore(object):
+  """A directory of files, each named by the SHA-256 of its contents.
+
+  A file is stored as <root>/<first 2 hex digits>/<other 62 hex digits>. It is
+  written to a temporary file and renamed into place, so several generators
+  may add to the same store at once. Stored files are made read only, since
+  they may be hard linked into many packages.
+  """
+
+  def __init__(self, root_path):
+    """Create a new BlobStore.
+
+    Args:
+      root_path: (str) The directory holding the store. It will be created if
+        it does not exist.
+    """
+    self._root_path = root_path
+    _MakeDirs(root_path)
+    # The digests of files already added, by path, size and modification time.
+    self._digests = {}
+
+  def Add(self, path):
+    """Add a file to the store, if it is not already there.
+
+    Args:
+      path: (str) The path to the file.
+    Returns:
+      (str) The hex SHA-256 digest of the file, which names it in the store.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    digest = self._digests.get(key)
+    if digest:
+      return digest
+    # Hash the file as it is copied, so the copy is named by the bytes it
+    # holds, even if the file changes while it is read.
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=self._root_path)
+    try:
+      out = os.fdopen(fd, 'wb')
+      source = open(path, 'rb')
+      sha = hashlib.sha256()
+      try:
+        while True:
+          chunk = source.read(_CHUNK_SIZE)
+          if not chunk:
+            break
+          sha.update(chunk)
+          out.write(chunk)
+      finally:
+        source.close()
+        out.close()
+      digest = sha.hexdigest()
+      blob_path = self.Path(digest)
+      if not os.path.exists(blob_path):
+        _MakeDirs(os.path.dirname(blob_path))
+        os.chmod(temp_path, 0444)
+        os.rename(temp_path, blob_path)
+    finally:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+    self._digests[key] = digest
+    return digest
+
+  def Path(self, digest):
+    """Returns the path of a file in the store.
+
+    Args:
+      digest: (str) The hex SHA-256 digest of the file.
+    Returns:
+      (str) The path the file is stored at.
+    """
+    return os.path.join(self._root_path, digest[:2], digest[2:])
+
+
+def FileDigest(path):
+  """Returns the hex SHA-256 digest of the contents of a file."""
+  sha = hashlib.sha256()
+  f = open(path, 'rb')
+  try:
+    while True:
+      chunk = f.read(_CHUNK_SIZE)
+      if not chunk:
+        break
+      sha.update(chunk)
+  finally:
+    f.close()
+  return sha.hexdigest()
+
+
+def _MakeDirs(path):
+  """Create a directory and its parents, unless it already exists."""
+  try:
+    os.makedirs(path, 0755)
+  except OSError, e:
+    if e.errno != errno.EEXIST:
+      raise
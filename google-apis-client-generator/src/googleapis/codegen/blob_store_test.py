@@ -0,0 +1,77 @@
+#!/usr/bin/python
+#
+# Copyright 2010 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for blob_store."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+
+from google.apputils import basetest
+from googleapis.codegen import blob_store
+
+
+class BlobStoreTest(basetest.TestCase):
+  _FILE_CONTENTS = 'this is a test'
+
+  def setUp(self):
+    self._parent = tempfile.mkdtemp()
+    self._root = os.path.join(self._parent, 'store')
+
+  def tearDown(self):
+    shutil.rmtree(self._parent)
+
+  def _WriteFile(self, name, contents):
+    path = os.path.join(self._parent, name)
+    f = open(path, 'wb')
+    f.write(contents)
+    f.close()
+    return path
+
+  def testAdd(self):
+    store = blob_store.BlobStore(self._root)
+    digest = store.Add(self._WriteFile('a', self._FILE_CONTENTS))
+    self.assertEquals(hashlib.sha256(self._FILE_CONTENTS).hexdigest(), digest)
+    path = store.Path(digest)
+    self.assertEquals(os.path.join(self._root, digest[:2], digest[2:]), path)
+    self.assertEquals(self._FILE_CONTENTS, open(path, 'rb').read())
+    self.assertFalse(os.stat(path).st_mode & stat.S_IWUSR)
+
+  def testSameContentsAreStoredOnce(self):
+    store = blob_store.BlobStore(self._root)
+    digest = store.Add(self._WriteFile('a', self._FILE_CONTENTS))
+    inode = os.stat(store.Path(digest)).st_ino
+    other_store = blob_store.BlobStore(self._root)
+    self.assertEquals(
+        digest, other_store.Add(self._WriteFile('b', self._FILE_CONTENTS)))
+    self.assertEquals(inode, os.stat(store.Path(digest)).st_ino)
+    self.assertNotEquals(
+        digest, store.Add(self._WriteFile('c', self._FILE_CONTENTS * 2)))
+    self.assertEquals(2, sum(len(file_names) for unused_root, unused_dirs,
+                             file_names in os.walk(self._root)))
+
+  def testFileDigest(self):
+    self.assertEquals(
+        hashlib.sha256(self._FILE_CONTENTS).hexdigest(),
+        blob_store.FileDigest(self._WriteFile('a', self._FILE_CONTENTS)))
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Select part of an API from its discovery document.
+
+A library may be generated for only some of the resources and methods of an
+API. The discovery document is cut down to the selected resources and
+methods, and the schemas they refer to, directly or through other schemas.
+The Api made from it, and so the generated library, has nothing else.
+
+Resources and methods are named by the wire names of the resources holding
+them, and their own, joined with '.'. E.g. 'activities', 'activities.list' or
+'activities.comments.list'. A name may be a glob, such as 'activities.*'.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import fnmatch
+
+from googleapis.codegen.anyjson import simplejson
+
+
+def SelectParts(discovery_doc, resources=None, methods=None):
+  """Returns the part of a discovery document needed for some of its methods.
+
+  The discovery document is not changed. The one returned shares the parts
+  which are kept whole.
+
+  Args:
+    discovery_doc: (dict) The discovery document.
+    resources: (list) Names or globs of the resources to keep, with all their
+      methods and sub resources.
+    methods: (list) Names or globs of the methods to keep. The resources
+      holding them are kept, but not their other methods.
+  Returns:
+    (dict) The discovery document, with only the selected resources and
+    methods, and the schemas they need. If neither resources nor methods are
+    given, discovery_doc itself.
+  Raises:
+    ValueError: if a name or glob matches nothing.
+  """
+  if not (resources or methods):
+    return discovery_doc
+  resources = resources or []
+  methods = methods or []
+  _CheckPatterns(discovery_doc, resources, methods)
+
+  selected = _SelectResource(discovery_doc, '', resources, methods)
+  doc = dict(discovery_doc)
+  doc['resources'] = selected.get('resources', {})
+  doc['methods'] = selected.get('methods', {})
+  schemas = discovery_doc.get('schemas')
+  if schemas:
+    doc['schemas'] = _ReachableSchemas(schemas, [doc['resources'],
+                                                 doc['methods']])
+  return doc
+
+
+def _Matches(path, patterns):
+  """Returns whether a resource or method name matches any of some globs."""
+  for pattern in patterns:
+    if fnmatch.fnmatchcase(path, pattern):
+      return True
+  return False
+
+
+def _CheckPatterns(discovery_doc, resources, methods):
+  """Raise ValueError if any of the resource or method globs matches nothing."""
+  resource_paths = []
+  method_paths = []
+  _ListPaths(discovery_doc, '', resource_paths, method_paths)
+  for pattern in resources:
+    if not fnmatch.filter(resource_paths, pattern):
+      raise ValueError('No resource matches: %s' % pattern)
+  for pattern in methods:
+    if not fnmatch.filter(method_paths, pattern):
+      raise ValueError('No method matches: %s' % pattern)
+
+
+def _ListPaths(node, prefix, resource_paths, method_paths):
+  """Add the names of the methods and resources below a node to lists."""
+  for name in node.get('methods', {}):
+    method_paths.append(prefix + name)
+  for name, resource in node.get('resources', {}).iteritems():
+    resource_paths.append(prefix + name)
+    _ListPaths(resource, '%s%s.' % (prefix, name), resource_paths,
+               method_paths)
+
+
+def _SelectResource(node, prefix, resources, methods):
+  """Returns the selected part of the API or of a resource, or None.
+
+  Args:
+    node: (dict) The discovery dictionary of the API or resource.
+    prefix: (str) The name of the resource and '.', or '' for the API.
+    resources: (list) Globs of the resources to keep whole.
+    methods: (list) Globs of the methods to keep.
+  Returns:
+    (dict) node, if it is selected whole, a copy with only its selected
+    methods and sub resources, or None if none of it is selected.
+  """
+  if prefix and _Matches(prefix[:-1], resources):
+    return node
+  selected_methods = {}
+  for name, method in node.get('methods', {}).iteritems():
+    if _Matches(prefix + name, methods):
+      selected_methods[name] = method
+  selected_resources = {}
+  for name, resource in node.get('resources', {}).iteritems():
+    selected = _SelectResource(resource, '%s%s.' % (prefix, name), resources,
+                               methods)
+    if selected is not None:
+      selected_resources[name] = selected
+  if not (selected_methods or selected_resources):
+    return None
+  selected = dict(node)
+  selected['methods'] = selected_methods
+  selected['resources'] = selected_resources
+  return selected
+
+
+def _ReachableSchemas(schemas, roots):
+  """Returns the schemas referred to from some roots, directly or not.
+
+  Args:
+    schemas: (dict) The schemas of the discovery document, by name.
+    roots: (list) The parts of the discovery document to start from.
+  Returns:
+    (dict) The schemas which are referred to, by name.
+  """
+  # A schema is referred to by its name or its id.
+  names = {}
+  for name, schema in schemas.iteritems():
+    names[name] = name
+    if isinstance(schema, dict) and schema.get('id'):
+      names[schema['id']] = name
+  reachable = {}
+  pending = []
+  for root in roots:
+    _AddReferences(root, pending)
+  while pending:
+    name = names.get(pending.pop())
+    if name is None or name in reachable:
+      continue
+    schema = reachable[name] = schemas[name]
+    # Schemas may also be given as strings of JSON.
+    if isinstance(schema, basestring):
+      schema = simplejson.loads(schema)
+    _AddReferences(schema, pending)
+  return reachable
+
+
+def _AddReferences(value, references):
+  """Add the names of the schemas referred to by a JSON value to a list."""
+  if isinstance(value, dict):
+    reference = value.get('$ref')
+    if isinstance(reference, basestring):
+      references.append(reference)
+    for v in value.itervalues():
+      _AddReferences(v, references)
+  elif isinstance(value, list):
+    for v in value:
+      _AddReferences(v, references)
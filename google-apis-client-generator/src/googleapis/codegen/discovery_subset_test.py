@@ -0,0 +1,90 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for discovery_subset."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import copy
+import os
+
+from google.apputils import basetest
+from googleapis.codegen.anyjson import simplejson
+from googleapis.codegen.api import Api
+from googleapis.codegen.discovery_subset import SelectParts
+
+
+class DiscoverySubsetTest(basetest.TestCase):
+
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def setUp(self):
+    f = open(os.path.join(self._TEST_DATA_DIR, 'moderator.v1.json'))
+    self._discovery = simplejson.loads(f.read())
+    f.close()
+
+  def _Methods(self, node, prefix=''):
+    """Returns the names of all the methods in a discovery document."""
+    names = [prefix + name for name in node.get('methods', {})]
+    for name, resource in node.get('resources', {}).iteritems():
+      names.extend(self._Methods(resource, '%s%s.' % (prefix, name)))
+    return sorted(names)
+
+  def testNothingSelected(self):
+    self.assertTrue(SelectParts(self._discovery) is self._discovery)
+
+  def testSelectResource(self):
+    original = copy.deepcopy(self._discovery)
+    doc = SelectParts(self._discovery, resources=['series'])
+    self.assertEquals(original, self._discovery)
+    self.assertEquals(['series.get', 'series.insert', 'series.list',
+                       'series.responses.list', 'series.submissions.list',
+                       'series.update'],
+                      self._Methods(doc))
+    # Series, and the schemas its lists refer to, through others too.
+    self.assertEquals(['ModeratorTopicsResourcePartial', 'Series',
+                       'SeriesList', 'Submission', 'SubmissionList'],
+                      sorted(doc['schemas']))
+
+  def testSelectMethods(self):
+    doc = SelectParts(self._discovery, methods=['*.series.list', 'tags.list'])
+    self.assertEquals(['featured.series.list', 'global.series.list',
+                       'my.series.list', 'myrecent.series.list', 'tags.list'],
+                      self._Methods(doc))
+    self.assertEquals(['Series', 'SeriesList', 'Tag', 'TagList'],
+                      sorted(doc['schemas']))
+
+    # With the anonymous schemas of their properties.
+    the_api = Api(doc)
+    self.assertEquals(['Series', 'SeriesCounters', 'SeriesId', 'SeriesList',
+                       'Tag', 'TagId', 'TagList'],
+                      [m.class_name for m in the_api.ModelClasses()])
+
+  def testSchemasAsStrings(self):
+    self._discovery['schemas']['SeriesList'] = simplejson.dumps(
+        self._discovery['schemas']['SeriesList'])
+    doc = SelectParts(self._discovery, methods=['series.list'])
+    self.assertEquals(['Series', 'SeriesList'], sorted(doc['schemas']))
+
+  def testNoMatch(self):
+    self.assertRaises(ValueError, SelectParts, self._discovery,
+                      resources=['no_such_resource'])
+    self.assertRaises(ValueError, SelectParts, self._discovery,
+                      resources=['series'], methods=['series.no_such_method'])
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -26,10 +26,13 @@ import os
 from django.conf import settings
 settings.configure(
   TEMPLATE_DIRS=('/', os.path.join(os.path.dirname(__file__))))
+from django.template.loader import get_template
 from django.template.loader import render_to_string
 
 from django import template as django_template
 
+from googleapis.codegen import template_helpers
+
 # This is Django magic to add builtin tags and filters.  They don't really
 # support that use case.  Instead you are supposed to put a package of filters
 # in a specific place and the Django web server finds them for you. We are a
@@ -41,3 +44,11 @@ django_template.add_to_builtins(
 
 def DjangoRenderTemplate(template_path, context_dict):
   return render_to_string(template_path, context_dict)
+
+
+def DjangoRenderTemplateToStream(template_path, context_dict, stream):
+  """Render a template, writing the text to a stream as it is produced."""
+  template = get_template(template_path)
+  context = django_template.Context(context_dict)
+  for chunk in template_helpers.RenderChunks(template.nodelist, context):
+    stream.write(chunk)
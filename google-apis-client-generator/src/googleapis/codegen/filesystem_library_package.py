@@ -23,28 +23,96 @@ file system.
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
 import os
+import shutil
+import sys
+import tempfile
+
+try:
+  import fcntl  # pylint: disable-msg=C6204
+except ImportError:
+  fcntl = None
 
 from googleapis.codegen.library_package import LibraryPackage
 
+# Each file is spooled, so it can be compared with what is already on disk.
+# This many bytes of a file are held in memory; the rest overflow to a
+# temporary file.
+_SPOOL_MEMORY_LIMIT = 1 << 20
+# How much of a file to compare or copy at a time.
+_COMPARE_CHUNK_SIZE = 1 << 16
+_COPY_CHUNK_SIZE = 1 << 16
+# The Linux ioctl which makes a file share the blocks of another (a reflink).
+_FICLONE = 0x40049409
+
 
 class FilesystemLibraryPackage(LibraryPackage):
-  """The library package."""
+  """The library package.
+
+  Files whose contents are unchanged from what is already on disk are not
+  rewritten, so their modification times are kept and build tools do not
+  rebuild them.
+
+  Optionally, the package is staged in a sibling of the root directory and
+  only replaces it once it is complete. Readers then see either the previous
+  package or the new one, never a mixture, and a failed generation, once
+  Abort is called, leaves the previous package in place. Only a root which is
+  a symbolic link is replaced atomically: the link is swapped, even under
+  readers walking the tree. A plain directory is renamed aside before the
+  staged package is renamed in, so for a moment the root does not exist.
 
-  def __init__(self, root_path):
+  Staged packages are published in turn, using a lock file next to the root,
+  so two generators publishing to the same root never interleave. Packages
+  written directly to the root take no lock, and leave nothing beside it.
+  """
+
+  def __init__(self, root_path, remove_stale_files=False, atomic=False,
+               fsync=False):
     """Create a new FilesystemLibraryPackage.
 
     Args:
       root_path: (str) A path to a directory where the files will be written.
         The directory will be created if it does not exist.
+      remove_stale_files: (bool) Whether files under root_path which were not
+        written to the package should be removed.
+      atomic: (bool) Whether to stage the package and publish it all at once,
+        in DoneWritingArchive.
+      fsync: (bool) Whether DoneWritingArchive should flush the files written,
+        and their directories, to disk before returning (or, if atomic, before
+        publishing them).
     Raises:
       ValueError: If the directory exists, but is not writable.
       OSError: If the directory does not exist and cannot be created.
     """
     super(FilesystemLibraryPackage, self).__init__()
-    # Create the directory if we have to
-    self._MakePath(root_path)
+    # Directories known to exist and be writable.
+    self._known_directories = set()
     self._root_path = root_path
+    self._remove_stale_files = remove_stale_files
+    self._fsync = fsync
+    root = os.path.abspath(root_path)
+    self._parent_path = os.path.dirname(root)
+    self._staging_prefix = '.%s.' % os.path.basename(root)
+    self._lock = None
+    if atomic:
+      self._MakePath(self._parent_path)
+      self._write_path = tempfile.mkdtemp(prefix=self._staging_prefix,
+                                          dir=self._parent_path)
+      # mkdtemp makes the directory private, which the published root is not.
+      umask = os.umask(0)
+      os.umask(umask)
+      os.chmod(self._write_path, 0755 & ~umask)
+      self._known_directories.add(self._write_path)
+    else:
+      # Create the directory if we have to
+      self._MakePath(root_path)
+      self._write_path = root_path
     self._current_file_stream = None
+    self._current_file_name = None
+    self._names_written = set()
+    self._paths_to_sync = set()
+    self._written = 0
+    self._unchanged = 0
+    self._removed = 0
 
   def StartFile(self, name):
     """Start writing a named file to the package.
@@ -56,16 +124,231 @@ class FilesystemLibraryPackage(LibraryPackage):
       A file-like object to write the contents to.
     """
     self.EndFile()
-    full_path = os.path.join(self._root_path, self._file_path_prefix, name)
-    self._MakePath(os.path.dirname(full_path))
-    self._current_file_stream = open(full_path, 'w')
+    self._current_file_name = os.path.normpath(
+        os.path.join(self._file_path_prefix, name))
+    self._current_file_stream = tempfile.SpooledTemporaryFile(
+        _SPOOL_MEMORY_LIMIT)
     return self._current_file_stream
 
   def EndFile(self):
-    """Flush the current output file."""
+    """Flush the current output file, unless the file on disk is the same."""
+    if self._current_file_stream:
+      self._PlaceFile(self._current_file_name, self._current_file_stream)
+      self._current_file_stream.close()
+      self._current_file_stream = None
+      self._current_file_name = None
+
+  def IncludeFile(self, path, name):
+    """Copy a file from disk into the package.
+
+    Where the filesystem supports it, the copy shares the original's blocks
+    until either is changed, so no data is copied at all.
+
+    Args:
+      path: (str) path to the file.
+      name: (str) name the file should have in the package.
+    """
+    self.EndFile()
+    input_stream = open(path, 'rb')
+    try:
+      input_stream.seek(0, 2)
+      self._PlaceFile(
+          os.path.normpath(os.path.join(self._file_path_prefix, name)),
+          input_stream, clone=True)
+    finally:
+      input_stream.close()
+
+  def IncludeStoredFile(self, store, digest, name):
+    """Hard link a file from a BlobStore into the package.
+
+    Packages made from the same store then share one copy of each file.
+    Stored files are read only, so the linked files are too. If the file
+    can not be linked, it is copied.
+
+    Args:
+      store: (BlobStore) The store holding the file.
+      digest: (str) The digest of the file in the store.
+      name: (str) name the file should have in the package.
+    """
+    self.EndFile()
+    name = os.path.normpath(os.path.join(self._file_path_prefix, name))
+    self._names_written.add(name)
+    blob_path = store.Path(digest)
+    published_path = os.path.join(self._root_path, name)
+    path = os.path.join(self._write_path, name)
+    self._MakePath(os.path.dirname(path))
+    if _SameFile(blob_path, published_path):
+      self._unchanged += 1
+      if path != published_path:
+        _LinkOrCopy(published_path, path)
+      return
+    # Link beside the file, and rename over it, so it is replaced at once.
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    _LinkOrCopy(blob_path, temp_path)
+    os.rename(temp_path, path)
+    self._written += 1
+    self._paths_to_sync.add(path)
+
+  def _PlaceFile(self, name, data, clone=False):
+    """Put a file in the package, unless the same file is already there.
+
+    Args:
+      name: (str) The normalized name of the file in the package.
+      data: (file) The contents of the file, positioned at its end.
+      clone: (bool) Whether data is a real file, which may be cloned.
+    """
+    self._names_written.add(name)
+    published_path = os.path.join(self._root_path, name)
+    path = os.path.join(self._write_path, name)
+    self._MakePath(os.path.dirname(path))
+    if _SameContents(data, published_path):
+      self._unchanged += 1
+      if path != published_path:
+        _LinkOrCopy(published_path, path)
+    else:
+      data.seek(0)
+      # Write beside the file, and rename over it, rather than writing through
+      # it, since it may be a hard link to a file in a BlobStore.
+      temp_path = '%s.%d.tmp' % (path, os.getpid())
+      try:
+        out = open(temp_path, 'wb')
+        try:
+          if not (clone and _Clone(data, out)):
+            shutil.copyfileobj(data, out, _COPY_CHUNK_SIZE)
+        finally:
+          out.close()
+        os.rename(temp_path, path)
+      finally:
+        if os.path.exists(temp_path):
+          os.remove(temp_path)
+      self._written += 1
+      self._paths_to_sync.add(path)
+
+  def DoneWritingArchive(self):
+    """Signal that we are done writing the entire package.
+
+    Stale files are removed or, when staging, carried over into the new
+    package. A staged package is then published in place of the root.
+    """
+    self.EndFile()
+    if self._write_path == self._root_path:
+      if self._remove_stale_files:
+        self._RemoveStaleFiles()
+      self._Sync()
+      return
+    self._lock = _Lock(os.path.abspath(self._root_path))
+    try:
+      if os.path.isdir(self._root_path):
+        self._CarryOverStaleFiles()
+      self._Sync()
+      self._Publish()
+    finally:
+      self._Unlock()
+
+  def Abort(self):
+    """Give up on the package, after failing to generate it.
+
+    A staged package is removed, so the published one is left as it was.
+    Files already written directly to the root are left there.
+    """
     if self._current_file_stream:
       self._current_file_stream.close()
       self._current_file_stream = None
+      self._current_file_name = None
+    if self._write_path != self._root_path:
+      shutil.rmtree(self._write_path, ignore_errors=True)
+      self._write_path = self._root_path
+      self._known_directories.clear()
+
+  def Statistics(self):
+    """Returns a dict of the number of files written, unchanged and removed."""
+    return {
+        'written': self._written,
+        'unchanged': self._unchanged,
+        'removed': self._removed,
+        }
+
+  def _StaleFiles(self):
+    """Yields the names of the files under the root which were not written."""
+    for root, dirs, file_names in os.walk(self._root_path):
+      dirs.sort()
+      for file_name in sorted(file_names):
+        name = os.path.normpath(os.path.relpath(os.path.join(root, file_name),
+                                                self._root_path))
+        if name not in self._names_written:
+          yield name
+
+  def _RemoveStaleFiles(self):
+    """Remove stale files under the root, and directories left empty."""
+    for name in list(self._StaleFiles()):
+      os.remove(os.path.join(self._root_path, name))
+      self._removed += 1
+    for root, dirs, unused_file_names in os.walk(self._root_path,
+                                                 topdown=False):
+      for dir_name in dirs:
+        path = os.path.join(root, dir_name)
+        if not os.path.islink(path) and not os.listdir(path):
+          os.rmdir(path)
+          self._known_directories.discard(path)
+
+  def _CarryOverStaleFiles(self):
+    """Link the stale files of the published package into the staged one."""
+    for name in self._StaleFiles():
+      if self._remove_stale_files:
+        self._removed += 1
+      else:
+        path = os.path.join(self._write_path, name)
+        self._MakePath(os.path.dirname(path))
+        _LinkOrCopy(os.path.join(self._root_path, name), path)
+
+  def _Sync(self):
+    """If requested, flush the files written, and their directories, to disk."""
+    if not self._fsync:
+      return
+    directories = set()
+    for path in self._paths_to_sync:
+      _Fsync(path)
+      directories.add(os.path.dirname(path))
+    if self._write_path != self._root_path:
+      # Every directory of a staged package is new.
+      for root, unused_dirs, unused_file_names in os.walk(self._write_path):
+        directories.add(root)
+    for path in directories:
+      _Fsync(path)
+    self._paths_to_sync.clear()
+
+  def _Publish(self):
+    """Replace the root with the staged package."""
+    staging_path = self._write_path
+    if os.path.islink(self._root_path):
+      # Point a new link at the staged package, and rename it over the root.
+      old_path = os.path.realpath(self._root_path)
+      link_path = '%s.link' % staging_path
+      os.symlink(os.path.basename(staging_path), link_path)
+      os.rename(link_path, self._root_path)
+      # Only remove the old package if it was staged here too.
+      if (os.path.dirname(old_path) != os.path.realpath(self._parent_path) or
+          not os.path.basename(old_path).startswith(self._staging_prefix)):
+        old_path = None
+    elif os.path.exists(self._root_path):
+      # Not atomic: the root is missing between the renames.
+      old_path = '%s.old' % staging_path
+      os.rename(self._root_path, old_path)
+      os.rename(staging_path, self._root_path)
+    else:
+      old_path = None
+      os.rename(staging_path, self._root_path)
+    if self._fsync:
+      _Fsync(self._parent_path)
+    self._write_path = self._root_path
+    self._known_directories.clear()
+    if old_path:
+      shutil.rmtree(old_path, ignore_errors=True)
+
+  def _Unlock(self):
+    if self._lock:
+      self._lock.close()
+      self._lock = None
 
   def _MakePath(self, path):
     """Create a directory path if needed.
@@ -77,7 +360,104 @@ class FilesystemLibraryPackage(LibraryPackage):
       ValueError: If the directory exists, but is not writable.
       OSError: If the directory does not exist and cannot be created.
     """
+    if path in self._known_directories:
+      return
     if not os.access(path, os.W_OK):
       if os.access(path, os.F_OK):
         raise ValueError('%s exists, but is not writable' % path)
       os.makedirs(path, 0755)
+    self._known_directories.add(path)
+
+
+def _Lock(path):
+  """Take an exclusive lock associated with a path.
+
+  The lock is held on a file next to the path, which is left in place, since
+  removing it would let another process lock a different file of the same
+  name.
+
+  Args:
+    path: (str) The path to lock.
+  Returns:
+    (file) The open lock file, which holds the lock until it is closed, or None
+    if the platform does not support locking.
+  """
+  if not fcntl:
+    return None
+  lock_file = open('%s.lock' % path, 'a')
+  fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+  return lock_file
+
+
+def _Clone(source, destination):
+  """Make one file share the blocks of another, if the filesystem can.
+
+  Python 2 has no os.sendfile, so if this fails the caller copies the file.
+
+  Args:
+    source: (file) The file to clone.
+    destination: (file) An empty file to make a clone of source.
+  Returns:
+    True if the file was cloned.
+  """
+  if not fcntl or not sys.platform.startswith('linux'):
+    return False
+  try:
+    fcntl.ioctl(destination.fileno(), _FICLONE, source.fileno())
+  except (IOError, OSError):
+    return False
+  return True
+
+
+def _Fsync(path):
+  """Flush a file or directory to disk."""
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+
+def _LinkOrCopy(source, destination):
+  """Hard link a file to a new path, or copy it if it can not be linked."""
+  try:
+    os.link(source, destination)
+  except OSError:
+    shutil.copy2(source, destination)
+
+
+def _SameFile(path1, path2):
+  """Check whether two paths are links to the same file."""
+  try:
+    return os.path.samefile(path1, path2)
+  except OSError:
+    return False
+
+
+def _SameContents(data, path):
+  """Check whether a file on disk holds exactly the given data.
+
+  The sizes are compared first, so most changed files are never read.
+
+  Args:
+    data: (file) A seekable file-like object, positioned at its end.
+    path: (str) The path to the file on disk.
+  Returns:
+    True if the file exists and its contents equal the data.
+  """
+  try:
+    if os.path.getsize(path) != data.tell():
+      return False
+    existing = open(path, 'rb')
+  except (IOError, OSError):
+    return False
+  try:
+    data.seek(0)
+    while True:
+      chunk = data.read(_COMPARE_CHUNK_SIZE)
+      if chunk != existing.read(_COMPARE_CHUNK_SIZE):
+        return False
+      if not chunk:
+        return True
+  finally:
+    existing.close()
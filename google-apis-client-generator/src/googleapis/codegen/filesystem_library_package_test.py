@@ -0,0 +1,207 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for filesystem_library_package."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import os
+import shutil
+import tempfile
+
+from google.apputils import basetest
+from googleapis.codegen import blob_store
+from googleapis.codegen import filesystem_library_package
+
+
+class FilesystemLibraryPackageTest(basetest.TestCase):
+  _FILE_CONTENTS = 'this is a test'
+
+  def setUp(self):
+    self._parent = tempfile.mkdtemp()
+    self._root = os.path.join(self._parent, 'out')
+
+  def tearDown(self):
+    shutil.rmtree(self._parent)
+
+  def _Write(self, files, **kwargs):
+    package = filesystem_library_package.FilesystemLibraryPackage(
+        self._root, **kwargs)
+    for name, contents in sorted(files.iteritems()):
+      stream = package.StartFile(name)
+      stream.write(contents)
+    return package
+
+  def _Generate(self, files, **kwargs):
+    package = self._Write(files, **kwargs)
+    package.DoneWritingArchive()
+    return package.Statistics()
+
+  def _Read(self, name):
+    f = open(os.path.join(self._root, name), 'rb')
+    try:
+      return f.read()
+    finally:
+      f.close()
+
+  def testWriteFiles(self):
+    files = {'a': self._FILE_CONTENTS, 'b/c/d': self._FILE_CONTENTS * 2}
+    self.assertEquals({'written': 2, 'unchanged': 0, 'removed': 0},
+                      self._Generate(files))
+    self.assertEquals(self._FILE_CONTENTS, self._Read('a'))
+    self.assertEquals(self._FILE_CONTENTS * 2, self._Read('b/c/d'))
+    # Nothing is left beside the root.
+    self.assertEquals(['out'], os.listdir(self._parent))
+
+  def testUnchangedFilesAreNotRewritten(self):
+    files = {'a': self._FILE_CONTENTS, 'b/c': self._FILE_CONTENTS}
+    self._Generate(files)
+    path = os.path.join(self._root, 'a')
+    os.utime(path, (0, 0))
+    # The same size, but different contents.
+    files['b/c'] = self._FILE_CONTENTS.upper()
+    self.assertEquals({'written': 1, 'unchanged': 1, 'removed': 0},
+                      self._Generate(files))
+    self.assertEquals(0, os.path.getmtime(path))
+    self.assertEquals(self._FILE_CONTENTS.upper(), self._Read('b/c'))
+
+  def testRemoveStaleFiles(self):
+    self._Generate({'a': 'a', 'old/b': 'b', 'c/d': 'd', 'c/e': 'e'})
+    files = {'a': 'a', 'c/d': 'changed'}
+    self.assertEquals({'written': 1, 'unchanged': 1, 'removed': 0},
+                      self._Generate(files))
+    self.assertTrue(os.path.exists(os.path.join(self._root, 'old/b')))
+    self.assertEquals({'written': 0, 'unchanged': 2, 'removed': 2},
+                      self._Generate(files, remove_stale_files=True))
+    self.assertEquals(['a', 'c'], sorted(os.listdir(self._root)))
+    self.assertEquals(['d'], os.listdir(os.path.join(self._root, 'c')))
+
+  def testIncludeFile(self):
+    source = os.path.join(self._parent, 'source.jar')
+    contents = ''.join(chr(i) for i in xrange(256)) * 1000
+    f = open(source, 'wb')
+    f.write(contents)
+    f.close()
+    package = filesystem_library_package.FilesystemLibraryPackage(self._root)
+    package.IncludeFile(source, 'lib/dependency.jar')
+    package.DoneWritingArchive()
+    self.assertEquals(contents, self._Read('lib/dependency.jar'))
+
+    package = filesystem_library_package.FilesystemLibraryPackage(self._root)
+    package.IncludeFile(source, 'lib/dependency.jar')
+    package.DoneWritingArchive()
+    self.assertEquals({'written': 0, 'unchanged': 1, 'removed': 0},
+                      package.Statistics())
+
+  def testIncludeStoredFile(self):
+    source = os.path.join(self._parent, 'source.jar')
+    f = open(source, 'wb')
+    f.write(self._FILE_CONTENTS)
+    f.close()
+    store = blob_store.BlobStore(os.path.join(self._parent, 'store'))
+    digest = store.Add(source)
+    package = filesystem_library_package.FilesystemLibraryPackage(self._root)
+    package.IncludeStoredFile(store, digest, 'lib/dependency.jar')
+    package.DoneWritingArchive()
+    path = os.path.join(self._root, 'lib/dependency.jar')
+    self.assertTrue(os.path.samefile(store.Path(digest), path))
+
+    package = filesystem_library_package.FilesystemLibraryPackage(
+        self._root, atomic=True)
+    package.IncludeStoredFile(store, digest, 'lib/dependency.jar')
+    package.DoneWritingArchive()
+    self.assertEquals({'written': 0, 'unchanged': 1, 'removed': 0},
+                      package.Statistics())
+    self.assertTrue(os.path.samefile(store.Path(digest), path))
+
+  def testStoredFileRegeneratedWithoutStore(self):
+    source = os.path.join(self._parent, 'source.jar')
+    f = open(source, 'wb')
+    f.write('v1\n')
+    f.close()
+    store = blob_store.BlobStore(os.path.join(self._parent, 'store'))
+    digest = store.Add(source)
+    package = filesystem_library_package.FilesystemLibraryPackage(self._root)
+    package.IncludeStoredFile(store, digest, 'lib/dependency.jar')
+    package.DoneWritingArchive()
+
+    f = open(source, 'wb')
+    f.write('v2\n')
+    f.close()
+    package = filesystem_library_package.FilesystemLibraryPackage(self._root)
+    package.IncludeFile(source, 'lib/dependency.jar')
+    package.DoneWritingArchive()
+    self.assertEquals('v2\n', self._Read('lib/dependency.jar'))
+    # The stored file is unchanged.
+    f = open(store.Path(digest), 'rb')
+    self.assertEquals('v1\n', f.read())
+    f.close()
+    self.assertFalse(os.path.samefile(
+        store.Path(digest), os.path.join(self._root, 'lib/dependency.jar')))
+
+  def testAtomic(self):
+    self._Generate({'a': 'a', 'b': 'b', 'old/c': 'c'})
+    path = os.path.join(self._root, 'a')
+    os.utime(path, (0, 0))
+    package = self._Write({'a': 'a', 'b': 'changed', 'new/d': 'd'},
+                          atomic=True, fsync=True)
+    # Nothing is visible until the package is done.
+    self.assertEquals('b', self._Read('b'))
+    self.assertFalse(os.path.exists(os.path.join(self._root, 'new')))
+    package.DoneWritingArchive()
+
+    self.assertEquals({'written': 2, 'unchanged': 1, 'removed': 0},
+                      package.Statistics())
+    self.assertEquals(0, os.path.getmtime(path))
+    self.assertEquals('changed', self._Read('b'))
+    self.assertEquals('c', self._Read('old/c'))
+    self.assertEquals('d', self._Read('new/d'))
+    self.assertEquals(['out', 'out.lock'], sorted(os.listdir(self._parent)))
+
+  def testAtomicAbort(self):
+    self._Generate({'a': 'a'})
+    package = self._Write({'a': 'changed', 'b': 'b'}, atomic=True)
+    package.Abort()
+    self.assertEquals(['out'], os.listdir(self._parent))
+    self.assertEquals(['a'], os.listdir(self._root))
+    self.assertEquals('a', self._Read('a'))
+
+  def testAtomicRemoveStaleFiles(self):
+    self._Generate({'a': 'a', 'old/c': 'c'})
+    self.assertEquals({'written': 0, 'unchanged': 1, 'removed': 1},
+                      self._Generate({'a': 'a'}, atomic=True,
+                                     remove_stale_files=True))
+    self.assertEquals(['a'], os.listdir(self._root))
+
+  def testAtomicSymlinkIsSwapped(self):
+    target = os.path.join(self._parent, 'v1')
+    os.mkdir(target)
+    os.symlink('v1', self._root)
+    self._Generate({'a': 'a'}, atomic=True)
+    self.assertTrue(os.path.islink(self._root))
+    self.assertEquals('a', self._Read('a'))
+    first = os.path.realpath(self._root)
+    # The original target was not staged by us, so it is left alone.
+    self.assertTrue(os.path.isdir(target))
+
+    self._Generate({'a': 'b'}, atomic=True)
+    self.assertEquals('b', self._Read('a'))
+    self.assertNotEquals(first, os.path.realpath(self._root))
+    self.assertFalse(os.path.exists(first))
+
+
+if __name__ == '__main__':
+  basetest.main()
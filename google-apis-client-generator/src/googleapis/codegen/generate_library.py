@@ -24,7 +24,9 @@ $ PYTHONPATH=$(/bin/pwd)/src \
 
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
+import logging
 import os
+import sys
 
 import httplib2
 
@@ -34,20 +36,41 @@ os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
 
 from google.apputils import app
 import gflags as flags
+from googleapis.codegen import library_generator
+from googleapis.codegen import template_helpers
 from googleapis.codegen.anyjson import simplejson
-from googleapis.codegen.csharp_generator import CSharpGenerator
+from googleapis.codegen.api_cache import ApiCache
 from googleapis.codegen.filesystem_library_package import FilesystemLibraryPackage
-from googleapis.codegen.go_generator import GoGenerator
-from googleapis.codegen.gwt_generator import GwtGenerator
-from googleapis.codegen.java_generator import JavaGenerator
-from googleapis.codegen.objc_generator import ObjCGenerator
-from googleapis.codegen.php_generator import PHPGenerator
-from googleapis.codegen.targets import Targets
+from googleapis.codegen.manifest_library_package import ManifestLibraryPackage
+from googleapis.codegen.tar_library_package import TarLibraryPackage
+from googleapis.codegen.tee_library_package import TeeLibraryPackage
+from googleapis.codegen.zip_library_package import COMPRESSION_METHODS
 from googleapis.codegen.zip_library_package import ZipLibraryPackage
 
 DISCOVERY_API_VERSION = 'v1'
+# The archive format written for each output file extension.
+_OUTPUT_FORMAT_EXTENSIONS = [
+    ('.jar', 'zip'),
+    ('.tar', 'tar'),
+    ('.tar.gz', 'tgz'),
+    ('.tar.xz', 'txz'),
+    ('.tgz', 'tgz'),
+    ('.txz', 'txz'),
+    ('.zip', 'zip'),
+    ]
 FLAGS = flags.FLAGS
 
+flags.DEFINE_string(
+    'api_cache_dir',
+    None,
+    'A directory to cache loaded APIs in, keyed by the SHA-256 of the'
+    ' discovery document. Generating from the same document again reads the'
+    ' loaded API back instead of parsing the document.')
+flags.DEFINE_integer(
+    'api_cache_size',
+    256,
+    'The number of megabytes --api_cache_dir may hold. The least recently'
+    ' used APIs are removed when it holds more.')
 flags.DEFINE_string(
     'api_name',
     None,
@@ -56,6 +79,28 @@ flags.DEFINE_string(
     'api_version',
     None,
     'version of "api_name" to generate for.  E.g. "v1".')
+flags.DEFINE_boolean(
+    'atomic_output',
+    False,
+    'Stage the library next to --output_dir, and only replace --output_dir'
+    ' with it once it is complete. The replacement is atomic only if'
+    ' --output_dir is a symbolic link; a plain directory is briefly absent.'
+    ' A failed run removes the staged library.')
+flags.DEFINE_enum(
+    'compression',
+    'stored',
+    ['deflated', 'stored'],
+    'How to compress the entries of archive outputs, including source jars.')
+flags.DEFINE_integer(
+    'compression_level',
+    None,
+    'The compression level, from 0 to 9, for --compression=deflated and the'
+    ' compressed tar formats.')
+flags.DEFINE_string(
+    'dependency_store',
+    None,
+    'A directory in which to keep a single copy of each dependency file,'
+    ' named by its SHA-256. Files in --output_dir are hard linked to it.')
 flags.DEFINE_string(
     'discovery_server',
     'www.googleapis.com',
@@ -64,6 +109,15 @@ flags.DEFINE_string(
     'discovery_version',
     DISCOVERY_API_VERSION,
     'The discovery version to use for loading "api_name"')
+flags.DEFINE_integer(
+    'fragment_cache_size',
+    0,
+    'The number of rendered template fragments to remember and reuse.'
+    ' 0 disables the cache.')
+flags.DEFINE_boolean(
+    'fsync_output',
+    False,
+    'Flush the files written to --output_dir to disk before finishing.')
 flags.DEFINE_boolean(
     'include_timestamp',
     False,
@@ -81,15 +135,30 @@ flags.DEFINE_string(
     'language_variant',
     'default',
     'which variant of "language" to generate for. E.g. "stable" vs. "head".')
+flags.DEFINE_string(
+    'manifest_file',
+    None,
+    'A path to write a JSON manifest of the generated files to. It gives the'
+    ' path, size and SHA-256 of each file, and the template and API element'
+    ' it was generated from.')
 flags.DEFINE_string(
     'output_dir',
     None,
     'A path to a directory where the generated files will be created.')
-flags.DEFINE_string(
+flags.DEFINE_multistring(
     'output_file',
     None,
     'An output file path to contain the archive for the generated library.'
-    ' The contents of the file are determined by the output_format parameter')
+    ' May be repeated, and combined with --output_dir, to write the library'
+    ' to several places while only generating it once. The format of each'
+    ' file is given by --output_format, or else by its extension.'
+    ' Use - to write the archive to standard output.')
+flags.DEFINE_enum(
+    'output_format',
+    'zip',
+    ['tar', 'tgz', 'txz', 'zip'],
+    'The archive format for --output_file. If not given, it is chosen from'
+    ' the extension of each output file, or is zip.')
 flags.DEFINE_enum(
     'output_type',
     'plain',
@@ -98,28 +167,101 @@ flags.DEFINE_enum(
     ' plain=just the source,'
     ' full=turn on all the optional parts (useful for testing the generator).'
     )
+flags.DEFINE_boolean(
+    'merge_identical_schemas',
+    False,
+    'Generate one class for all the objects defined in line identically, in'
+    ' method requests and responses or schema properties, rather than one'
+    ' for each, and log how many classes were merged.')
+flags.DEFINE_list(
+    'methods',
+    None,
+    'Generate the library for only these methods, and the schemas they use.'
+    ' Each is the wire names of the resources holding it and its own, joined'
+    ' with ".", or a glob of them. E.g. "activities.list,people.*".')
+flags.DEFINE_boolean(
+    'plan',
+    False,
+    'Instead of generating the library, write a JSON list of the files it'
+    ' would contain, and the template each is generated from, to standard'
+    ' output. No template is rendered.')
+flags.DEFINE_boolean(
+    'reference_dependencies',
+    False,
+    'Instead of including the dependency files, write a dependencies.json'
+    ' manifest giving the path, size and SHA-256 of each.')
+flags.DEFINE_boolean(
+    'remove_stale_files',
+    False,
+    'Remove files in --output_dir which were not generated by this run.')
+flags.DEFINE_list(
+    'resources',
+    None,
+    'Generate the library for only these resources, with all their methods'
+    ' and sub resources, and the schemas they use. Named like --methods.')
+flags.DEFINE_integer(
+    'render_processes',
+    0,
+    'The number of worker processes used to render the per-model files.'
+    ' 0 or 1 renders them serially.')
 flags.DEFINE_bool('version_package', False, 'Put API version in package paths')
 
+flags.DECLARE_key_flag('api_cache_dir')
+flags.DECLARE_key_flag('api_cache_size')
 flags.DECLARE_key_flag('api_name')
 flags.DECLARE_key_flag('api_version')
+flags.DECLARE_key_flag('atomic_output')
+flags.DECLARE_key_flag('compression')
+flags.DECLARE_key_flag('compression_level')
+flags.DECLARE_key_flag('dependency_store')
 flags.DECLARE_key_flag('discovery_server')
 flags.DECLARE_key_flag('discovery_version')
+flags.DECLARE_key_flag('fragment_cache_size')
+flags.DECLARE_key_flag('fsync_output')
 flags.DECLARE_key_flag('include_timestamp')
 flags.DECLARE_key_flag('input')
 flags.DECLARE_key_flag('language')
 flags.DECLARE_key_flag('language_variant')
+flags.DECLARE_key_flag('manifest_file')
+flags.DECLARE_key_flag('merge_identical_schemas')
+flags.DECLARE_key_flag('methods')
 flags.DECLARE_key_flag('output_dir')
 flags.DECLARE_key_flag('output_file')
+flags.DECLARE_key_flag('output_format')
 flags.DECLARE_key_flag('output_type')
+flags.DECLARE_key_flag('plan')
+flags.DECLARE_key_flag('reference_dependencies')
+flags.DECLARE_key_flag('remove_stale_files')
+flags.DECLARE_key_flag('render_processes')
+flags.DECLARE_key_flag('resources')
 flags.DECLARE_key_flag('version_package')
 
 
+def _OutputFormat(path):
+  """Returns the archive format to write an output file in.
+
+  Args:
+    path: (str) The path of the output file.
+  Returns:
+    (str) --output_format if it was given, else the format named by the
+    extension of path, else 'zip'.
+  """
+  if FLAGS['output_format'].present:
+    return FLAGS.output_format
+  for extension, output_format in _OUTPUT_FORMAT_EXTENSIONS:
+    if path.endswith(extension):
+      return output_format
+  return 'zip'
+
+
 def main(unused_argv):
   if not (FLAGS.api_name or FLAGS.input):
     raise app.UsageError('You must specify one of --api_name or --input')
-  if not (FLAGS.output_dir or FLAGS.output_file):
+  if not (FLAGS.output_dir or FLAGS.output_file or FLAGS.plan):
     raise app.UsageError(
-        'You must specify one of --output_dir or --output_file')
+        'You must specify --output_dir or --output_file')
+  if (FLAGS.output_file or []).count('-') > 1:
+    raise app.UsageError('Only one --output_file may be standard output')
 
   # Get the discovery document
   if FLAGS.api_name:
@@ -137,66 +279,116 @@ def main(unused_argv):
       raise app.Error(error)
   else:
     f = open(FLAGS.input)
-    discovery_doc = simplejson.loads(f.read())
+    content = f.read()
     f.close()
+    if not FLAGS.api_cache_dir:
+      discovery_doc = simplejson.loads(content)
 
   options = {
-      # Emit a manifest file like a source jar
-      'emit_manifest': False,
+      # How to compress archive outputs
+      'compression': FLAGS.compression,
+      'compression_level': FLAGS.compression_level,
+      # A directory to keep a single copy of each dependency in
+      'dependency_store': FLAGS.dependency_store,
       # Include other files needed to compile (e.g. base jar files)
-      'include_dependencies': True,  # WARNING - change to false before commit
-      # Put all the sources into a source jar
-      'include_source_jar': False,
+      'include_dependencies': True,
       # Include the timestamp in the generated library
       'include_timestamp': FLAGS.include_timestamp,
-      # Prefix paths in the output with the library name
-      'use_library_name_in_path': False,
+      # List the dependencies by hash, rather than including them
+      'reference_dependencies': FLAGS.reference_dependencies,
+      # Number of worker processes to render per-model files with
+      'render_processes': FLAGS.render_processes,
       # Put API version in the package
       'version_package': FLAGS.version_package,
       }
   if FLAGS.output_type == 'full':
-    options['emit_manifest'] = True
-    options['include_dependencies'] = True
-    options['include_source_jar'] = True
-    options['use_library_name_in_path'] = True
-
-  # Instantiate the right code generator
-  generators = {
-      'csharp': CSharpGenerator,
-      'go': GoGenerator,
-      'gwt': GwtGenerator,
-      'java': JavaGenerator,
-      'objc': ObjCGenerator,
-      'php': PHPGenerator,
-      }
-  if FLAGS.language in generators:
-    generator = generators[FLAGS.language](discovery_doc, options=options)
-  else:
+    options.update(library_generator.FULL_OUTPUT_OPTIONS)
+
+  if FLAGS.language not in library_generator.Languages():
     raise app.UsageError('Unsupported language option: %s' % FLAGS.language)
 
-  # Get the path to the template set.
-  language_variants = Targets().TargetsForLanguage(FLAGS.language)
-  variant_features = language_variants[FLAGS.language_variant]
-  template_dir = os.path.join(
-      os.path.dirname(__file__), FLAGS.language, variant_features['path'])
-  generator.SetTemplateDir(template_dir)
-  generator.SetSurfaceFeatures(variant_features)
+  api_cache = None
+  if FLAGS.api_cache_dir:
+    api_cache = ApiCache(FLAGS.api_cache_dir, FLAGS.api_cache_size << 20)
+    discovery_doc = content
+  try:
+    the_api = library_generator.LoadApi(
+        discovery_doc, FLAGS.language, api_cache, resources=FLAGS.resources,
+        methods=FLAGS.methods,
+        merge_identical_schemas=FLAGS.merge_identical_schemas)
+  except ValueError, e:
+    raise app.UsageError(str(e))
+  if FLAGS.merge_identical_schemas:
+    logging.info('%d anonymous schemas merged with identical ones',
+                 the_api.merged_schema_count)
 
-  # Get an output writer
+  if FLAGS.plan:
+    try:
+      package_writer = library_generator.GenerateLibrary(
+          the_api, FLAGS.language, FLAGS.language_variant, options,
+          plan=True)
+    except ValueError, e:
+      raise app.UsageError(str(e))
+    package_writer.WritePlan(sys.stdout)
+    return 0
+
+  # Get an output writer for each output
+  package_writers = []
+  output_streams = []
   if FLAGS.output_dir:
-    package_writer = FilesystemLibraryPackage(FLAGS.output_dir)
+    directory_writer = FilesystemLibraryPackage(
+        FLAGS.output_dir, remove_stale_files=FLAGS.remove_stale_files,
+        atomic=FLAGS.atomic_output, fsync=FLAGS.fsync_output)
+    package_writers.append(directory_writer)
+  for output_file in FLAGS.output_file or []:
+    output_format = _OutputFormat(output_file)
+    if output_file == '-':
+      out = sys.stdout
+    else:
+      out = open(output_file, 'wb')
+      output_streams.append(out)
+    if output_format == 'zip':
+      package_writers.append(ZipLibraryPackage(
+          out, compression=COMPRESSION_METHODS[FLAGS.compression],
+          compression_level=FLAGS.compression_level))
+    else:
+      tar_compression = {'tar': None, 'tgz': 'gz', 'txz': 'xz'}
+      package_writers.append(TarLibraryPackage(
+          out, compression=tar_compression[output_format],
+          compression_level=FLAGS.compression_level))
+  if len(package_writers) == 1:
+    package_writer = package_writers[0]
   else:
-    out = open(FLAGS.output_file, 'w')
-    package_writer = ZipLibraryPackage(out)
+    package_writer = TeeLibraryPackage(package_writers)
+  if FLAGS.manifest_file:
+    package_writer = ManifestLibraryPackage(package_writer)
 
-  if options.get('emit_manifest'):
-    package_writer.IncludeMinimalJarManifest(
-        created_by='1.0.0-googleapis-v1 (Google Inc.)')
+  template_helpers.SetFragmentCacheSize(FLAGS.fragment_cache_size)
   # do it
-  generator.GeneratePackage(package_writer)
-  package_writer.DoneWritingArchive()
-  if FLAGS.output_file:
+  generated = False
+  try:
+    try:
+      library_generator.GenerateLibrary(the_api, FLAGS.language,
+                                        FLAGS.language_variant, options,
+                                        package_writer)
+      generated = True
+    except ValueError, e:
+      raise app.UsageError(str(e))
+  finally:
+    # Do not leave a partly staged library behind.
+    if FLAGS.output_dir and not generated:
+      directory_writer.Abort()
+  if FLAGS.output_dir:
+    logging.info('%(written)d files written, %(unchanged)d unchanged,'
+                 ' %(removed)d removed', directory_writer.Statistics())
+  for out in output_streams:
     out.close()
+  if FLAGS.manifest_file:
+    out = open(FLAGS.manifest_file, 'w')
+    try:
+      package_writer.WriteManifest(out)
+    finally:
+      out.close()
   return 0
 
 if __name__ == '__main__':
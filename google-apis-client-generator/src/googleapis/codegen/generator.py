@@ -22,6 +22,7 @@ This module holds the base classes used for all code generators
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
 import datetime
+import itertools
 import os
 import re
 import time
@@ -29,9 +30,18 @@ import urlparse
 
 
 
+from googleapis.codegen import utilities
+from googleapis.codegen.anyjson import simplejson
+from googleapis.codegen.api import Api
+from googleapis.codegen.blob_store import BlobStore
+from googleapis.codegen.blob_store import FileDigest
 from googleapis.codegen.django_helpers import DjangoRenderTemplate
+from googleapis.codegen.django_helpers import DjangoRenderTemplateToStream
 from googleapis.codegen.language_model import LanguageModel
+from googleapis.codegen.template_objects import ActiveOverlay
+from googleapis.codegen.template_objects import Overlay
 from googleapis.codegen.template_objects import UseableInTemplates
+from googleapis.codegen.zip_library_package import COMPRESSION_METHODS
 from googleapis.codegen.zip_library_package import ZipLibraryPackage
 
 # This block is static information about the generator which will get passed
@@ -48,6 +58,16 @@ _DEFAULT_SERVICE_HOST = 'https://www.googleapis.com'
 _SPECIAL_FILENAMES = ['app_yaml']
 
 
+def _RenderTemplateForElement(shared, index):
+  """Render a template for one element of a list. Used by ParallelMap."""
+  generator, overlay, template_path, name_to_bind, elements, variables = shared
+  d = dict(variables)
+  d[name_to_bind] = elements[index]
+  if overlay:
+    return overlay.Call(generator.RenderTemplate, template_path, d)
+  return generator.RenderTemplate(template_path, d)
+
+
 class TemplateGenerator(object):
   """Base class for walking a template tree to generate output files.
 
@@ -65,6 +85,8 @@ class TemplateGenerator(object):
     self._template_dir = None
     self._surface_features = {}
     self._language_model = language_model or LanguageModel()
+    # Whether GeneratePackage is only listing the files, for PlanPackage.
+    self._planning = False
 
   @property
   def language_model(self):
@@ -76,17 +98,56 @@ class TemplateGenerator(object):
     Walks a file tree relative to the the target language, copying all files
     found into an output package.
 
+    If the 'dependency_store' option names a directory, each file is added to
+    a BlobStore there, and included in the package from the store. If the
+    'reference_dependencies' option is set, the files are not included at
+    all. Instead a JSON manifest, <path_to_tree>.json, gives the path, size
+    and SHA-256 of each. While planning, the files are not read, and it gives
+    only the path and size.
+
     Args:
       path_to_tree: (str) path relative to the language template directory
       package: (LibraryPackage) output package.
     """
     top_of_tree = os.path.join(self._template_dir, path_to_tree)
+    store = None
+    if self._options.get('dependency_store') and not self._planning:
+      store = BlobStore(self._options['dependency_store'])
+    reference_files = self._options.get('reference_dependencies')
+    references = []
     # Walk tree for jar files to directly include
-    for root, unused_dirs, file_names in os.walk(top_of_tree):
-      for file_name in file_names:
+    for root, dirs, file_names in os.walk(top_of_tree):
+      # Sort the walk, so the package is written in the same order everywhere.
+      dirs.sort()
+      for file_name in sorted(file_names):
         path = os.path.join(root, file_name)
         relative_path = path[len(top_of_tree)+1:]
-        package.IncludeFile(path, relative_path)
+        if store:
+          digest = store.Add(path)
+        elif reference_files and not self._planning:
+          digest = FileDigest(path)
+        if reference_files:
+          reference = {'path': relative_path, 'size': os.path.getsize(path)}
+          # A plan does not keep the manifest, so the files are not hashed.
+          if not self._planning:
+            reference['sha256'] = digest
+          references.append(reference)
+          continue
+        if store:
+          package.IncludeStoredFile(store, digest, relative_path)
+        else:
+          package.IncludeFile(path, relative_path)
+        package.SetFileSource(self._TemplateSource(path))
+    if reference_files:
+      out = package.StartFile('%s.json' % path_to_tree)
+      out.write(simplejson.dumps({'files': references}, indent=2,
+                                 separators=(',', ': '), sort_keys=True))
+      out.write('\n')
+      package.EndFile()
+
+  def _TemplateSource(self, path):
+    """Returns the path of a template file, relative to the template dir."""
+    return os.path.relpath(path, self._template_dir)
 
   def PathToTemplate(self, template_name):
     """Returns the full path to a template."""
@@ -104,6 +165,28 @@ class TemplateGenerator(object):
     Returns:
       (str) The fully rendered template string.
     """
+    return DjangoRenderTemplate(template_path,
+                                self._TemplateVariables(context_dict))
+
+  def RenderTemplateToStream(self, template_path, context_dict, stream):
+    """Render a template, writing it to a stream as it is produced.
+
+    Renders a template with the standard dictionary of bindings. The text is
+    written in pieces, so the whole file need never be held in memory.
+
+    Args:
+      template_path: (str) Full path to a template.
+      context_dict: (dict) A dictionary to augment the standard template
+        dictionary.
+      stream: (file) A file-like object to write the rendered text to.
+    """
+    if self._planning:
+      return
+    DjangoRenderTemplateToStream(template_path,
+                                 self._TemplateVariables(context_dict), stream)
+
+  def _TemplateVariables(self, context_dict):
+    """Returns the standard template variables, augmented by context_dict."""
     variables_dict = {
         'tool': self._tool_info,  # Information about the build tool
         'options': self._options,  # Options for this invocation
@@ -111,7 +194,7 @@ class TemplateGenerator(object):
         'surfaceFeatures': self._surface_features,  # sub language options
         }
     variables_dict.update(context_dict)
-    return DjangoRenderTemplate(template_path, variables_dict)
+    return variables_dict
 
   def WalkTemplateTree(self, path_to_tree, path_replacements, list_replacements,
                        variables, package):
@@ -138,19 +221,21 @@ class TemplateGenerator(object):
     top_of_tree = os.path.join(self._template_dir, path_to_tree)
     # Walk tree for jar files to directly include
     variables.update({'template_dir': top_of_tree})
-    for root, unused_dirs, file_names in os.walk(top_of_tree):
-      for file_name in file_names:
+    for root, dirs, file_names in os.walk(top_of_tree):
+      # Sort the walk, so the package is written in the same order everywhere.
+      dirs.sort()
+      for file_name in sorted(file_names):
         path = os.path.join(root, file_name)
         relative_path = root[len(top_of_tree)+1:]
         if not relative_path:
           relative_path = '.'
 
         # Perform the replacements on the path and file name
-        for path_item, replacement in path_replacements.iteritems():
+        for path_item, replacement in sorted(path_replacements.iteritems()):
           relative_path = relative_path.replace(path_item, replacement)
-        for path_item, replacement in path_replacements.iteritems():
+        for path_item, replacement in sorted(path_replacements.iteritems()):
           file_name = file_name.replace(path_item, replacement)
-        for path_item, call_info in list_replacements.iteritems():
+        for path_item, call_info in sorted(list_replacements.iteritems()):
           if file_name.find(path_item) >= 0:
             self.GenerateListOfFiles(path_item, call_info, path, relative_path,
                                      file_name, variables, package)
@@ -163,10 +248,12 @@ class TemplateGenerator(object):
           if name_in_zip in _SPECIAL_FILENAMES:
             name_in_zip = name_in_zip.replace('_', '.')
           out = package.StartFile('%s/%s' % (relative_path, name_in_zip))
-          out.write(self.RenderTemplate(path, variables))
+          package.SetFileSource(self._TemplateSource(path))
+          self.RenderTemplateToStream(path, variables, out)
           package.EndFile()
         else:
           package.IncludeFile(path, '%s/%s' % (relative_path, file_name))
+          package.SetFileSource(self._TemplateSource(path))
 
   def GeneratePackage(self, package_writer):
     """Generate the package.
@@ -179,6 +266,24 @@ class TemplateGenerator(object):
     raise NotImplementedError(
         'GeneratePackage must be implmented by all subclasses')
 
+  def PlanPackage(self, package_writer):
+    """List the files of the package, without generating their contents.
+
+    The package is generated as usual, so the API is annotated and the file
+    names worked out just as they would be, except that no template is
+    rendered. Every rendered file is left empty, and nothing is added to a
+    dependency store.
+
+    Args:
+      package_writer: (LibraryPackage) output package. Usually a
+        PlanLibraryPackage, which records the files without their contents.
+    """
+    self._planning = True
+    try:
+      self.GeneratePackage(package_writer)
+    finally:
+      self._planning = False
+
   def DefaultGeneratePackage(self, package_writer, path_replacements,
                              variables):
     """Default operations to generate the package.
@@ -242,23 +347,70 @@ class TemplateGenerator(object):
           ' contain a variable for substitution. E.g. "___models_codeName___"')
     variable_name = match_obj.group(1)
     file_name_piece_to_replace = path_prefix + variable_name + '___'
-    for element in call_info[1]:
+    elements = call_info[1]
+    if (self._options.get('render_processes') or 0) > 1:
+      renderings = self.RenderTemplateForEach(template_path, call_info[0],
+                                              elements, variables)
+    else:
+      # Render each file straight into the package instead.
+      renderings = itertools.repeat(None)
+    for rendering, element in itertools.izip(renderings, elements):
       file_name = template_file_name.replace(
           file_name_piece_to_replace, element.values[variable_name])
       name_in_zip = file_name[:-5]  # strip '.tmpl'
       out = package.StartFile('%s/%s' % (relative_path, name_in_zip))
-      d = dict(variables)
-      d[call_info[0]] = element
-      out.write(self.RenderTemplate(template_path, d))
+      package.SetFileSource(
+          self._TemplateSource(template_path),
+          '%s %s' % (call_info[0], element.values[variable_name]))
+      if rendering is None:
+        d = dict(variables)
+        d[call_info[0]] = element
+        self.RenderTemplateToStream(template_path, d, out)
+      else:
+        out.write(rendering)
       package.EndFile()
 
+  def RenderTemplateForEach(self, template_path, name_to_bind, elements,
+                            variables):
+    """Render a template once for each element of a list.
+
+    If the 'render_processes' option is greater than 1, the renderings are done
+    by a pool of worker processes, when called from the main thread. Each
+    worker is sent a snapshot of this generator, the elements and the variables
+    once, when it starts. Either way, the renderings come back in the order of
+    the elements, so the output does not depend on how it was rendered.
+
+    Args:
+      template_path: (str) Full path to a template.
+      name_to_bind: (str) The template variable to bind each element to.
+      elements: (list) The CodeObjects to render the template for.
+      variables: (dict) The dictionary of variable replacements to pass to the
+         templates.
+    Returns:
+      An iterator over the rendered template for each element, in order.
+    """
+    if self._planning:
+      return [''] * len(elements)
+    # Everything is pickled together, so the objects shared between the api
+    # tree, the elements and the variables are still shared in the workers.
+    # The workers render with the Overlay active here, if there is one.
+    return utilities.ParallelMap(
+        _RenderTemplateForElement,
+        (self, ActiveOverlay(), template_path, name_to_bind, elements,
+         variables),
+        len(elements), self._options.get('render_processes'))
+
 
 class ToolInformation(UseableInTemplates):
   """Defines information about this generator tool itself."""
 
   def __init__(self):
     super(ToolInformation, self).__init__(_GENERATOR_INFORMATION)
-    now = datetime.datetime.utcnow()
+    epoch = utilities.SourceDateEpoch()
+    if epoch is None:
+      now = datetime.datetime.utcnow()
+    else:
+      now = datetime.datetime.utcfromtimestamp(epoch)
     self.SetTemplateValue('runDate',
                           '%4d-%02d-%02d' % (now.year, now.month, now.day))
     self.SetTemplateValue(
@@ -273,19 +425,35 @@ class ApiLibraryGenerator(TemplateGenerator):
                options=dict()):
     """Construct an ApiLibraryGenerator.
 
+    The discovery may be given as an Api already loaded from it, so that one
+    Api can be shared by several generators, each annotating it in its own
+    Overlay. See GenerateInOverlay.
+
     Args:
       api_loader: (Api) Method which can construct an Api from discovery.
-      discovery: (dict) A discovery definition.
+      discovery: (dict|Api) A discovery definition, or an Api loaded from one
+          by api_loader.
       language: (str) The target language name. This has no semantic meaning
           other than to specify the template set to use.
       language_model: (LanguageModel) The target language data model.
       options: (dict) Code generator options.
+    Raises:
+      ValueError: if discovery is an Api which api_loader did not make.
     """
     super(ApiLibraryGenerator, self).__init__(language_model=language_model,
                                               options=options)
     # Load the API definition and an prepare it for generating code.
-    self._api = api_loader(discovery)
+    if isinstance(discovery, Api):
+      if not isinstance(discovery, api_loader):
+        raise ValueError('The %s generator needs an API loaded as a %s, not '
+                         'a %s' % (language, api_loader.__name__,
+                                   discovery.__class__.__name__))
+      self._api = discovery
+    else:
+      self._api = api_loader(discovery)
     self._language = language
+    # The language specific annotations of the api, made by GenerateInOverlay.
+    self._overlay = None
 
     # top level package for the generated code. The 'path' of the package is
     # used to expand '___package___' instances in file names found in the
@@ -294,6 +462,10 @@ class ApiLibraryGenerator(TemplateGenerator):
     # package for generated models, defaults to top level package
     self._model_package = None
 
+  @property
+  def api(self):
+    return self._api
+
   @property
   def package(self):
     return self._package
@@ -311,6 +483,25 @@ class ApiLibraryGenerator(TemplateGenerator):
     """
     self._package = package
 
+  def GenerateInOverlay(self, package_writer, plan=False):
+    """Generate the package, leaving the api as it was.
+
+    The language specific annotations are made in this generator's Overlay,
+    rather than in the api itself, so other generators may use the same api,
+    before, after, or at the same time in other threads. Each call starts
+    from a new Overlay, so the api is annotated afresh.
+
+    Args:
+      package_writer: (LibraryPackage) output package
+      plan: (bool) If True, only list the files of the package. See
+        PlanPackage.
+    """
+    self._overlay = Overlay()
+    if plan:
+      self._overlay.Call(self.PlanPackage, package_writer)
+    else:
+      self._overlay.Call(self.GeneratePackage, package_writer)
+
   def GeneratePackage(self, package_writer):
     """Generate the entire package of an API library.
 
@@ -326,14 +517,22 @@ class ApiLibraryGenerator(TemplateGenerator):
           '%s-%s' % (api.values['libraryNameBase'], self._language))
     source_package_writer = package_writer
     if self._options.get('include_source_jar'):
+      # The source jar is streamed into its entry as it is generated, so it is
+      # never held in memory whole. The package writer bounds what it buffers
+      # of the entry, and the jar spools any entry it must measure first.
       source_out = package_writer.StartFile(
           '%s-%s-src.jar' % (api.values['libraryNameBase'], self._language))
-      source_package_writer = ZipLibraryPackage(source_out)
+      source_package_writer = ZipLibraryPackage(
+          source_out,
+          compression=COMPRESSION_METHODS[
+              self._options.get('compression') or 'stored'],
+          compression_level=self._options.get('compression_level'))
       source_package_writer.IncludeMinimalJarManifest(
           created_by='1.0.0-googleapis-v1 (Google Inc.)')
     self.GenerateLibrarySource(api, source_package_writer)
     if package_writer != source_package_writer:
       source_package_writer.DoneWritingArchive()
+      package_writer.EndFile()
     if self._options.get('include_dependencies'):
       self.IncludeFileTree('dependencies', package_writer)
 
@@ -18,13 +18,115 @@
 
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
+import cStringIO
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+
 from google.apputils import basetest
+from googleapis.codegen import blob_store
+from googleapis.codegen import generator as generator_lib
+from googleapis.codegen import in_memory_library_package
+from googleapis.codegen import java_generator
+from googleapis.codegen import targets
+from googleapis.codegen import template_helpers
+from googleapis.codegen import zip_library_package
+from googleapis.codegen.anyjson import simplejson
 
 
 class GeneratorTest(basetest.TestCase):
 
-  def testNull(self):
-    pass
+  _CODEGEN_DIR = os.path.dirname(__file__)
+  _TEST_DATA_DIR = os.path.join(_CODEGEN_DIR, 'testdata')
+
+  def _GenerateJava(self, options):
+    """Generate the moderator API in Java and return the files by name."""
+    f = open(os.path.join(self._TEST_DATA_DIR, 'moderator.v1.json'))
+    discovery = simplejson.loads(f.read())
+    f.close()
+    generator = java_generator.JavaGenerator(discovery, options=options)
+    variant = targets.Targets().TargetsForLanguage('java')['default']
+    generator.SetTemplateDir(
+        os.path.join(self._CODEGEN_DIR, 'java', variant['path']))
+    generator.SetSurfaceFeatures(variant)
+    output = cStringIO.StringIO()
+    package = zip_library_package.ZipLibraryPackage(output)
+    generator.GeneratePackage(package)
+    package.DoneWritingArchive()
+    archive = zipfile.ZipFile(cStringIO.StringIO(output.getvalue()), 'r')
+    return [(info.filename, archive.read(info.filename))
+            for info in archive.infolist()]
+
+  def testParallelRenderingMatchesSerial(self):
+    serial = self._GenerateJava({})
+    parallel = self._GenerateJava({'render_processes': 3})
+    self.assertTrue(len(serial) > 3)
+    self.assertEquals(serial, parallel)
+
+  def testSourceJarMatchesPlainOutput(self):
+    plain = self._GenerateJava({})
+    with_jar = self._GenerateJava({'include_source_jar': True,
+                                   'compression': 'deflated'})
+    self.assertEquals(1, len(with_jar))
+    name, jar = with_jar[0]
+    self.assertTrue(name.endswith('-src.jar'))
+    archive = zipfile.ZipFile(cStringIO.StringIO(jar), 'r')
+    self.assertEquals('META-INF/MANIFEST.MF', archive.namelist()[0])
+    self.assertEquals(plain, [(info.filename, archive.read(info.filename))
+                              for info in archive.infolist()[1:]])
+
+  def testFragmentCacheDoesNotChangeOutput(self):
+    uncached = self._GenerateJava({})
+    template_helpers.SetFragmentCacheSize(1000)
+    try:
+      cached = self._GenerateJava({})
+      self.assertTrue(template_helpers.FragmentCacheStatistics()['hits'] > 0)
+    finally:
+      template_helpers.SetFragmentCacheSize(0)
+    self.assertEquals(uncached, cached)
+
+  def _IncludeTree(self, options, planning=False):
+    generator = generator_lib.TemplateGenerator(options=options)
+    generator.SetTemplateDir(self._TEST_DATA_DIR)
+    generator._planning = planning
+    package = in_memory_library_package.InMemoryLibraryPackage()
+    generator.IncludeFileTree('tree', package)
+    package.DoneWritingArchive()
+    return package.files
+
+  def testIncludeFileTree(self):
+    files = self._IncludeTree({})
+    self.assertEquals(['abc', 'def', 'subdir/123'], files.keys())
+
+    store_path = tempfile.mkdtemp()
+    try:
+      self.assertEquals(files,
+                        self._IncludeTree({'dependency_store': store_path}))
+      store = blob_store.BlobStore(store_path)
+      for contents in files.itervalues():
+        self.assertEquals(contents, open(store.Path(
+            hashlib.sha256(contents).hexdigest())).read())
+    finally:
+      shutil.rmtree(store_path)
+
+  def testReferenceDependencies(self):
+    files = self._IncludeTree({})
+    references = self._IncludeTree({'reference_dependencies': True})
+    self.assertEquals(['tree.json'], references.keys())
+    self.assertEquals(
+        [{'path': name, 'sha256': hashlib.sha256(contents).hexdigest(),
+          'size': len(contents)} for name, contents in files.iteritems()],
+        simplejson.loads(references['tree.json'])['files'])
+
+    # Planning lists the files without reading them.
+    references = self._IncludeTree({'reference_dependencies': True},
+                                   planning=True)
+    self.assertEquals(
+        [{'path': name, 'size': len(contents)}
+         for name, contents in files.iteritems()],
+        simplejson.loads(references['tree.json'])['files'])
 
   # TODO(user): Create tests for tree walking
 
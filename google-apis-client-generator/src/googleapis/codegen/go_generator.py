@@ -36,13 +36,16 @@ class GoGenerator(generator.ApiLibraryGenerator):
                                       language_model=GoLanguageModel(),
                                       options=options)
 
+  def AnnotateApi(self, the_api):
+    """Annotate the Api with Go specific elements."""
+    super(GoGenerator, self).AnnotateApi(the_api)
     # Main class name is package (and file) name in Go. Make it lower character
-    self._api.values['className'] = self._api.values['className'].lower()
+    the_api.SetTemplateValue('className', the_api.values['className'].lower())
 
     # Annotate resources with field name
-    for resource in self._api.values['resources']:
-      resource.values['accessorName'] = utilities.CamelCase(
-          resource.values['wireName'])
+    for resource in the_api.values['resources']:
+      resource.SetTemplateValue('accessorName', utilities.CamelCase(
+          resource.values['wireName']))
 
   def AnnotateMethod(self, the_api, method, resource):
     """Annotate a Method with Go specific elements."""
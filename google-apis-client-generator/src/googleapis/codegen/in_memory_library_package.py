@@ -0,0 +1,89 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A LibraryPackage that keeps the files in memory.
+
+This module implements the LibraryPackage interface for callers which embed
+the generator, and want the generated files without touching the disk.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import collections
+import cStringIO
+import zipfile
+
+from googleapis.codegen.library_package import LibraryPackage
+from googleapis.codegen.zip_library_package import ZipLibraryPackage
+
+
+class InMemoryLibraryPackage(LibraryPackage):
+  """The library package."""
+
+  def __init__(self):
+    """Create a new InMemoryLibraryPackage."""
+    super(InMemoryLibraryPackage, self).__init__()
+    self._files = collections.OrderedDict()
+    self._current_file_data = None
+    self._current_file_name = None
+
+  @property
+  def files(self):
+    """An ordered dict of the contents (str) of each file, by path."""
+    return self._files
+
+  def StartFile(self, name):
+    """Start writing a named file to the package.
+
+    Args:
+      name: (str) path which will identify the contents in the package.
+
+    Returns:
+      A file-like object to write the contents to.
+    """
+    self.EndFile()
+    self._current_file_data = cStringIO.StringIO()
+    self._current_file_name = '%s%s' % (self._file_path_prefix, name)
+    return self._current_file_data
+
+  def EndFile(self):
+    """Record the current output file."""
+    if self._current_file_data:
+      self._files[self._current_file_name] = (
+          self._current_file_data.getvalue())
+      self._current_file_data.close()
+      self._current_file_data = None
+      self._current_file_name = None
+
+  def DoneWritingArchive(self):
+    """Signal that we are done writing the entire package."""
+    self.EndFile()
+
+  def ZipArchive(self, compression=zipfile.ZIP_STORED):
+    """Returns the files as a zip archive.
+
+    Args:
+      compression: (int) zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+    Returns:
+      (str) The bytes of the archive.
+    """
+    self.EndFile()
+    output = cStringIO.StringIO()
+    package = ZipLibraryPackage(output, compression=compression)
+    for name, contents in self._files.iteritems():
+      package.StartFile(name).write(contents)
+    package.DoneWritingArchive()
+    return output.getvalue()
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+#
+# Copyright 2010 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for in_memory_library_package."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import cStringIO
+import os
+import zipfile
+
+from google.apputils import basetest
+from googleapis.codegen import in_memory_library_package
+
+
+class InMemoryLibraryPackageTest(basetest.TestCase):
+  _FILE_NAME = 'a_test'
+  _FILE_CONTENTS = 'this is a test'
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def testFiles(self):
+    package = in_memory_library_package.InMemoryLibraryPackage()
+    package.StartFile(self._FILE_NAME).write(self._FILE_CONTENTS)
+    package.StartFile('b/%s' % self._FILE_NAME).write(self._FILE_CONTENTS * 2)
+    package.IncludeFile(os.path.join(self._TEST_DATA_DIR, 'file1.txt'),
+                        'new_directory/file1.txt')
+    package.DoneWritingArchive()
+    self.assertEquals([self._FILE_NAME, 'b/%s' % self._FILE_NAME,
+                       'new_directory/file1.txt'], package.files.keys())
+    self.assertEquals(self._FILE_CONTENTS * 2,
+                      package.files['b/%s' % self._FILE_NAME])
+    self.assertEquals(
+        open(os.path.join(self._TEST_DATA_DIR, 'file1.txt')).read(),
+        package.files['new_directory/file1.txt'])
+
+  def testOutputPrefix(self):
+    package = in_memory_library_package.InMemoryLibraryPackage()
+    package.SetFilePathPrefix('abc/def')
+    package.StartFile(self._FILE_NAME).write(self._FILE_CONTENTS)
+    package.DoneWritingArchive()
+    self.assertEquals({'abc/def/%s' % self._FILE_NAME: self._FILE_CONTENTS},
+                      dict(package.files))
+
+  def testZipArchive(self):
+    package = in_memory_library_package.InMemoryLibraryPackage()
+    package.StartFile(self._FILE_NAME).write(self._FILE_CONTENTS)
+    package.StartFile('b').write(self._FILE_CONTENTS * 100)
+    package.DoneWritingArchive()
+    archive = zipfile.ZipFile(cStringIO.StringIO(
+        package.ZipArchive(zipfile.ZIP_DEFLATED)))
+    self.assertEquals([self._FILE_NAME, 'b'], archive.namelist())
+    self.assertEquals(self._FILE_CONTENTS * 100, archive.read('b'))
+
+
+if __name__ == '__main__':
+  basetest.main()
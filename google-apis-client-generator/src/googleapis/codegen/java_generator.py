@@ -40,6 +40,8 @@ class JavaGenerator(generator.ApiLibraryGenerator):
       language_model = JavaLanguageModel()
     super(JavaGenerator, self).__init__(JavaApi, discovery, language,
                                         language_model, options=options)
+    # Import managers for the classes of this library, by class name.
+    self._import_managers = {}
 
   def AnnotateApi(self, the_api):
     """Annotate the Api dictionary with Java specifics."""
@@ -87,7 +89,8 @@ class JavaGenerator(generator.ApiLibraryGenerator):
     """
     # Get the parent of this Property/Parameter.
     parent = element.schema
-    import_manager = JavaImportManager.GetCachedImportManager(parent)
+    import_manager = JavaImportManager.GetCachedImportManager(
+        parent, self._import_managers)
 
     def_dict = element.values
     json_type = def_dict.get('type', 'string')
@@ -18,10 +18,6 @@
 
 __author__ = 'rmistry@google.com (Ravi Mistry)'
 
-# Used to cache import managers to the class name of the schema they
-# correspond to.
-_CLASS_NAME_TO_IMPORT_MANAGER = {}
-
 
 class JavaImportManager(object):
   """The import manager for the Java code generator."""
@@ -43,7 +39,7 @@ class JavaImportManager(object):
     self._java_imports = set()
 
   @staticmethod
-  def GetCachedImportManager(element):
+  def GetCachedImportManager(element, cache):
     """Gets an import manager instance that corresponds to the class name.
 
     If the schema does not have a cached import manager, one is created
@@ -52,14 +48,16 @@ class JavaImportManager(object):
     Args:
       element: (Schema) or (Api). The element we want to create an import
         manager for.
+      cache: (dict) Import managers by class name. Each generated library has
+        its own, so one run can not leak state into the next.
     Returns:
       The import manager instance for this schema.
     """
-    import_mngr = _CLASS_NAME_TO_IMPORT_MANAGER.get(element.class_name)
+    import_mngr = cache.get(element.class_name)
     if not import_mngr:
       # This class does not have an import manager yet. Instantiate it.
       import_mngr = JavaImportManager(element)
-      _CLASS_NAME_TO_IMPORT_MANAGER[element.class_name] = import_mngr
+      cache[element.class_name] = import_mngr
     return import_mngr
 
   def ImportLists(self):
@@ -90,6 +90,19 @@ class JavaImportManagerTest(basetest.TestCase):
         datetime1_import,
         self.import_manager._class_name_to_qualified_name['DateTime'])
 
+  def testGetCachedImportManager(self):
+    cache = {}
+    schema = MockSchema()
+    schema.class_name = 'Activity'
+    import_manager = JavaImportManager.GetCachedImportManager(schema, cache)
+    self.assertTrue(import_manager is schema.GetTemplateValue('importManager'))
+    self.assertTrue(
+        import_manager is JavaImportManager.GetCachedImportManager(schema,
+                                                                   cache))
+    # A different cache, as for another library, has its own import managers.
+    self.assertFalse(
+        import_manager is JavaImportManager.GetCachedImportManager(schema, {}))
+
   def testGetClassName(self):
     self.assertTrue('Boolean',
                     self.import_manager.GetClassName('java.lang.Boolean'))
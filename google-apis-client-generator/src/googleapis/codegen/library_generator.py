@@ -0,0 +1,235 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Generate an API library from Python code.
+
+This is the library behind generate_library. It does not use flags, so it can
+be embedded in other programs, and may be called from several threads at once.
+Worker processes (the 'render_processes' option) are only used from the main
+thread, while no other thread is generating; see utilities.ParallelMap.
+
+Usage:
+  package = library_generator.GenerateLibrary(discovery_doc, 'java')
+  for path, contents in package.files.iteritems():
+    ...
+
+An API may be loaded once and used to generate several libraries, as long as
+they name things the same way. For example, Java and GWT:
+  the_api = library_generator.LoadApi(discovery_doc, 'java')
+  java_package = library_generator.GenerateLibrary(the_api, 'java')
+  gwt_package = library_generator.GenerateLibrary(the_api, 'gwt')
+
+A library may be generated for only some of the resources and methods of an
+API, selected by name or glob as described in discovery_subset:
+  package = library_generator.GenerateLibrary(discovery_doc, 'java',
+                                              resources=['activities'])
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import os
+
+from googleapis.codegen import discovery_subset
+from googleapis.codegen.anyjson import simplejson
+from googleapis.codegen.csharp_generator import CSharpApi
+from googleapis.codegen.csharp_generator import CSharpGenerator
+from googleapis.codegen.go_generator import GoApi
+from googleapis.codegen.go_generator import GoGenerator
+from googleapis.codegen.gwt_generator import GwtGenerator
+from googleapis.codegen.in_memory_library_package import InMemoryLibraryPackage
+from googleapis.codegen.java_generator import JavaApi
+from googleapis.codegen.java_generator import JavaGenerator
+from googleapis.codegen.objc_generator import ObjCApi
+from googleapis.codegen.objc_generator import ObjCGenerator
+from googleapis.codegen.php_generator import PHPApi
+from googleapis.codegen.php_generator import PHPGenerator
+from googleapis.codegen.plan_library_package import PlanLibraryPackage
+from googleapis.codegen.targets import Targets
+
+# The code generator for each language.
+_GENERATORS = {
+    'csharp': CSharpGenerator,
+    'go': GoGenerator,
+    'gwt': GwtGenerator,
+    'java': JavaGenerator,
+    'objc': ObjCGenerator,
+    'php': PHPGenerator,
+    }
+
+# The Api class each language's generator loads the API as. Languages with the
+# same Api class can share a loaded API.
+_API_CLASSES = {
+    'csharp': CSharpApi,
+    'go': GoApi,
+    'gwt': JavaApi,
+    'java': JavaApi,
+    'objc': ObjCApi,
+    'php': PHPApi,
+    }
+
+# The options used when the caller does not give them.
+_DEFAULT_OPTIONS = {
+    # A directory to keep a single copy of each dependency in
+    'dependency_store': None,
+    # Emit a manifest file like a source jar
+    'emit_manifest': False,
+    # Include other files needed to compile (e.g. base jar files)
+    'include_dependencies': False,
+    # Put all the sources into a source jar
+    'include_source_jar': False,
+    # Include the timestamp in the generated library
+    'include_timestamp': False,
+    # List the dependencies by hash, rather than including them
+    'reference_dependencies': False,
+    # Number of worker processes to render per-model files with
+    'render_processes': 0,
+    # Prefix paths in the output with the library name
+    'use_library_name_in_path': False,
+    # Put API version in the package
+    'version_package': False,
+    }
+
+# The options which turn on all the optional parts of a library.
+FULL_OUTPUT_OPTIONS = {
+    'emit_manifest': True,
+    'include_dependencies': True,
+    'include_source_jar': True,
+    'use_library_name_in_path': True,
+    }
+
+
+def Languages():
+  """Returns the names of the languages libraries can be generated for."""
+  return sorted(_GENERATORS)
+
+
+def LoadApi(discovery_doc, language, api_cache=None, resources=None,
+            methods=None, merge_identical_schemas=False):
+  """Load an API, to generate one or more libraries from.
+
+  The Api is never changed by generating a library from it, so it may be used
+  for any number of libraries, including from several threads at once. Only
+  the main thread renders with worker processes, though.
+
+  Args:
+    discovery_doc: (dict|str) The discovery document of the API, or its text.
+    language: (str) The language, or one of the languages, the libraries will
+      be generated in. E.g. 'java'.
+    api_cache: (ApiCache) If given, the Api is taken from this cache, or
+      loaded and added to it. discovery_doc must be the text of the document.
+    resources: (list) If given, the names or globs of the resources to load.
+      See discovery_subset.SelectParts.
+    methods: (list) If given, the names or globs of the methods to load.
+    merge_identical_schemas: (bool) If True, anonymous schemas defined
+      identically are made one class. See Api.MergeIdenticalSchemas.
+  Returns:
+    (Api) The Api, which GenerateLibrary can use for any language which
+    SharesApi with language.
+  Raises:
+    ValueError: if the language is not supported, an api_cache is given
+      with a dict, or a resource or method selected matches nothing.
+  """
+  api_class = _API_CLASSES.get(language)
+  if not api_class:
+    raise ValueError('Unsupported language: %s' % language)
+  if api_cache:
+    if not isinstance(discovery_doc, basestring):
+      raise ValueError('An API cache needs the text of the discovery document')
+    return api_cache.LoadApi(
+        discovery_doc, api_class, resources=resources, methods=methods,
+        merge_identical_schemas=merge_identical_schemas)
+  if isinstance(discovery_doc, basestring):
+    discovery_doc = simplejson.loads(discovery_doc)
+  the_api = api_class(discovery_subset.SelectParts(discovery_doc, resources,
+                                                   methods))
+  if merge_identical_schemas:
+    the_api.MergeIdenticalSchemas()
+  return the_api
+
+
+def SharesApi(language, other_language):
+  """Returns whether an Api loaded for one language can be used for another."""
+  return (language in _API_CLASSES and
+          _API_CLASSES.get(language) is _API_CLASSES.get(other_language))
+
+
+def GenerateLibrary(discovery_doc, language, language_variant='default',
+                    options=None, package_writer=None, plan=False,
+                    resources=None, methods=None,
+                    merge_identical_schemas=False):
+  """Generate the library for an API.
+
+  Args:
+    discovery_doc: (dict|Api) The discovery document of the API, or an Api
+      made from it by LoadApi.
+    language: (str) The language to generate the library in. E.g. 'java'.
+    language_variant: (str) Which variant of the language to generate for.
+      E.g. 'stable'.
+    options: (dict) Code generator options, overriding the defaults. The
+      'render_processes' option is ignored off the main thread, which renders
+      serially, and must not be set while other threads are generating.
+    package_writer: (LibraryPackage) The package to write the library to. If
+      None, an InMemoryLibraryPackage, or when planning a PlanLibraryPackage,
+      is used.
+    plan: (bool) If True, only list the files of the library, without
+      rendering them. See TemplateGenerator.PlanPackage.
+    resources: (list) If given, the names or globs of the resources to
+      generate. See discovery_subset.SelectParts.
+    methods: (list) If given, the names or globs of the methods to generate.
+    merge_identical_schemas: (bool) If True, anonymous schemas defined
+      identically are generated as one class. See Api.MergeIdenticalSchemas.
+  Returns:
+    (LibraryPackage) package_writer, after DoneWritingArchive has been called.
+  Raises:
+    ValueError: if the language or variant is not supported, the Api was
+      loaded for a language it does not share Apis with, resources or methods
+      are selected or schemas merged in an Api rather than when it is loaded,
+      or the resources or methods match nothing.
+  """
+  generator_class = _GENERATORS.get(language)
+  if not generator_class:
+    raise ValueError('Unsupported language: %s' % language)
+  variant_features = Targets().TargetsForLanguage(language).get(
+      language_variant)
+  if not variant_features:
+    raise ValueError('Unsupported variant of %s: %s' % (language,
+                                                        language_variant))
+  if resources or methods or merge_identical_schemas:
+    if not isinstance(discovery_doc, dict):
+      raise ValueError('Select resources and methods, and merge schemas, when'
+                       ' loading the API')
+    discovery_doc = LoadApi(discovery_doc, language, resources=resources,
+                            methods=methods,
+                            merge_identical_schemas=merge_identical_schemas)
+  generator_options = dict(_DEFAULT_OPTIONS)
+  generator_options.update(options or {})
+
+  generator = generator_class(discovery_doc, options=generator_options)
+  generator.SetTemplateDir(os.path.join(os.path.dirname(__file__), language,
+                                        variant_features['path']))
+  generator.SetSurfaceFeatures(variant_features)
+
+  if package_writer is None:
+    if plan:
+      package_writer = PlanLibraryPackage()
+    else:
+      package_writer = InMemoryLibraryPackage()
+  if generator_options.get('emit_manifest'):
+    package_writer.IncludeMinimalJarManifest(
+        created_by='1.0.0-googleapis-v1 (Google Inc.)')
+  generator.GenerateInOverlay(package_writer, plan=plan)
+  package_writer.DoneWritingArchive()
+  return package_writer
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+#
+# Copyright 2010 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for library_generator."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import os
+import shutil
+import tempfile
+import threading
+
+from google.apputils import basetest
+from googleapis.codegen import library_generator
+from googleapis.codegen.api_cache import ApiCache
+from googleapis.codegen.anyjson import simplejson
+
+
+class LibraryGeneratorTest(basetest.TestCase):
+
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def setUp(self):
+    f = open(os.path.join(self._TEST_DATA_DIR, 'moderator.v1.json'))
+    self._discovery_json = f.read()
+    f.close()
+    self._discovery = simplejson.loads(self._discovery_json)
+
+  def testGenerateInMemory(self):
+    package = library_generator.GenerateLibrary(self._discovery, 'java')
+    sources = [name for name in package.files if name.endswith('.java')]
+    self.assertTrue(len(sources) > 3)
+    for name in sources:
+      self.assertTrue(package.files[name])
+
+  def testOptionsAreApplied(self):
+    package = library_generator.GenerateLibrary(
+        self._discovery, 'java', options={'include_source_jar': True})
+    self.assertEquals(1, len(package.files))
+    self.assertTrue(package.files.keys()[0].endswith('-src.jar'))
+
+  def testGenerateFromThreads(self):
+    serial = library_generator.GenerateLibrary(self._discovery, 'java').files
+    results = [None] * 4
+
+    def Generate(index):
+      results[index] = library_generator.GenerateLibrary(
+          self._discovery, 'java').files
+
+    threads = [threading.Thread(target=Generate, args=(i,))
+               for i in xrange(len(results))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    for files in results:
+      self.assertEquals(serial, files)
+
+  def testPlan(self):
+    package = library_generator.GenerateLibrary(self._discovery, 'java')
+    plan = library_generator.GenerateLibrary(self._discovery, 'java',
+                                             plan=True)
+    self.assertEquals(package.files.keys(),
+                      [entry['path'] for entry in plan.files])
+    sources = dict((entry['path'], entry['source']) for entry in plan.files)
+    self.assertEquals(
+        'templates/src/main/java/___package___/model/'
+        '___models_className___.java.tmpl',
+        sources['src/main/java/com/google/api/services/moderator/model/'
+                'Profile.java'])
+
+  def testSharedApi(self):
+    targets = [('java', 'default'), ('gwt', 'stable'), ('java', 'stable'),
+               ('php', 'default'), ('go', 'default'), ('objc', 'experimental')]
+    expected = [library_generator.GenerateLibrary(self._discovery, language,
+                                                  variant).files
+                for language, variant in targets]
+    apis = {}
+    for language, unused_variant in targets:
+      for other in apis:
+        if library_generator.SharesApi(language, other):
+          apis[language] = apis[other]
+          break
+      else:
+        apis[language] = library_generator.LoadApi(self._discovery, language)
+    self.assertTrue(apis['java'] is apis['gwt'])
+    self.assertFalse(apis['java'] is apis['php'])
+
+    # Twice over, to show the first generation left the apis unchanged. The
+    # second time, the files are rendered by worker processes.
+    for render_processes in (0, 2):
+      for (language, variant), files in zip(targets, expected):
+        self.assertEquals(files, library_generator.GenerateLibrary(
+            apis[language], language, variant,
+            options={'render_processes': render_processes}).files)
+
+    results = [None] * len(targets)
+
+    def Generate(index):
+      language, variant = targets[index]
+      results[index] = library_generator.GenerateLibrary(
+          apis[language], language, variant).files
+
+    threads = [threading.Thread(target=Generate, args=(i,))
+               for i in xrange(len(results))]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEquals(expected, results)
+
+  def testCachedApi(self):
+    expected = library_generator.GenerateLibrary(self._discovery, 'php').files
+    cache_dir = tempfile.mkdtemp()
+    try:
+      for unused_i in xrange(2):
+        the_api = library_generator.LoadApi(self._discovery_json, 'php',
+                                            ApiCache(cache_dir))
+        self.assertEquals(expected, library_generator.GenerateLibrary(
+            the_api, 'php').files)
+      self.assertRaises(ValueError, library_generator.LoadApi,
+                        self._discovery, 'php', ApiCache(cache_dir))
+    finally:
+      shutil.rmtree(cache_dir)
+
+  def testSelectResources(self):
+    package = library_generator.GenerateLibrary(
+        self._discovery, 'java', resources=['tags'], plan=True)
+    models = sorted(os.path.basename(entry['path']) for entry in package.files
+                    if '/model/' in entry['path'])
+    self.assertEquals(['Tag.java', 'TagId.java', 'TagList.java'], models)
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+      the_api = library_generator.LoadApi(self._discovery_json, 'java',
+                                          ApiCache(cache_dir),
+                                          resources=['tags'])
+      self.assertEquals(['Tag', 'TagId', 'TagList'],
+                        [m.class_name for m in the_api.ModelClasses()])
+      self.assertRaises(ValueError, library_generator.GenerateLibrary,
+                        the_api, 'java', resources=['tags'])
+    finally:
+      shutil.rmtree(cache_dir)
+
+  def testApiOfAnotherLanguage(self):
+    the_api = library_generator.LoadApi(self._discovery, 'php')
+    self.assertRaises(ValueError, library_generator.GenerateLibrary,
+                      the_api, 'java')
+
+  def testUnsupportedLanguage(self):
+    self.assertRaises(ValueError, library_generator.GenerateLibrary,
+                      self._discovery, 'cobol')
+    self.assertRaises(ValueError, library_generator.GenerateLibrary,
+                      self._discovery, 'java', 'no_such_variant')
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -23,6 +23,10 @@ The two intended implementations are Zip files and direct to the file system.
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
 import os
+import shutil
+
+# How much of an included file to copy at a time.
+_COPY_CHUNK_SIZE = 1 << 16
 
 
 class LibraryPackage(object):
@@ -64,16 +68,34 @@ class LibraryPackage(object):
   def IncludeFile(self, path, name):
     """Read a file from disk into the archive.
 
+    The file is copied as binary, a piece at a time. Subclasses may override
+    this if they can include a file more efficiently.
+
     Args:
       path: (str) path to the file.
       name: (str) name the file should have in the archive.
     """
     output_stream = self.StartFile(name)
-    input_stream = open(path, 'r')
-    output_stream.write(input_stream.read())
-    input_stream.close()
+    input_stream = open(path, 'rb')
+    try:
+      shutil.copyfileobj(input_stream, output_stream, _COPY_CHUNK_SIZE)
+    finally:
+      input_stream.close()
     self.EndFile()
 
+  def IncludeStoredFile(self, store, digest, name):
+    """Include a file from a BlobStore in the archive.
+
+    Subclasses may override this if they can refer to the stored file rather
+    than copy it.
+
+    Args:
+      store: (BlobStore) The store holding the file.
+      digest: (str) The digest of the file in the store.
+      name: (str) name the file should have in the archive.
+    """
+    self.IncludeFile(store.Path(digest), name)
+
   def IncludeManyFiles(self, paths, strip_prefix='', new_prefix=None):
     """Include a list of many files.
 
@@ -95,6 +117,18 @@ class LibraryPackage(object):
         name = os.path.join(new_prefix, name)
       self.IncludeFile(path, name)
 
+  def SetFileSource(self, source, node=None):
+    """Note what the file last started or included was generated from.
+
+    Packages which keep a manifest record this. Others ignore it.
+
+    Args:
+      source: (str) The path of the template or file, relative to the
+        template directory.
+      node: (str) The element of the API the template was rendered for.
+    """
+    pass
+
   def SetFilePathPrefix(self, path):
     """Set a prefix to be prepended to any file names."""
     if not path.endswith('/'):
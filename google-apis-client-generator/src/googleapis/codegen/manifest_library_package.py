@@ -0,0 +1,172 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A LibraryPackage that keeps a manifest of the files written to another.
+
+The manifest lists the path, size and SHA-256 of each file in the package,
+and the template and API element it was generated from. It is accumulated as
+the files are written, so the package need not be read again to make it.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import hashlib
+import os
+
+from googleapis.codegen.anyjson import simplejson
+from googleapis.codegen.library_package import LibraryPackage
+
+
+class ManifestLibraryPackage(LibraryPackage):
+  """The library package."""
+
+  class _HashingStream(object):
+    """A write only file-like object which hashes what it writes."""
+    # Suppress spurious warnings about methods write and flush.
+    # pylint: disable-msg=C6409
+
+    def __init__(self, stream):
+      self._stream = stream
+      self.sha = hashlib.sha256()
+      self.size = 0
+
+    def write(self, s):
+      if isinstance(s, unicode):
+        s = str(s)
+      self.sha.update(s)
+      self.size += len(s)
+      self._stream.write(s)
+
+    def flush(self):
+      self._stream.flush()
+
+  def __init__(self, package, manifest_name=None):
+    """Create a new ManifestLibraryPackage.
+
+    Args:
+      package: (LibraryPackage) The package to write the files to.
+      manifest_name: (str) If given, the manifest is written into the package,
+        as a file of this name, when it is done.
+    """
+    super(ManifestLibraryPackage, self).__init__()
+    self._package = package
+    self._manifest_name = manifest_name
+    self._files = []
+    self._current_file_data = None
+
+  def StartFile(self, name):
+    """Start writing a named file to the package.
+
+    Args:
+      name: (str) path which will identify the contents in the package.
+
+    Returns:
+      A file-like object to write the contents to.
+    """
+    self.EndFile()
+    self._current_file_data = ManifestLibraryPackage._HashingStream(
+        self._package.StartFile(name))
+    self._AddEntry(name)
+    return self._current_file_data
+
+  def EndFile(self):
+    """Flush the current output file, and record its size and hash."""
+    if self._current_file_data:
+      self._package.EndFile()
+      self._files[-1]['size'] = self._current_file_data.size
+      self._files[-1]['sha256'] = self._current_file_data.sha.hexdigest()
+      self._current_file_data = None
+
+  def IncludeFile(self, path, name):
+    """Read a file from disk into the package.
+
+    The file is copied through the stream StartFile returns, rather than
+    included by the wrapped package, so it is hashed in the same read.
+
+    Args:
+      path: (str) path to the file.
+      name: (str) name the file should have in the package.
+    """
+    super(ManifestLibraryPackage, self).IncludeFile(path, name)
+
+  def IncludeStoredFile(self, store, digest, name):
+    """Include a file from a BlobStore in the package.
+
+    Args:
+      store: (BlobStore) The store holding the file.
+      digest: (str) The digest of the file in the store.
+      name: (str) name the file should have in the package.
+    """
+    self.EndFile()
+    self._package.IncludeStoredFile(store, digest, name)
+    self._AddEntry(name, os.path.getsize(store.Path(digest)), digest)
+
+  def SetFileSource(self, source, node=None):
+    """Record what the file last started or included was generated from.
+
+    Args:
+      source: (str) The path of the template or file, relative to the
+        template directory.
+      node: (str) The element of the API the template was rendered for.
+    """
+    self._files[-1]['source'] = source
+    self._files[-1]['node'] = node
+
+  def SetFilePathPrefix(self, path):
+    """Set a prefix to be prepended to any file names."""
+    super(ManifestLibraryPackage, self).SetFilePathPrefix(path)
+    self._package.SetFilePathPrefix(path)
+
+  def DoneWritingArchive(self):
+    """Signal that we are done writing the entire package.
+
+    The manifest is written into the package first, if it was asked for.
+    """
+    self.EndFile()
+    if self._manifest_name:
+      out = self._package.StartFile(self._manifest_name)
+      self.WriteManifest(out)
+      self._package.EndFile()
+    self._package.DoneWritingArchive()
+
+  def Manifest(self):
+    """Returns the manifest of the files written so far.
+
+    Returns:
+      (list) A dict for each file, in the order they were written, holding its
+      path in the package, size, sha256, and the source and node it was
+      generated from, or None if they are not known.
+    """
+    return self._files
+
+  def WriteManifest(self, stream):
+    """Write the manifest to a stream as JSON, once all the files are written.
+
+    Args:
+      stream: (file) A file-like object to write to.
+    """
+    stream.write(simplejson.dumps({'files': self.Manifest()}, indent=2,
+                                  separators=(',', ': '), sort_keys=True))
+    stream.write('\n')
+
+  def _AddEntry(self, name, size=None, sha256=None):
+    self._files.append({
+        'path': '%s%s' % (self._file_path_prefix, name),
+        'size': size,
+        'sha256': sha256,
+        'source': None,
+        'node': None,
+        })
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+#
+# Copyright 2010 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for manifest_library_package."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import cStringIO
+import hashlib
+import os
+
+from google.apputils import basetest
+from googleapis.codegen import in_memory_library_package
+from googleapis.codegen import manifest_library_package
+from googleapis.codegen.anyjson import simplejson
+
+
+class ManifestLibraryPackageTest(basetest.TestCase):
+  _FILE_NAME = 'a_test'
+  _FILE_CONTENTS = 'this is a test'
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def _Entry(self, path, contents, source=None, node=None):
+    return {'path': path, 'size': len(contents),
+            'sha256': hashlib.sha256(contents).hexdigest(),
+            'source': source, 'node': node}
+
+  def testManifest(self):
+    in_memory = in_memory_library_package.InMemoryLibraryPackage()
+    package = manifest_library_package.ManifestLibraryPackage(in_memory)
+    package.SetFilePathPrefix('abc')
+    stream = package.StartFile(self._FILE_NAME)
+    package.SetFileSource('templates/a_test.tmpl', 'model Activity')
+    stream.write(self._FILE_CONTENTS)
+    stream.write(u' more')
+    package.StartFile('b').write(self._FILE_CONTENTS * 2)
+    package.IncludeFile(os.path.join(self._TEST_DATA_DIR, 'file1.txt'),
+                        'new_directory/file1.txt')
+    package.SetFileSource('file1.txt')
+    package.DoneWritingArchive()
+
+    self.assertEquals(
+        [self._Entry('abc/a_test', self._FILE_CONTENTS + ' more',
+                     'templates/a_test.tmpl', 'model Activity'),
+         self._Entry('abc/b', self._FILE_CONTENTS * 2),
+         self._Entry('abc/new_directory/file1.txt',
+                     open(os.path.join(self._TEST_DATA_DIR,
+                                       'file1.txt')).read(),
+                     'file1.txt')],
+        package.Manifest())
+    for entry in package.Manifest():
+      self.assertEquals(entry['sha256'], hashlib.sha256(
+          in_memory.files[entry['path']]).hexdigest())
+
+  def testManifestInPackage(self):
+    in_memory = in_memory_library_package.InMemoryLibraryPackage()
+    package = manifest_library_package.ManifestLibraryPackage(
+        in_memory, manifest_name='manifest.json')
+    package.StartFile(self._FILE_NAME).write(self._FILE_CONTENTS)
+    package.DoneWritingArchive()
+    output = cStringIO.StringIO()
+    package.WriteManifest(output)
+    self.assertEquals(output.getvalue(), in_memory.files['manifest.json'])
+    self.assertEquals(
+        {'files': [self._Entry(self._FILE_NAME, self._FILE_CONTENTS)]},
+        simplejson.loads(output.getvalue()))
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -65,27 +65,36 @@ class PHPGenerator(generator.ApiLibraryGenerator):
     """
     self.AnnotateApiForLanguage(self._api)
     out = package.StartFile('api%sService.php' % self._api.values['className'])
+    package.SetFileSource('api_service_class.tmpl')
     self.__GenerateApiClass(out)
+    self.__GenerateModelClasses(out)
+
+  def __GenerateApiClass(self, ostream):
+    """Generate the main API class."""
+    template_path = self.PathToTemplate('api_service_class.tmpl')
+    self.RenderTemplateToStream(template_path, {'api': self._api.values},
+                                ostream)
+
+  def __GenerateModelClasses(self, ostream):
+    """Generate a data model class for every schema element.
+
+    The classes may be rendered in parallel, but are written in order.
+
+    Args:
+      ostream: (file) The stream to write the classes to.
+    """
+    models = []
     generated = {}
     for schema in self._api.ModelClasses():
       # Skip schemas that refer to others.
       if schema.class_name in generated:
         continue
-      self.__GenerateModelClass(out, schema)
+      models.append(schema.values)
       generated[schema.class_name] = True
-
-  def __GenerateApiClass(self, ostream):
-    """Generate the main API class."""
-    template_path = self.PathToTemplate('api_service_class.tmpl')
-    ostream.write(self.RenderTemplate(template_path, {'api': self._api.values}))
-
-  def __GenerateModelClass(self, ostream, schema):
-    """Generate a data model class for every schema element."""
     template_path = self.PathToTemplate('_model_class.tmpl')
-    ostream.write(self.RenderTemplate(template_path, {
-        'api': self._api.values,
-        'model': schema.values
-        }))
+    for rendering in self.RenderTemplateForEach(
+        template_path, 'model', models, {'api': self._api.values}):
+      ostream.write(rendering)
 
   def AnnotateResource(self, the_api, resource):
     """Add the discovery dictionary as data to each resource.
@@ -99,9 +108,12 @@ class PHPGenerator(generator.ApiLibraryGenerator):
       the_api: (Api) The API this Resource belongs to.
       resource: (Resource) The Resource to annotate.
     """
-    resource.json = simplejson.dumps(_StripResource(resource.raw))
+    # Keys are sorted, since a dictionary read back from an ApiCache may
+    # iterate in another order than the parsed one.
+    resource_json = simplejson.dumps(_StripResource(resource.raw),
+                                     sort_keys=True)
     # Escape stray quotes since it will be used in a PHP function call.
-    resource.json = resource.json.replace('\'', '\\\'')
+    resource.SetTemplateValue('json', resource_json.replace('\'', '\\\''))
     for method in resource.values['methods']:
       self.AnnotateMethod(the_api, method, resource)
 
@@ -299,14 +311,16 @@ class PHPApi(api.Api):
 
 
 def _StripResource(resource):
-  """Remove extra properties from a resource."""
-  if isinstance(resource, dict):
-    # pylint: disable-msg=C6401
-    # keys() is used intentionally to avoid the RuntimeError
-    # "dictionary changed size during iteration."
-    for k in resource.keys():
-      if k in _EXTRA_PROPERTIES:
-        del resource[k]
-      else:
-        _StripResource(resource[k])
-  return resource
+  """Returns a copy of a resource without its extra properties.
+
+  The resource may be shared with other generators, so it is not changed.
+
+  Args:
+    resource: (object) The resource, or any part of it.
+  Returns:
+    (object) resource, with the extra properties of any dict in it removed.
+  """
+  if not isinstance(resource, dict):
+    return resource
+  return dict((k, _StripResource(v)) for k, v in resource.iteritems()
+              if k not in _EXTRA_PROPERTIES)
@@ -46,6 +46,25 @@ class PHPApiTest(basetest.TestCase):
     self.assertEquals('count', method.values['wireName'])
     self.assertEquals('Count', method.values['className'])
 
+  def testResourceJsonIsMadeWhenAnnotated(self):
+    discovery_doc = {
+        'name': 'test', 'version': 'v1',
+        'resources': {'things': {'methods': {'get': {
+            'id': 'test.things.get', 'httpMethod': 'GET',
+            'description': 'Get a thing.', 'path': 'it\'s'}}}}}
+    the_api = php_generator.PHPApi(discovery_doc)
+    # Loading the Api makes none of its resources.
+    self.assertTrue(the_api._resources._items is None)
+
+    resource = the_api.values['resources'][0]
+    self.generator.AnnotateResource(the_api, resource)
+    self.assertEquals(
+        '{"methods": {"get": {"httpMethod": "GET", "id": "test.things.get", '
+        '"path": "it\\\'s"}}}',
+        resource.values['json'])
+    self.assertEquals('Get a thing.',
+                      resource.raw['methods']['get']['description'])
+
   def testSetTypeHint(self):
     """Test creating safe class names from object names."""
     test_schema = api.Schema(self.api, 'testSchema', {})
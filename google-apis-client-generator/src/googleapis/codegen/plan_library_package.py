@@ -0,0 +1,113 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A LibraryPackage that lists the files of a package, but not their contents.
+
+Used with TemplateGenerator.PlanPackage, it tells what files a generation
+would produce, and what each is generated from, without rendering any.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+from googleapis.codegen.anyjson import simplejson
+from googleapis.codegen.library_package import LibraryPackage
+
+
+class PlanLibraryPackage(LibraryPackage):
+  """The library package."""
+
+  class _NullStream(object):
+    """A write only file-like object which discards what is written."""
+    # Suppress spurious warnings about methods write and flush.
+    # pylint: disable-msg=C6409
+
+    def write(self, unused_s):
+      pass
+
+    def flush(self):
+      pass
+
+  def __init__(self):
+    """Create a new PlanLibraryPackage."""
+    super(PlanLibraryPackage, self).__init__()
+    self._files = []
+
+  @property
+  def files(self):
+    """A list of a dict for each file: its path, source and node."""
+    return self._files
+
+  def StartFile(self, name):
+    """Note a file of the package.
+
+    Args:
+      name: (str) path which will identify the contents in the package.
+
+    Returns:
+      A file-like object which discards what is written to it.
+    """
+    self._AddEntry(name)
+    return PlanLibraryPackage._NullStream()
+
+  def EndFile(self):
+    pass
+
+  def IncludeFile(self, path, name):
+    """Note a file of the package, without reading it.
+
+    Args:
+      path: (str) path to the file.
+      name: (str) name the file would have in the package.
+    """
+    self._AddEntry(name)
+
+  def IncludeStoredFile(self, store, digest, name):
+    """Note a file of the package, without reading it.
+
+    Args:
+      store: (BlobStore) The store holding the file.
+      digest: (str) The digest of the file in the store.
+      name: (str) name the file would have in the package.
+    """
+    self._AddEntry(name)
+
+  def SetFileSource(self, source, node=None):
+    """Record what the file last started or included is generated from.
+
+    Args:
+      source: (str) The path of the template or file, relative to the
+        template directory.
+      node: (str) The element of the API the template is rendered for.
+    """
+    self._files[-1]['source'] = source
+    self._files[-1]['node'] = node
+
+  def WritePlan(self, stream):
+    """Write the list of files to a stream as JSON.
+
+    Args:
+      stream: (file) A file-like object to write to.
+    """
+    stream.write(simplejson.dumps({'files': self._files}, indent=2,
+                                  separators=(',', ': '), sort_keys=True))
+    stream.write('\n')
+
+  def _AddEntry(self, name):
+    self._files.append({
+        'path': '%s%s' % (self._file_path_prefix, name),
+        'source': None,
+        'node': None,
+        })
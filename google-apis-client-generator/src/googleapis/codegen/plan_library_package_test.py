@@ -0,0 +1,50 @@
+#!/usr/bin/python
+#
+# Copyright 2010 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for plan_library_package."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import cStringIO
+
+from google.apputils import basetest
+from googleapis.codegen import plan_library_package
+from googleapis.codegen.anyjson import simplejson
+
+
+class PlanLibraryPackageTest(basetest.TestCase):
+
+  def testPlan(self):
+    package = plan_library_package.PlanLibraryPackage()
+    package.SetFilePathPrefix('abc')
+    package.StartFile('a').write('discarded')
+    package.SetFileSource('templates/a.tmpl', 'model Activity')
+    package.EndFile()
+    package.IncludeFile('/no/such/file', 'b')
+    package.DoneWritingArchive()
+    expected = [
+        {'path': 'abc/a', 'source': 'templates/a.tmpl',
+         'node': 'model Activity'},
+        {'path': 'abc/b', 'source': None, 'node': None},
+        ]
+    self.assertEquals(expected, package.files)
+    output = cStringIO.StringIO()
+    package.WritePlan(output)
+    self.assertEquals({'files': expected}, simplejson.loads(output.getvalue()))
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A LibraryPackage that creates a tar file.
+
+This module aids in the construction of a tar file, optionally compressed with
+gzip or xz, containing all the components generated and required by a library.
+The archive is written strictly in order, so the output stream may be a pipe.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import gzip
+import tarfile
+import tempfile
+import time
+
+try:
+  import lzma  # pylint: disable-msg=C6204
+except ImportError:
+  try:
+    from backports import lzma  # pylint: disable-msg=C6204
+  except ImportError:
+    lzma = None
+
+from googleapis.codegen import utilities
+from googleapis.codegen.library_package import LibraryPackage
+
+# A tar header holds the size of its entry, so each entry is spooled before it
+# is written. This many bytes of an entry are held in memory; the rest overflow
+# to a temporary file.
+_SPOOL_MEMORY_LIMIT = 1 << 20
+
+
+class TarLibraryPackage(LibraryPackage):
+  """The library package."""
+
+  class _XzStream(object):
+    """A write only file-like object which xz compresses onto another stream."""
+    # Suppress spurious warnings about methods write, close, and flush.
+    # pylint: disable-msg=C6409
+
+    def __init__(self, stream, preset):
+      self._stream = stream
+      self._compressor = lzma.LZMACompressor(preset=preset)
+
+    def write(self, s):
+      data = self._compressor.compress(s)
+      if data:
+        self._stream.write(data)
+
+    def flush(self):
+      pass
+
+    def close(self):
+      if self._compressor:
+        self._stream.write(self._compressor.flush())
+        self._compressor = None
+
+  def __init__(self, stream, compression=None, compression_level=None):
+    """Create a new TarLibraryPackage.
+
+    Args:
+      stream: (file) A file-like object to write to. It need not be seekable.
+      compression: (str) None, 'gz' or 'xz'.
+      compression_level: (int) The gzip compression level or xz preset, from 0
+        to 9. If None, the compressor's default is used.
+
+    Raises:
+      ValueError: if the compression method or level is not supported.
+    """
+    super(TarLibraryPackage, self).__init__()
+    if compression_level is not None and not 0 <= compression_level <= 9:
+      raise ValueError('Unsupported tar compression level: %s'
+                       % compression_level)
+    self._stream = stream
+    if not compression:
+      self._compressed_stream = None
+    elif compression == 'gz':
+      if compression_level is None:
+        compression_level = 9
+      self._compressed_stream = gzip.GzipFile(
+          filename='', mode='wb', compresslevel=compression_level,
+          fileobj=stream, mtime=utilities.SourceDateEpoch())
+    elif compression == 'xz':
+      if not lzma:
+        raise ValueError('xz compression requires the lzma module')
+      if compression_level is None:
+        compression_level = 6
+      self._compressed_stream = TarLibraryPackage._XzStream(stream,
+                                                            compression_level)
+    else:
+      raise ValueError('Unsupported tar compression method: %s' % compression)
+    self._tar = tarfile.open(fileobj=self._compressed_stream or stream,
+                             mode='w|')
+    self._current_file_data = None
+
+  def StartFile(self, name):
+    """Start writing a named file to the package.
+
+    Args:
+      name: (str) path which will identify the contents in the archive.
+
+    Returns:
+      A file-like object to write the contents to.
+    """
+    self.EndFile()
+    self._current_file_data = tempfile.SpooledTemporaryFile(
+        _SPOOL_MEMORY_LIMIT)
+    self._current_file_name = '%s%s' % (self._file_path_prefix, name)
+    return self._current_file_data
+
+  def EndFile(self):
+    """Flush the current output file to the tar container."""
+    if self._current_file_data:
+      self._current_file_data.seek(0, 2)
+      self._AddFile(self._current_file_name, self._current_file_data)
+      self._current_file_data.close()
+      self._current_file_data = None
+
+  def IncludeFile(self, path, name):
+    """Read a file from disk into the archive.
+
+    The size of a file on disk is known, so it is copied straight into the
+    archive rather than spooled.
+
+    Args:
+      path: (str) path to the file.
+      name: (str) name the file should have in the archive.
+    """
+    self.EndFile()
+    input_stream = open(path, 'rb')
+    try:
+      input_stream.seek(0, 2)
+      self._AddFile('%s%s' % (self._file_path_prefix, name), input_stream)
+    finally:
+      input_stream.close()
+
+  def _AddFile(self, name, data):
+    """Add an entry to the archive.
+
+    Args:
+      name: (str) The full name of the entry.
+      data: (file) The contents of the entry, positioned at its end.
+    """
+    info = tarfile.TarInfo(name.encode('utf-8'))
+    info.size = data.tell()
+    info.mtime = utilities.SourceDateEpoch()
+    if info.mtime is None:
+      info.mtime = int(time.time())
+    info.mode = 0644
+    data.seek(0)
+    self._tar.addfile(info, data)
+
+  def DoneWritingArchive(self):
+    """Signal that we are done writing the entire package.
+
+    This method must be called to write the end of the archive, and finish
+    the compressed stream, on the output stream.
+    """
+    if self._tar:
+      self.EndFile()
+      self._tar.close()
+      self._tar = None
+      if self._compressed_stream:
+        self._compressed_stream.close()
+        self._compressed_stream = None
+      self._stream.flush()
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for tar_library_package."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import cStringIO
+import os
+import tarfile
+
+from google.apputils import basetest
+from googleapis.codegen import tar_library_package
+
+
+class _UnseekableStream(object):
+  """A write only stream, like a pipe."""
+
+  def __init__(self):
+    self._buffer = cStringIO.StringIO()
+
+  def write(self, s):
+    self._buffer.write(s)
+
+  def flush(self):
+    pass
+
+  def getvalue(self):
+    return self._buffer.getvalue()
+
+
+class TarLibraryPackageTest(basetest.TestCase):
+  _FILE_NAME = 'a_test'
+  _FILE_CONTENTS = 'this is a test'
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def _ReadBack(self, output_stream):
+    archive = tarfile.open(
+        fileobj=cStringIO.StringIO(output_stream.getvalue()), mode='r:*')
+    return dict((info.name, archive.extractfile(info).read())
+                for info in archive.getmembers())
+
+  def _WriteFiles(self, package):
+    stream = package.StartFile(self._FILE_NAME)
+    stream.write(self._FILE_CONTENTS)
+    file_name_2 = '%s_2' % self._FILE_NAME
+    stream = package.StartFile(file_name_2)
+    stream.write(self._FILE_CONTENTS * 100000)
+    package.EndFile()
+    package.IncludeFile(os.path.join(self._TEST_DATA_DIR, 'file1.txt'),
+                        'new_directory/file1.txt')
+    package.DoneWritingArchive()
+    return {
+        self._FILE_NAME: self._FILE_CONTENTS,
+        file_name_2: self._FILE_CONTENTS * 100000,
+        'new_directory/file1.txt': open(
+            os.path.join(self._TEST_DATA_DIR, 'file1.txt')).read(),
+        }
+
+  def testUncompressed(self):
+    output_stream = _UnseekableStream()
+    package = tar_library_package.TarLibraryPackage(output_stream)
+    expected = self._WriteFiles(package)
+    self.assertEquals(expected, self._ReadBack(output_stream))
+
+  def testGzip(self):
+    output_stream = _UnseekableStream()
+    package = tar_library_package.TarLibraryPackage(output_stream, 'gz')
+    expected = self._WriteFiles(package)
+    self.assertEquals('\037\213', output_stream.getvalue()[:2])
+    self.assertEquals(expected, self._ReadBack(output_stream))
+
+  def testXz(self):
+    output_stream = _UnseekableStream()
+    if not tar_library_package.lzma:
+      self.assertRaises(ValueError, tar_library_package.TarLibraryPackage,
+                        output_stream, 'xz')
+      return
+    package = tar_library_package.TarLibraryPackage(output_stream, 'xz')
+    self._WriteFiles(package)
+    self.assertEquals('\3757zXZ\000', output_stream.getvalue()[:6])
+
+  def testOutputPrefix(self):
+    output_stream = _UnseekableStream()
+    package = tar_library_package.TarLibraryPackage(output_stream, 'gz')
+    package.SetFilePathPrefix('abc/def')
+    stream = package.StartFile(self._FILE_NAME)
+    stream.write(self._FILE_CONTENTS)
+    package.DoneWritingArchive()
+    self.assertEquals({'abc/def/%s' % self._FILE_NAME: self._FILE_CONTENTS},
+                      self._ReadBack(output_stream))
+
+  def testUnsupportedCompression(self):
+    self.assertRaises(ValueError, tar_library_package.TarLibraryPackage,
+                      _UnseekableStream(), 'bz3')
+    self.assertRaises(ValueError, tar_library_package.TarLibraryPackage,
+                      _UnseekableStream(), 'gz', 10)
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+#
+# Copyright 2011 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""A LibraryPackage that writes the same files to several other packages.
+
+This module lets a library be rendered once and written to several outputs,
+for example a directory and a zip file, at the same time.
+"""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+from googleapis.codegen.library_package import LibraryPackage
+
+
+class TeeLibraryPackage(LibraryPackage):
+  """The library package."""
+
+  class _TeeStream(object):
+    """A write only file-like object which writes to several streams."""
+    # Suppress spurious warnings about methods write and flush.
+    # pylint: disable-msg=C6409
+
+    def __init__(self, streams):
+      self._streams = streams
+
+    def write(self, s):
+      for stream in self._streams:
+        stream.write(s)
+
+    def flush(self):
+      for stream in self._streams:
+        stream.flush()
+
+  def __init__(self, packages):
+    """Create a new TeeLibraryPackage.
+
+    Args:
+      packages: (list of LibraryPackage) The packages to write to.
+
+    Raises:
+      ValueError: if no packages are given.
+    """
+    super(TeeLibraryPackage, self).__init__()
+    if not packages:
+      raise ValueError('A TeeLibraryPackage needs at least one package')
+    self._packages = list(packages)
+
+  @property
+  def packages(self):
+    """The packages written to."""
+    return self._packages
+
+  def StartFile(self, name):
+    """Start writing a named file to each package.
+
+    Args:
+      name: (str) path which will identify the contents in the packages.
+
+    Returns:
+      A file-like object to write the contents to.
+    """
+    return TeeLibraryPackage._TeeStream(
+        [package.StartFile(name) for package in self._packages])
+
+  def EndFile(self):
+    """Flush the current output file to each package."""
+    for package in self._packages:
+      package.EndFile()
+
+  def IncludeFile(self, path, name):
+    """Read a file from disk into each package.
+
+    Each package includes the file itself, so it can use the most efficient
+    way it has of doing so.
+
+    Args:
+      path: (str) path to the file.
+      name: (str) name the file should have in the packages.
+    """
+    for package in self._packages:
+      package.IncludeFile(path, name)
+
+  def IncludeStoredFile(self, store, digest, name):
+    """Include a file from a BlobStore in each package.
+
+    Args:
+      store: (BlobStore) The store holding the file.
+      digest: (str) The digest of the file in the store.
+      name: (str) name the file should have in the packages.
+    """
+    for package in self._packages:
+      package.IncludeStoredFile(store, digest, name)
+
+  def SetFileSource(self, source, node=None):
+    """Note what the file last started or included was generated from."""
+    for package in self._packages:
+      package.SetFileSource(source, node)
+
+  def SetFilePathPrefix(self, path):
+    """Set a prefix to be prepended to any file names in each package."""
+    for package in self._packages:
+      package.SetFilePathPrefix(path)
+
+  def DoneWritingArchive(self):
+    """Signal that we are done writing the entire package.
+
+    Every package is finished, even if finishing one of them fails.
+    """
+    packages = self._packages
+    try:
+      packages[0].DoneWritingArchive()
+    finally:
+      if len(packages) > 1:
+        TeeLibraryPackage(packages[1:]).DoneWritingArchive()
@@ -0,0 +1,78 @@
+#!/usr/bin/python
+#
+# Copyright 2010 Google Inc. All Rights Reserved.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Tests for tee_library_package."""
+
+__author__ = 'aiuto@google.com (Tony Aiuto)'
+
+import cStringIO
+import os
+import zipfile
+
+from google.apputils import basetest
+from googleapis.codegen import in_memory_library_package
+from googleapis.codegen import tee_library_package
+from googleapis.codegen import zip_library_package
+
+
+class _FailingPackage(in_memory_library_package.InMemoryLibraryPackage):
+  """A package which can not be finished."""
+
+  def DoneWritingArchive(self):
+    raise IOError('disk full')
+
+
+class TeeLibraryPackageTest(basetest.TestCase):
+  _FILE_NAME = 'a_test'
+  _FILE_CONTENTS = 'this is a test'
+  _TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+  def testWritesToEachPackage(self):
+    in_memory = in_memory_library_package.InMemoryLibraryPackage()
+    output_stream = cStringIO.StringIO()
+    zipped = zip_library_package.ZipLibraryPackage(output_stream)
+    package = tee_library_package.TeeLibraryPackage([in_memory, zipped])
+    package.SetFilePathPrefix('abc')
+    stream = package.StartFile(self._FILE_NAME)
+    stream.write(self._FILE_CONTENTS)
+    package.EndFile()
+    package.IncludeFile(os.path.join(self._TEST_DATA_DIR, 'file1.txt'),
+                        'new_directory/file1.txt')
+    package.DoneWritingArchive()
+
+    expected = {
+        'abc/%s' % self._FILE_NAME: self._FILE_CONTENTS,
+        'abc/new_directory/file1.txt': open(
+            os.path.join(self._TEST_DATA_DIR, 'file1.txt')).read(),
+        }
+    self.assertEquals(expected, dict(in_memory.files))
+    archive = zipfile.ZipFile(cStringIO.StringIO(output_stream.getvalue()))
+    self.assertEquals(expected, dict((name, archive.read(name))
+                                     for name in archive.namelist()))
+
+  def testEveryPackageIsFinished(self):
+    last = in_memory_library_package.InMemoryLibraryPackage()
+    package = tee_library_package.TeeLibraryPackage([_FailingPackage(), last])
+    package.StartFile(self._FILE_NAME).write(self._FILE_CONTENTS)
+    self.assertRaises(IOError, package.DoneWritingArchive)
+    self.assertEquals({self._FILE_NAME: self._FILE_CONTENTS}, dict(last.files))
+
+  def testNoPackages(self):
+    self.assertRaises(ValueError, tee_library_package.TeeLibraryPackage, [])
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -29,6 +29,10 @@ import textwrap
 
 import django.template as django_template
 from django.template.loader import render_to_string
+from django.utils.encoding import force_unicode
+
+from googleapis.codegen import template_objects
+from googleapis.codegen import utilities
 
 
 register = django_template.Library()
@@ -70,9 +74,11 @@ _DOC_COMMENT_END_TAG = '_DOC_COMMENT_END_TAG'
 
 _CURRENT_INDENT = '_CURRENT_INDENT'  # The actual indent we are at
 _CURRENT_LEVEL = '_CURRENT_LEVEL'  # The current indent level we are at
+_IN_INDENT = '_IN_INDENT'  # True while rendering inside an indent block
 _PARAMETER_DOC_INDENT = '_PARAMETER_DOC_INDENT'
 _IMPORT_REGEX = '_IMPORT_REGEX'
 _IMPORT_TEMPLATE = '_IMPORT_TEMPLATE'
+_FORMATTING_PROFILE = '_FORMATTING_PROFILE'  # The FormattingProfile in use
 
 _defaults = {
     _LINE_BREAK_INDENT: 4,
@@ -146,21 +152,21 @@ _language_defaults = {
     }
 
 
-def _GetFromContext(context, *variable):
-  """Safely get something from the context.
+def _LookUpSetting(settings, *variable):
+  """Safely get a formatting setting.
 
-  Look for a variable (or an alternate variable) in the context. If it is not
-  in the context, look in _defaults.
+  Look for a variable (or an alternate variable) in the settings. If it is not
+  there, look in _defaults.
 
   Args:
-    context: (Context) The Django render context
+    settings: (dict) Formatting settings, keyed by the names above.
     *variable: (str) varargs list of variable names
 
   Returns:
-    The requested value from the context or the defaults.
+    The requested value from the settings or the defaults.
   """
   for v in variable:
-    ret = context.get(v)
+    ret = settings.get(v)
     if ret:
       return ret
   for v in variable:
@@ -170,6 +176,326 @@ def _GetFromContext(context, *variable):
   return ''
 
 
+class FormattingProfile(object):
+  """The formatting parameters for a language.
+
+  Resolving the parameters means searching the per-language settings, then
+  the defaults, for one or two names. A profile does that once, so the tags
+  which format code can read the values directly. Profiles are immutable.
+  """
+
+  __slots__ = ('language', 'line_width', 'level_indent', 'parameter_indent',
+               'line_break_indent', 'parameter_doc_indent',
+               'comment_start', 'comment_continue', 'comment_end',
+               'doc_comment_start', 'doc_comment_continue', 'doc_comment_end',
+               'doc_comment_begin_tag', 'doc_comment_end_tag',
+               'import_regex', 'import_template', '_overrides')
+
+  def __init__(self, language, overrides=None):
+    """Create a FormattingProfile.
+
+    Args:
+      language: (str) The language name. Languages without specific settings
+        get the defaults.
+      overrides: (dict) Settings which take precedence over the per-language
+        ones, keyed by the setting names (e.g. _LINE_WIDTH).
+    """
+    settings = dict(_language_defaults.get(language, {}))
+    settings.update(overrides or {})
+    init = super(FormattingProfile, self).__setattr__
+    init('language', language)
+    init('_overrides', overrides)
+    init('line_width', _LookUpSetting(settings, _LINE_WIDTH))
+    init('level_indent', _LookUpSetting(settings, _LEVEL_INDENT))
+    init('parameter_indent', _LookUpSetting(settings, _PARAMETER_INDENT))
+    init('line_break_indent', _LookUpSetting(settings, _LINE_BREAK_INDENT))
+    init('parameter_doc_indent',
+         _LookUpSetting(settings, _PARAMETER_DOC_INDENT))
+    init('comment_start', _LookUpSetting(settings, _COMMENT_START))
+    init('comment_continue', _LookUpSetting(settings, _COMMENT_CONTINUE))
+    init('comment_end', _LookUpSetting(settings, _COMMENT_END))
+    init('doc_comment_start',
+         _LookUpSetting(settings, _DOC_COMMENT_START, _COMMENT_START))
+    init('doc_comment_continue',
+         _LookUpSetting(settings, _DOC_COMMENT_CONTINUE, _COMMENT_CONTINUE))
+    init('doc_comment_end',
+         _LookUpSetting(settings, _DOC_COMMENT_END, _COMMENT_END))
+    init('doc_comment_begin_tag',
+         _LookUpSetting(settings, _DOC_COMMENT_BEGIN_TAG))
+    init('doc_comment_end_tag', _LookUpSetting(settings, _DOC_COMMENT_END_TAG))
+    init('import_regex', re.compile(_LookUpSetting(settings, _IMPORT_REGEX)))
+    init('import_template', _LookUpSetting(settings, _IMPORT_TEMPLATE))
+
+  def __setattr__(self, name, value):
+    raise AttributeError('FormattingProfile is immutable')
+
+  def __reduce__(self):
+    return (FormattingProfile, (self.language, self._overrides))
+
+  @staticmethod
+  def ForLanguage(language):
+    """Returns the shared profile for a language."""
+    profile = _profiles.get(language)
+    if not profile:
+      profile = FormattingProfile(language)
+      _profiles[language] = profile
+    return profile
+
+
+_profiles = {}
+_default_profile = FormattingProfile(None)
+
+
+def _GetProfile(context):
+  """Returns the FormattingProfile set by the language tag, or the default."""
+  return context.get(_FORMATTING_PROFILE) or _default_profile
+
+
+#
+# Indentation
+#
+
+# Markers which delimit the text of a nested indent block.  Rather than
+# re-indenting its text, an indent block inside another one wraps its text in
+# these markers and leaves the work to the outermost block, which applies the
+# cumulative indent of every level in a single pass through an _IndentWriter.
+# An indent start is written as _INDENT_START + 'n' + _INDENT_START, where n is
+# the number of spaces to add.
+_INDENT_START = chr(3)
+_INDENT_END = chr(4)
+_INDENT_MARKER_RE = re.compile('(%s[0-9]+%s|%s)' % (_INDENT_START,
+                                                     _INDENT_START,
+                                                     _INDENT_END))
+_TRAILING_INDENT_START_RE = re.compile('%s[0-9]+%s$' % (_INDENT_START,
+                                                          _INDENT_START))
+
+# Policies for the handling of blank lines by an _IndentWriter.
+_BLANK_LINES_KEEP = 'keep'
+_BLANK_LINES_REMOVE = 'remove'
+_BLANK_LINES_COLLAPSE = 'collapse'
+
+
+class _IndentWriter(object):
+  """Accumulates text, applying indentation and a blank line policy.
+
+  Text written may contain the markers of nested indent blocks. Within an
+  indent block, every line is stripped of trailing white space and every line
+  which is not blank is prefixed by the indent of the block. Since the prefix
+  for a line is the sum of the indents of all the blocks it is in, each line is
+  processed exactly once, no matter how deeply the blocks are nested.
+  """
+
+  def __init__(self, blank_lines=_BLANK_LINES_KEEP):
+    """Create an _IndentWriter.
+
+    Args:
+      blank_lines: (str) What to do with blank lines. One of _BLANK_LINES_KEEP,
+        _BLANK_LINES_REMOVE or _BLANK_LINES_COLLAPSE.
+    """
+    self._blank_lines = blank_lines
+    self._lines = []
+    self._line = ''
+    self._previous_blank = False
+    # The open indent blocks, outermost first. Each block is a list of
+    #   [prefix, offset of its current segment in self._line, prefix pending]
+    # A prefix is pending until the first non-blank text of the segment
+    # arrives, since blank lines are never indented.
+    self._blocks = []
+    self._first_pending = None
+
+  def PushIndent(self, extra):
+    """Start an indent block which adds extra spaces to each line."""
+    self._blocks.append([' ' * extra, len(self._line), True])
+    if self._first_pending is None:
+      self._first_pending = len(self._blocks) - 1
+
+  def PopIndent(self):
+    """End the innermost indent block."""
+    unused_prefix, start, unused_pending = self._blocks.pop()
+    self._line = self._line[:start] + self._line[start:].rstrip()
+    if (self._first_pending is not None
+        and self._first_pending >= len(self._blocks)):
+      self._first_pending = None
+
+  def write(self, text):  # pylint: disable-msg=C6409
+    """Write text, which may contain nested indent block markers."""
+    if _INDENT_END not in text:
+      self._WriteText(text)
+      return
+    for piece in _INDENT_MARKER_RE.split(text):
+      if not piece:
+        continue
+      if piece == _INDENT_END:
+        self.PopIndent()
+      elif piece[0] == _INDENT_START:
+        self.PushIndent(int(piece[1:-1]))
+      else:
+        self._WriteText(piece)
+
+  def getvalue(self):  # pylint: disable-msg=C6409
+    """Returns all the text written so far."""
+    lines = list(self._lines)
+    last_line = self._FinishLine(self._line)
+    if last_line is not None:
+      lines.append(last_line)
+    return '\n'.join(lines)
+
+  def _WriteText(self, text):
+    """Write text which contains no markers."""
+    fragments = text.split('\n')
+    self._WriteFragment(fragments[0])
+    for fragment in fragments[1:]:
+      line = self._FinishLine(self._line)
+      if line is not None:
+        self._lines.append(line)
+        self._previous_blank = not line.strip()
+      self._line = ''
+      for block in self._blocks:
+        block[1] = 0
+        block[2] = True
+      if self._blocks:
+        self._first_pending = 0
+      self._WriteFragment(fragment)
+
+  def _WriteFragment(self, fragment):
+    """Write a piece of a single line."""
+    if self._first_pending is not None and fragment.strip():
+      # Everything from the first pending segment on is white space, so insert
+      # all the pending prefixes there.
+      line = self._line
+      position = self._blocks[self._first_pending][1]
+      new_line = line[:position]
+      for block in self._blocks[self._first_pending:]:
+        new_line += line[position:block[1]] + block[0]
+        position = block[1]
+        block[2] = False
+      self._line = new_line + line[position:]
+      self._first_pending = None
+    self._line += fragment
+
+  def _FinishLine(self, line):
+    """Apply trailing white space removal and the blank line policy.
+
+    Args:
+      line: (str) A completed line.
+    Returns:
+      (str) The line to emit, or None if it should be dropped.
+    """
+    if self._blocks:
+      start = self._blocks[0][1]
+      line = line[:start] + line[start:].rstrip()
+    if self._blank_lines != _BLANK_LINES_KEEP and not line.strip():
+      if (self._blank_lines == _BLANK_LINES_REMOVE
+          or self._previous_blank):
+        return None
+    return line
+
+
+def _ResolveIndents(text, blank_lines=_BLANK_LINES_KEEP):
+  """Apply the indentation of any nested indent blocks within text.
+
+  Tags which inspect or rewrite the text of their contents must call this
+  first, so they see the text as it will finally appear.
+
+  Args:
+    text: (str) Rendered text, possibly containing indent block markers.
+    blank_lines: (str) The blank line policy to apply.
+  Returns:
+    (str) The text with the indentation applied.
+  """
+  if blank_lines == _BLANK_LINES_KEEP and _INDENT_END not in text:
+    return text
+  writer = _IndentWriter(blank_lines=blank_lines)
+  writer.write(text)
+  return writer.getvalue()
+
+
+def _RStripIndented(text):
+  """rstrip() text, looking through the ends of nested indent blocks.
+
+  Trailing white space inside an indent block would be removed once the
+  block is indented, so it is removed here too, along with any indent blocks
+  left empty.
+
+  Args:
+    text: (str) Rendered text, possibly containing indent block markers.
+  Returns:
+    (str) The stripped text.
+  """
+  tail = ''
+  while True:
+    text = text.rstrip()
+    if text.endswith(_INDENT_END):
+      tail += _INDENT_END
+      text = text[:-1]
+      continue
+    match_obj = _TRAILING_INDENT_START_RE.search(text)
+    if not match_obj:
+      break
+    # An indent block with nothing left in it.
+    text = text[:match_obj.start()]
+    tail = tail[:-1]
+  return text + tail
+
+
+#
+# Line wrapping
+#
+
+# The number of wrapped texts to remember. Descriptions of common parameters
+# (pageToken, maxResults, ...) repeat on every method, so most are wrapped once.
+_DEFAULT_WRAP_CACHE_SIZE = 2000
+
+# TextWrappers keep no state between calls, so one per set of formatting
+# parameters is shared by all callers.
+_text_wrappers = {}
+_wrapped_text_cache = utilities.LruCache(_DEFAULT_WRAP_CACHE_SIZE)
+
+
+def _GetTextWrapper(width, initial_indent, subsequent_indent):
+  """Returns a shared TextWrapper for a width and pair of line prefixes."""
+  key = (width, initial_indent, subsequent_indent)
+  wrapper = _text_wrappers.get(key)
+  if not wrapper:
+    wrapper = textwrap.TextWrapper(width=width,
+                                   replace_whitespace=False,
+                                   initial_indent=initial_indent,
+                                   subsequent_indent=subsequent_indent)
+    _text_wrappers[key] = wrapper
+  return wrapper
+
+
+def _WrapText(text, width, initial_indent, subsequent_indent):
+  """Line wrap text, reusing the result of any identical earlier request.
+
+  Args:
+    text: (str) The text to wrap.
+    width: (int) The maximum line width.
+    initial_indent: (str) The prefix for the first line. This is typically the
+      comment tag, so it also distinguishes between comment styles.
+    subsequent_indent: (str) The prefix for the other lines.
+  Returns:
+    (str) The wrapped text.
+  """
+  key = (text, width, initial_indent, subsequent_indent)
+  wrapped = _wrapped_text_cache.Get(key)
+  if wrapped is None:
+    wrapper = _GetTextWrapper(width, initial_indent, subsequent_indent)
+    wrapped = wrapper.fill(text)
+    _wrapped_text_cache.Put(key, wrapped)
+  return wrapped
+
+
+def SetWrapCacheSize(size):
+  """Set how many wrapped texts to remember. 0 disables the cache."""
+  _wrapped_text_cache.SetCapacity(size)
+
+
+def WrapCacheStatistics():
+  """Returns a dict with the size, hits, misses and hit_rate of the cache."""
+  return _wrapped_text_cache.Statistics()
+
+
 #
 # Basic Filters
 #
@@ -258,11 +584,8 @@ def java_comment_fragment(value, indent):  # pylint: disable-msg=C6409
   if not indent:
     indent = 0
   prefix = '%s * ' % (' ' * indent)
-  wrapper = textwrap.TextWrapper(width=_language_defaults['java'][_LINE_WIDTH],
-                                 replace_whitespace=False,
-                                 initial_indent=prefix,
-                                 subsequent_indent=prefix)
-  wrapped = wrapper.fill(value)
+  wrapped = _WrapText(value, FormattingProfile.ForLanguage('java').line_width,
+                      prefix, prefix)
   if wrapped.startswith(prefix):
     wrapped = wrapped[len(prefix):]
   return wrapped
@@ -282,14 +605,9 @@ def java_parameter_wrap(value):  # pylint: disable-msg=C6409
   the rewrapped string.
   """
   # TODO(user): add 'parameter_doc' option to the DocCommentBlock
-  indent = _language_defaults['java'][_PARAMETER_DOC_INDENT]
-  prefix = ' * %s ' % (' ' * indent)
-  wrapper = textwrap.TextWrapper(width=_language_defaults['java'][_LINE_WIDTH],
-                                 replace_whitespace=False,
-                                 initial_indent='',
-                                 subsequent_indent=prefix)
-  wrapped = wrapper.fill(value)
-  return wrapped
+  profile = FormattingProfile.ForLanguage('java')
+  prefix = ' * %s ' % (' ' * profile.parameter_doc_indent)
+  return _WrapText(value, profile.line_width, '', prefix)
 
 
 # We disable the bad function name warning because we use Django style names
@@ -319,7 +637,7 @@ def block_comment(value):  # pylint: disable-msg=C6409
   """
   if not value:
     return ''
-  lines = value.split('\n')
+  lines = _ResolveIndents(value).split('\n')
   # Ignore a leading blank line while figuring out the comment tag. This allows
   # us to put the filter tag above the content, rather than flush left before
   # it. It makes the template easier to read.
@@ -329,13 +647,12 @@ def block_comment(value):  # pylint: disable-msg=C6409
     comment_prefix = _ExtractCommentPrefix(lines[1])
   else:
     comment_prefix = _ExtractCommentPrefix(lines[0])
-  wrapper = textwrap.TextWrapper(width=_language_defaults['java'][_LINE_WIDTH],
-                                 replace_whitespace=False,
-                                 initial_indent=('%s ' % comment_prefix),
-                                 subsequent_indent=('%s ' % comment_prefix))
+  prefix = '%s ' % comment_prefix
   wrapped_blocks = []
   for block in _DivideIntoBlocks(lines, comment_prefix):
-    wrapped_blocks.append(wrapper.fill(' '.join(block)))
+    wrapped_blocks.append(_WrapText(
+        ' '.join(block), FormattingProfile.ForLanguage('java').line_width,
+        prefix, prefix))
   ret = ''
   if leading_blank:
     ret = '\n'
@@ -345,25 +662,13 @@ def block_comment(value):  # pylint: disable-msg=C6409
 @register.filter
 def noblanklines(value):  # pylint: disable-msg=C6409
   """Template filter to remove blank lines."""
-  return '\n'.join([line for line in value.split('\n') if line.strip()])
+  return _ResolveIndents(value, blank_lines=_BLANK_LINES_REMOVE)
 
 
 @register.filter
 def collapse_blanklines(value):  # pylint: disable-msg=C6409
   """Template filter to collapse successive blank lines into a single one."""
-  lines = []
-  previous_blank = False
-  for line in value.split('\n'):
-    if not line.strip():
-      if not previous_blank:
-        lines.append(line)
-        previous_blank = True
-      else:
-        pass
-    else:
-      lines.append(line)
-      previous_blank = False
-  return '\n'.join(lines)
+  return _ResolveIndents(value, blank_lines=_BLANK_LINES_COLLAPSE)
 
 #
 # Tags for programming language concepts
@@ -380,8 +685,8 @@ class LanguageNode(django_template.Node):
     """Render the 'language' tag.
 
     For the language setting we render nothing, but we take advantage of being
-    passed the context to set language specific things there, so they are
-    usable later.
+    passed the context to set the FormattingProfile for the language there, so
+    it is usable later.
 
     Args:
       context: (Context) the render context.
@@ -397,9 +702,7 @@ class LanguageNode(django_template.Node):
       pass
     # end - hack for django 0.96 support
     context[_LANGUAGE] = self._language
-    per_language_defaults = _language_defaults.get(self._language)
-    if per_language_defaults:
-      context.update(per_language_defaults)
+    context[_FORMATTING_PROFILE] = FormattingProfile.ForLanguage(self._language)
     context[_CURRENT_INDENT] = 0
     context[_CURRENT_LEVEL] = 0
     return ''
@@ -432,6 +735,9 @@ class IndentNode(django_template.Node):
 
   The interior text is re-indented by the existing indent + the indent nesting
       level * the LEVEL_INDENT
+
+  Only the outermost IndentNode actually indents text. Nested ones mark the
+  bounds of their text so the outermost can apply all levels in one pass.
   """
 
   def __init__(self, nodelist, levels):
@@ -443,24 +749,26 @@ class IndentNode(django_template.Node):
     current_indent = context.get(_CURRENT_INDENT, 0)
     current_indent_level = context.get(_CURRENT_LEVEL, 0)
     # How much extra indent will this level add
-    extra = (_GetFromContext(context, _LEVEL_INDENT) * self._levels)
+    extra = _GetProfile(context).level_indent * self._levels
     # Set the new effective indent of this block.  Tags which wrap text to
     # the line limit must use this value to determine their actual indentation.
     context[_CURRENT_INDENT] = current_indent + extra
     context[_CURRENT_LEVEL] = current_indent_level + self._levels
-    lines = self._nodelist.render(context)
+    nested = context.get(_IN_INDENT, False)
+    context[_IN_INDENT] = True
+    text = self._nodelist.render(context)
+    context[_IN_INDENT] = nested
     context[_CURRENT_INDENT] = current_indent
     context[_CURRENT_LEVEL] = current_indent_level
-    # We only have to prefix the lines in this row by the extra indent, because
-    # the outer scope will be adding its own indent as well.
-    prefix = ' ' * extra
-
-    def _PrefixNonBlank(s):
-      x = s.rstrip()
-      if x:
-        x = '%s%s' % (prefix, x)
-      return x
-    return '\n'.join([_PrefixNonBlank(line) for line in lines.split('\n')])
+    if nested:
+      # The enclosing indent block will apply our indent along with its own.
+      return '%s%d%s%s%s' % (_INDENT_START, extra, _INDENT_START, text,
+                             _INDENT_END)
+    writer = _IndentWriter()
+    writer.PushIndent(extra)
+    writer.write(text)
+    writer.PopIndent()
+    return writer.getvalue()
 
 
 @register.tag(name='indent')
@@ -512,36 +820,31 @@ class DocCommentNode(django_template.Node):
     Returns:
       The rendered comment.
     """
+    profile = _GetProfile(context)
     if self._comment_type == 'doc':
-      start_prefix = _GetFromContext(context, _DOC_COMMENT_START,
-                                     _COMMENT_START)
-      continue_prefix = _GetFromContext(context, _DOC_COMMENT_CONTINUE,
-                                        _COMMENT_CONTINUE)
-      comment_end = _GetFromContext(context, _DOC_COMMENT_END, _COMMENT_END)
-      begin_tag = _GetFromContext(context, _DOC_COMMENT_BEGIN_TAG)
-      end_tag = _GetFromContext(context, _DOC_COMMENT_END_TAG)
+      start_prefix = profile.doc_comment_start
+      continue_prefix = profile.doc_comment_continue
+      comment_end = profile.doc_comment_end
+      begin_tag = profile.doc_comment_begin_tag
+      end_tag = profile.doc_comment_end_tag
     else:
-      start_prefix = _GetFromContext(context, _COMMENT_START)
-      continue_prefix = _GetFromContext(context, _COMMENT_CONTINUE)
-      comment_end = _GetFromContext(context, _COMMENT_END)
+      start_prefix = profile.comment_start
+      continue_prefix = profile.comment_continue
+      comment_end = profile.comment_end
       begin_tag = ''
       end_tag = ''
 
-    available_width = (_GetFromContext(context, _LINE_WIDTH) -
-                       context.get(_CURRENT_INDENT, 0))
+    available_width = profile.line_width - context.get(_CURRENT_INDENT, 0)
     one_line = '%s%s%s%s%s' % (start_prefix, begin_tag, text, end_tag,
                                comment_end)
     if len(one_line) < available_width:
       return one_line
 
-    wrapper = textwrap.TextWrapper(width=available_width,
-                                   replace_whitespace=False,
-                                   initial_indent=continue_prefix,
-                                   subsequent_indent=continue_prefix)
     wrapped_blocks = []
     text = '%s%s%s' % (begin_tag, text, end_tag)
     for block in _DivideIntoBlocks(text.split('\n'), ''):
-      wrapped_blocks.append(wrapper.fill(' '.join(block)))
+      wrapped_blocks.append(_WrapText(' '.join(block), available_width,
+                                      continue_prefix, continue_prefix))
     ret = ''
     if start_prefix != continue_prefix:
       ret = '%s\n' % start_prefix.rstrip()
@@ -607,7 +910,7 @@ class ImportsNode(django_template.Node):
   def render(self, context):  #pylint: disable-msg=C6409
     """Render the node."""
 
-    explicit_import_text = self._nodelist.render(context)
+    explicit_import_text = _ResolveIndents(self._nodelist.render(context))
 
     # Look for an importManager on the element.  If we find one:
     # - scan the import text for import statements
@@ -617,16 +920,16 @@ class ImportsNode(django_template.Node):
     try:
       import_manager = django_template.resolve_variable(
           '%s.importManager' % self._element, context)
-      import_regex = _GetFromContext(context, _IMPORT_REGEX)
+      import_regex = _GetProfile(context).import_regex
       for line in explicit_import_text.split('\n'):
-        match_obj = re.match(import_regex, line)
+        match_obj = import_regex.match(line)
         if match_obj:
           import_manager.AddImport(match_obj.group('import'))
       import_lists = import_manager.ImportLists()
     except django_template.VariableDoesNotExist:
       pass
 
-    import_template = _GetFromContext(context, _IMPORT_TEMPLATE)
+    import_template = _GetProfile(context).import_template
     if import_lists:
       ret_lists = []
       for import_list in import_lists:
@@ -667,7 +970,8 @@ class ParameterListNode(django_template.Node):
     blocks = []
     # Split apart on paramater boundaries, getting rid of white space between
     # parameters
-    for block in self._nodelist.render(context).split(ParameterNode.BEGIN):
+    text = _ResolveIndents(self._nodelist.render(context))
+    for block in text.split(ParameterNode.BEGIN):
       block = block.rstrip().replace(ParameterNode.END, '')
       if block:
         blocks.append(block)
@@ -688,7 +992,8 @@ class ParameterNode(django_template.Node):
   def render(self, context):  # pylint: disable-msg=C6409
     """Render the node."""
     # Attach markers so the enclosing parameter_list can find me
-    return self.BEGIN + self._nodelist.render(context).strip() + self.END
+    text = _ResolveIndents(self._nodelist.render(context))
+    return self.BEGIN + text.strip() + self.END
 
 
 @register.tag(name='parameter_list')
@@ -741,6 +1046,327 @@ def DoParameter(parser, unused_token):
   return ParameterNode(nodelist)
 
 
+#
+# Streaming rendering
+#
+
+
+def RenderChunks(nodelist, context):
+  """Render a NodeList, yielding the text in pieces as it is produced.
+
+  This produces the same text as nodelist.render(context), without joining
+  it all into one string. Nodes which can produce their own text in pieces
+  do so through a RenderChunks(context) method.
+
+  Args:
+    nodelist: (NodeList) The nodes to render.
+    context: (Context) The rendering context.
+  Yields:
+    (unicode) pieces of the rendered text.
+  """
+  for node in nodelist:
+    render_chunks = getattr(node, 'RenderChunks', None)
+    if render_chunks:
+      for chunk in render_chunks(context):
+        yield chunk
+    elif isinstance(node, django_template.Node):
+      yield force_unicode(nodelist.render_node(node, context))
+    else:
+      yield force_unicode(node)
+
+
+#
+# Parallel rendering
+#
+
+# Compiled parallel_for bodies, by source, in a rendering worker process.
+_parallel_for_templates = {}
+
+
+def _TokenSource(token):
+  """Returns the template source text for a parsed token."""
+  if token.token_type == django_template.TOKEN_VAR:
+    return '%s %s %s' % (django_template.VARIABLE_TAG_START, token.contents,
+                         django_template.VARIABLE_TAG_END)
+  if token.token_type == django_template.TOKEN_BLOCK:
+    return '%s %s %s' % (django_template.BLOCK_TAG_START, token.contents,
+                         django_template.BLOCK_TAG_END)
+  if token.token_type == django_template.TOKEN_TEXT:
+    return token.contents
+  return ''  # comments
+
+
+def _FlattenContext(context):
+  """Returns a dict of all the variables visible in a context."""
+  if isinstance(context, dict):
+    return dict(context)
+  flat = {}
+  for d in reversed(list(context)):
+    if isinstance(d, django_template.Context):
+      flat.update(_FlattenContext(d))
+    else:
+      flat.update(d)
+  return flat
+
+
+def _RenderParallelForBody(shared, index):
+  """Render a parallel_for body for one element. Used by ParallelMap."""
+  source, loop_variable, elements, variables, autoescape, overlay = shared
+  template = _parallel_for_templates.get(source)
+  if not template:
+    template = django_template.Template(source)
+    _parallel_for_templates[source] = template
+  d = dict(variables)
+  d[loop_variable] = elements[index]
+  context = django_template.Context(d, autoescape=autoescape)
+  if overlay:
+    return overlay.Call(template.render, context)
+  return template.render(context)
+
+
+class ParallelForNode(django_template.Node):
+  """Node for parallel_for blocks."""
+
+  def __init__(self, loop_variable, sequence, nodelist, source):
+    super(ParallelForNode, self).__init__()
+    self._loop_variable = loop_variable
+    self._sequence = sequence
+    self._nodelist = nodelist
+    self._source = source
+
+  def render(self, context):  # pylint: disable-msg=C6409
+    """Render the node."""
+    return ''.join(self.RenderChunks(context))
+
+  def RenderChunks(self, context):
+    """Render the node, yielding the text for each element as it is ready."""
+    elements = list(self._sequence.resolve(context, True) or [])
+    options = context.get('options') or {}
+    processes = options.get('render_processes')
+    if not processes or processes <= 1 or len(elements) <= 1:
+      for element in elements:
+        context.push()
+        context[self._loop_variable] = element
+        for chunk in RenderChunks(self._nodelist, context):
+          yield chunk
+        context.pop()
+      return
+    # The workers render with the Overlay active here, if there is one.
+    shared = (self._source, self._loop_variable, elements,
+              _FlattenContext(context), getattr(context, 'autoescape', True),
+              template_objects.ActiveOverlay())
+    for chunk in utilities.ParallelMap(_RenderParallelForBody, shared,
+                                       len(elements), processes):
+      yield chunk
+
+
+@register.tag(name='parallel_for')
+def DoParallelFor(parser, token):
+  """A for loop whose iterations may be rendered by worker processes.
+
+  When the 'render_processes' option is greater than 1, the body is rendered
+  for each element by a pool of worker processes, and the results are joined
+  in order. Otherwise it renders like a plain for loop. The body must not
+  depend on earlier iterations, and forloop is not available in it.
+
+  Usage:
+    {% parallel_for resource in api.resources %}
+    {% emit_resource_def resource %}
+    {% endparallel_for %}
+
+  Args:
+    parser: (parser) the Django parser context.
+    token: (django.template.Token) the token holding this tag
+
+  Returns:
+    a ParallelForNode
+  """
+  bits = token.split_contents()
+  if len(bits) != 4 or bits[2] != 'in':
+    raise django_template.TemplateSyntaxError(
+        'parallel_for tag must look like "parallel_for x in y": %s' %
+        token.contents)
+  # Keep the source of the body, so worker processes can compile it.
+  tokens_before = list(parser.tokens)
+  nodelist = parser.parse(('endparallel_for',))
+  body_tokens = tokens_before[:len(tokens_before) - len(parser.tokens)]
+  parser.delete_first_token()
+  source = ''.join(_TokenSource(t) for t in body_tokens)
+  return ParallelForNode(bits[1], parser.compile_filter(bits[3]), nodelist,
+                         source)
+
+
+#
+# Fragment memoisation
+#
+
+# The templates rendered by the emit_* tags.
+_EMIT_TAG_TEMPLATES = {
+    'emit_enum_def': '_enum.tmpl',
+    'emit_method_def': '_method.tmpl',
+    'emit_model_def': '_model.tmpl',
+    'emit_parameter_doc': '_parameter.tmpl',
+    'emit_resource_def': '_resource.tmpl',
+    }
+_TEMPLATE_CALL_RE = re.compile(r'{%\s*(call_template\s+\S+|emit_\w+)')
+# Tags whose rendering changes state outside the text they produce.
+_SIDE_EFFECT_TAG_RE = re.compile(r'{%\s*(imports|language)\b')
+_TAG_RE = re.compile(r'{%.*?%}|{{.*?}}', re.DOTALL)
+_NAME_RE = re.compile(r'[A-Za-z_]\w*')
+# Names which are not the member of, or followed by a member of, something.
+_BARE_NAME_RE = re.compile(r'(?<![.\w])([A-Za-z_]\w*)(?![\w.])')
+# Variables which tags read without them being named in the template.
+_IMPLICIT_VARIABLES = frozenset(('options', 'template_dir'))
+_SCALAR_TYPES = (basestring, int, long, float, bool, type(None))
+
+# The rendered fragments, keyed by template and the variables it uses.
+_fragment_cache = utilities.LruCache(0)
+# The names used by memoisable templates, or None, by template path.
+_fragment_names = {}
+# A marker for missing members.
+_MISSING = object()
+
+
+def SetFragmentCacheSize(size):
+  """Set how many rendered template fragments to remember. 0 disables it."""
+  _fragment_cache.SetCapacity(size)
+  if not size:
+    _fragment_cache.Clear()
+
+
+def FragmentCacheStatistics():
+  """Returns a dict with the size, hits, misses and hit_rate of the cache."""
+  return _fragment_cache.Statistics()
+
+
+def _FragmentNames(template_path):
+  """Find the names a template may read from its context.
+
+  This includes the names used by every template it calls. The names are any
+  words found in tags or variables, so there may be extra ones. A template is
+  only memoisable if neither it nor any template it calls uses a tag with side
+  effects.
+
+  Args:
+    template_path: (str) The path to the template.
+  Returns:
+    (names, bare_names) frozensets, or None if the template is not memoisable.
+    bare_names are the names which are used other than to get at a member.
+  """
+  if template_path in _fragment_names:
+    return _fragment_names[template_path]
+  names = set()
+  bare_names = set()
+  seen = set([template_path])
+  to_visit = [template_path]
+  while to_visit and names is not None:
+    path = to_visit.pop()
+    if not os.path.exists(path):
+      names = None
+      break
+    f = open(path)
+    source = f.read()
+    f.close()
+    if _SIDE_EFFECT_TAG_RE.search(source):
+      names = None
+      break
+    for tag in _TAG_RE.findall(source):
+      names.update(_NAME_RE.findall(tag))
+      bare_names.update(_BARE_NAME_RE.findall(tag))
+    for call in _TEMPLATE_CALL_RE.findall(source):
+      bits = call.split()
+      if bits[0] == 'call_template':
+        called = '%s.tmpl' % bits[1]
+      else:
+        called = _EMIT_TAG_TEMPLATES.get(bits[0])
+      if not called:
+        names = None
+        break
+      # Called templates are found relative to the same template_dir.
+      called_path = os.path.join(os.path.dirname(template_path), called)
+      if called_path not in seen:
+        seen.add(called_path)
+        to_visit.append(called_path)
+  if names is not None:
+    names = (frozenset(names | _IMPLICIT_VARIABLES), frozenset(bare_names))
+  _fragment_names[template_path] = names
+  return names
+
+
+def _KeyPart(value, objects):
+  """Returns a key for a value, by value for scalars, else by identity."""
+  if isinstance(value, _SCALAR_TYPES):
+    return (type(value), value)
+  objects.append(value)
+  return id(value)
+
+
+def _Fingerprint(value, names, objects):
+  """Returns a key for the parts of an object a template may read.
+
+  If a template only reads members of the object bound to a variable, two
+  objects which have the same values for all the names the template uses
+  render the same way.
+
+  Args:
+    value: (object) The object bound to a template variable.
+    names: (frozenset) The names used by the template.
+    objects: (list) Objects the key refers to by identity are appended here.
+  Returns:
+    A hashable key.
+  """
+  parts = [type(value)]
+  for name in sorted(names):
+    # This is the order Django looks up a variable member in.
+    try:
+      member = value[name]
+    except KeyError:
+      try:
+        member = getattr(value, name, _MISSING)
+      except Exception:  # pylint: disable-msg=W0703
+        # The template may never use a member which fails to compute.
+        return _KeyPart(value, objects)
+      if member is _MISSING:
+        continue
+    parts.append((name, _KeyPart(member, objects)))
+  return tuple(parts)
+
+
+def _FragmentKey(template_path, bound_variable, context):
+  """Make the memoisation key for rendering a template in a context.
+
+  The key holds the values of the context variables the template may read.
+  Scalars are part of the key by value, everything else by identity, except
+  for the bound variable, which is fingerprinted if the template only uses its
+  members. The active Overlay is part of the key by identity. The objects are returned
+  too, so that the cache can hold on to them. That keeps their ids from being
+  reused while the key is in the cache.
+
+  Args:
+    template_path: (str) The path to the template.
+    bound_variable: (str) The variable the template is called with.
+    context: (Context) The context the template will be rendered in.
+  Returns:
+    (key, objects) or (None, None) if the rendering may not be memoised.
+  """
+  traits = _FragmentNames(template_path)
+  if traits is None:
+    return None, None
+  names, bare_names = traits
+  objects = []
+  # The same objects may render differently in another Overlay.
+  key = [template_path, getattr(context, 'autoescape', True),
+         _KeyPart(template_objects.ActiveOverlay(), objects)]
+  for name, value in sorted(_FlattenContext(context).iteritems()):
+    if (name == bound_variable and name not in bare_names and
+        isinstance(value, template_objects.UseableInTemplates)):
+      key.append((name, _Fingerprint(value, names, objects)))
+    # Names starting with '_' hold the formatting state, used by our tags.
+    elif name in names or name.startswith('_'):
+      key.append((name, _KeyPart(value, objects)))
+  return tuple(key), objects
+
+
 #
 # Tags which include language specific templates
 #
@@ -758,6 +1384,12 @@ class TemplateNode(django_template.Node):
   * renders the template
   * restores the context.
 
+  If the fragment cache is enabled, renderings of templates without side
+  effects are memoised. They are keyed by the template and the values of
+  everything in the context, so the memoised text is only reused when the
+  template would render the same thing. That assumes objects in the context
+  are not changed while templates are being rendered.
+
   See individual tag definitions for usage.
   """
 
@@ -787,7 +1419,17 @@ class TemplateNode(django_template.Node):
       old_value = None
     var = django_template.resolve_variable(self._caller_variable, context)
     context[self._bound_variable] = var
-    s = render_to_string(template_path, context).rstrip()
+    key = None
+    if _fragment_cache.capacity > 0:
+      key, objects = _FragmentKey(template_path, self._bound_variable,
+                                  context)
+    cached = key and _fragment_cache.Get(key)
+    if cached:
+      s = cached[0]
+    else:
+      s = _RStripIndented(render_to_string(template_path, context))
+      if key:
+        _fragment_cache.Put(key, (s, objects))
     if old_value:
       context[self._bound_variable] = old_value
     return s
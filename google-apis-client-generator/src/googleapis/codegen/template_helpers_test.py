@@ -24,6 +24,7 @@ import os
 
 from google.apputils import basetest
 from googleapis.codegen import template_helpers
+from googleapis.codegen import template_objects
 from django import template as django_template
 
 django_template.add_to_builtins(
@@ -73,6 +74,24 @@ class TemplateHelpersTest(basetest.TestCase):
     self.assertEquals(expected,
                       template_helpers.java_comment_fragment(value, indent))
 
+  def testWrapCache(self):
+    template_helpers.SetWrapCacheSize(10)
+    value = 'abcdefghij ' * 20
+    first = template_helpers.java_parameter_wrap(value)
+    before = template_helpers.WrapCacheStatistics()
+    self.assertEquals(first, template_helpers.java_parameter_wrap(value))
+    after = template_helpers.WrapCacheStatistics()
+    self.assertEquals(before['hits'] + 1, after['hits'])
+    self.assertEquals(before['misses'], after['misses'])
+    # Different prefixes must not share a cached result.
+    self.assertNotEquals(first,
+                         template_helpers.java_comment_fragment(value, 0))
+    template_helpers.SetWrapCacheSize(0)
+    self.assertEquals(0, template_helpers.WrapCacheStatistics()['size'])
+    self.assertEquals(first, template_helpers.java_parameter_wrap(value))
+    template_helpers.SetWrapCacheSize(
+        template_helpers._DEFAULT_WRAP_CACHE_SIZE)
+
   def testCommentBlockJavaDoc(self):
     alphabet = 'abcdefghijklmnopqrstuvwxyz'
     value = """
@@ -97,12 +116,71 @@ class TemplateHelpersTest(basetest.TestCase):
     self.assertEquals('a\nb', template_helpers.noblanklines('a\nb\n\n'))
     self.assertEquals('a\nb', template_helpers.noblanklines('\na\n\nb\n'))
 
+  def testCollapseBlanklines(self):
+    self.assertEquals('a\n\nb',
+                      template_helpers.collapse_blanklines('a\n\n\nb'))
+    self.assertEquals('a\n  \nb\n',
+                      template_helpers.collapse_blanklines('a\n  \n\nb\n\n'))
+
+  def testIndent(self):
+    source = ('{% language java %}{% indent %}a\n'
+              '{% indent %}b  \n\n{% indent 2 %}c\n{% endindent %}'
+              'd{% endindent %}\ne{% endindent %}')
+    template = django_template.Template(source)
+    rendered = template.render(django_template.Context({}))
+    self.assertEquals('    a\n        b\n\n                c\n        d\n    e',
+                      rendered)
+
+  def testIndentInsideFilter(self):
+    source = ('{% indent %}{% filter noblanklines %}a\n\n'
+              '{% indent %}  b\n\n{% endindent %}'
+              '{% endfilter %}{% endindent %}')
+    template = django_template.Template(source)
+    rendered = template.render(django_template.Context({}))
+    self.assertEquals('    a\n          b', rendered)
+
+  def testIndentWriter(self):
+    writer = template_helpers._IndentWriter()
+    writer.write('x ')
+    writer.PushIndent(2)
+    writer.write('y  \nz\n  \n')
+    writer.PushIndent(3)
+    writer.write('w')
+    writer.PopIndent()
+    writer.PopIndent()
+    writer.write(' v')
+    self.assertEquals('x   y\n  z\n\n     w v', writer.getvalue())
+
+    writer = template_helpers._IndentWriter(
+        blank_lines=template_helpers._BLANK_LINES_REMOVE)
+    writer.write('a\n\n  \nb\n')
+    self.assertEquals('a\nb', writer.getvalue())
+
+  def testFormattingProfile(self):
+    java = template_helpers.FormattingProfile.ForLanguage('java')
+    self.assertTrue(java is template_helpers.FormattingProfile.ForLanguage(
+        'java'))
+    self.assertEquals(100, java.line_width)
+    self.assertEquals('/** ', java.doc_comment_start)
+    # Unknown languages get the defaults.
+    unknown = template_helpers.FormattingProfile.ForLanguage('cobol')
+    self.assertEquals(template_helpers._defaults[template_helpers._LINE_WIDTH],
+                      unknown.line_width)
+    narrow = template_helpers.FormattingProfile(
+        'java', {template_helpers._LINE_WIDTH: 50})
+    self.assertEquals(50, narrow.line_width)
+    self.assertEquals(java.level_indent, narrow.level_indent)
+    self.assertRaises(AttributeError, setattr, java, 'line_width', 10)
+
   def testDocComments(self):
     def TryDocComment(language, input_text, expected):
       context = {}
       lang_node = template_helpers.LanguageNode(language)
       lang_node.render(context)
-      context['_LINE_WIDTH'] = 50  # to make expected easier to read
+      # Narrow the lines to make expected easier to read
+      context[template_helpers._FORMATTING_PROFILE] = (
+          template_helpers.FormattingProfile(
+              language, {template_helpers._LINE_WIDTH: 50}))
       doc_comment_node = template_helpers.DocCommentNode(
           text=input_text, comment_type='doc')
       self.assertEquals(expected, doc_comment_node.render(context))
@@ -144,6 +222,46 @@ class TemplateHelpersTest(basetest.TestCase):
         })
     self.assertEquals('abc 1baz1 2yyy2 def', rendered)
 
+  def testFragmentCache(self):
+    template_helpers.SetFragmentCacheSize(10)
+    fragment = django_template.Template(
+        '{% call_template _fragment_test foo bar %}')
+    api = {'xxx': 'yyy'}
+
+    def Render(bar, api, template=fragment):
+      return template.render(django_template.Context({
+          'template_dir': self._TEST_DATA_DIR,
+          'api': api,
+          'bar': bar,
+          'unused': object(),
+          }))
+
+    def Hits():
+      return template_helpers.FragmentCacheStatistics()['hits']
+
+    a = template_objects.UseableInTemplates({'name': 'a', 'other': 1})
+    self.assertEquals('a yyy', Render(a, api))
+    self.assertEquals('a yyy', Render(a, api))
+    self.assertEquals(1, Hits())
+    # Bound objects are compared by the members the template may use.
+    b = template_objects.UseableInTemplates({'name': 'a', 'other': 2})
+    self.assertEquals('a yyy', Render(b, api))
+    self.assertEquals(2, Hits())
+    c = template_objects.UseableInTemplates({'name': 'a', 'description': 'c'})
+    self.assertEquals('a: c yyy', Render(c, api))
+    self.assertEquals(2, Hits())
+    # Other variables are compared by identity.
+    self.assertEquals('a zzz', Render(a, {'xxx': 'zzz'}))
+    self.assertEquals(2, Hits())
+    # Templates which use the bound object itself do not fingerprint it.
+    call = django_template.Template('{% call_template _call_test foo bar %}')
+    self.assertEquals('1{}1 2yyy2', Render({}, api, call))
+    self.assertEquals('1{1: 2}1 2yyy2', Render({1: 2}, api, call))
+    self.assertEquals(2, Hits())
+    template_helpers.SetFragmentCacheSize(0)
+    self.assertEquals(0, template_helpers.FragmentCacheStatistics()['size'])
+    self.assertEquals('a yyy', Render(a, api))
+
   def testParamList(self):
     source = """method({% parameter_list %}
           {% parameter %}int a{% end_parameter%}
@@ -158,6 +276,31 @@ class TemplateHelpersTest(basetest.TestCase):
     rendered = template.render({})
     self.assertEquals('method(int a, string b)', rendered)
 
+  def testParallelFor(self):
+    source = ('{% language java %}{% indent %}'
+              '{% parallel_for x in items %}\n'
+              '{% indent %}{{ x }} & {{ y }}{% endindent %}{# note #}\n'
+              '{% endparallel_for %}{% endindent %}')
+    template = django_template.Template(source)
+    expected = '\n        a & b\n\n        c & b\n\n        d & b\n'
+    for processes in (0, 2):
+      rendered = template.render(django_template.Context({
+          'items': ['a', 'c', 'd'],
+          'y': 'b',
+          'options': {'render_processes': processes},
+          }))
+      self.assertEquals(expected, rendered)
+
+  def testRenderChunks(self):
+    source = ('head {% parallel_for x in items %}<{{ x }}>'
+              '{% endparallel_for %}{% if true %} tail{% endif %}')
+    template = django_template.Template(source)
+    context = django_template.Context({'items': ['a', 'b'], 'true': True})
+    chunks = list(template_helpers.RenderChunks(template.nodelist, context))
+    self.assertEquals(['head ', '<', 'a', '>', '<', 'b', '>', ' tail'],
+                      chunks)
+    self.assertEquals(template.render(context), ''.join(chunks))
+
   def testImportWithoutManager(self):
     expected = """import hello_world
                   import abc"""
@@ -18,15 +18,98 @@
 
 This module contains the base classes for objects which can be used directly
 in template expansion.
+
+A tree of these objects, such as an Api, may be shared by several code
+generators. Each generator makes its language specific annotations in its own
+Overlay, so they do not show through to the others.
 """
 
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
 import copy
+import threading
 
 from googleapis.codegen import html_stripper
 from googleapis.codegen import name_validator
 
+# The Overlay active in each thread.
+_active = threading.local()
+
+
+def ActiveOverlay():
+  """Returns the Overlay active in this thread, or None."""
+  return getattr(_active, 'overlay', None)
+
+
+class Overlay(object):
+  """Changes to a tree of template objects, kept apart from the tree.
+
+  While an Overlay is active in a thread, the template values and language
+  models set on objects are recorded in the Overlay rather than in the objects
+  themselves, and reads see them. The values of an object are copied into the
+  Overlay the first time they are used, so the objects are never changed and
+  may be shared between Overlays, which may be active in different threads at
+  once.
+  """
+
+  def __init__(self):
+    # The values of each object used, by object.
+    self._values = {}
+    # The language models set on objects, by object.
+    self._language_models = {}
+
+  def Values(self, obj, values):
+    """Returns this Overlay's copy of the values of an object.
+
+    Args:
+      obj: (UseableInTemplates) The object.
+      values: (dict) The values of the object outside of any overlay.
+    Returns:
+      (dict) The values, which may be changed.
+    """
+    overlay_values = self._values.get(obj)
+    if overlay_values is None:
+      overlay_values = self._values[obj] = dict(values)
+    return overlay_values
+
+  def Call(self, function, *args, **kwargs):
+    """Call a function with this Overlay active in this thread.
+
+    Args:
+      function: (callable) The function to call.
+      args: Positional arguments for function.
+      kwargs: Keyword arguments for function.
+    Returns:
+      The result of function.
+    """
+    return _CallInOverlay(self, function, args, kwargs)
+
+
+def CallOutsideOverlay(function, *args, **kwargs):
+  """Call a function with no Overlay active in this thread.
+
+  Used to add to a shared tree of template objects, such as the parts of an
+  Api made when first used, so every Overlay sees the additions.
+
+  Args:
+    function: (callable) The function to call.
+    args: Positional arguments for function.
+    kwargs: Keyword arguments for function.
+  Returns:
+    The result of function.
+  """
+  return _CallInOverlay(None, function, args, kwargs)
+
+
+def _CallInOverlay(overlay, function, args, kwargs):
+  """Call a function with an Overlay, or None, active in this thread."""
+  previous = ActiveOverlay()
+  _active.overlay = overlay
+  try:
+    return function(*args, **kwargs)
+  finally:
+    _active.overlay = previous
+
 
 class UseableInTemplates(object):
   """Base class for any object usable in templates.
@@ -43,7 +126,23 @@ class UseableInTemplates(object):
           are exposed to the template expander.
     """
     self._def_dict = dict(def_dict)
-    self._raw_def_dict = dict(copy.deepcopy(def_dict))
+    # The discovery dictionary is copied for raw only when raw is first used.
+    # Until then it must not be changed.
+    self._raw_source = def_dict
+    self._raw_def_dict = None
+
+  def _GetDefDict(self):
+    overlay = ActiveOverlay()
+    if overlay:
+      return overlay.Values(self, self._base_def_dict)
+    return self._base_def_dict
+
+  def _SetDefDict(self, def_dict):
+    self._base_def_dict = def_dict
+
+  # The values seen by templates. They are those of the active Overlay, if
+  # there is one.
+  _def_dict = property(_GetDefDict, _SetDefDict)
 
   def __getitem__(self, key):
     """Overrides default __getitem__ to return values from the original dict."""
@@ -70,6 +169,9 @@ class UseableInTemplates(object):
 
   @property
   def raw(self):
+    """A copy of the discovery dictionary, as it was before any changes."""
+    if self._raw_def_dict is None:
+      self._raw_def_dict = dict(copy.deepcopy(self._raw_source))
     return self._raw_def_dict
 
 
@@ -81,6 +183,7 @@ class CodeObject(UseableInTemplates):
   """
 
   _validator = name_validator.NameValidator()
+  _base_language_model = None
 
   def __init__(self, def_dict, api, parent=None, language_model=None):
     """Construct a CodeObject.
@@ -228,6 +331,24 @@ class CodeObject(UseableInTemplates):
     """Changes the language model of this code object."""
     self._language_model = language_model
 
+  def _GetLanguageModel(self):
+    overlay = ActiveOverlay()
+    # Access to protected member OK here. pylint: disable-msg=W0212
+    if overlay and self in overlay._language_models:
+      return overlay._language_models[self]
+    return self._base_language_model
+
+  def _SetLanguageModel(self, language_model):
+    overlay = ActiveOverlay()
+    if overlay:
+      # Access to protected member OK here. pylint: disable-msg=W0212
+      overlay._language_models[self] = language_model
+    else:
+      self._base_language_model = language_model
+
+  # The language model is also that of the active Overlay, if there is one.
+  _language_model = property(_GetLanguageModel, _SetLanguageModel)
+
   def SetParent(self, parent):
     """Changes the parent of this code object.
 
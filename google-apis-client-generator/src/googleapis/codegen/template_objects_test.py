@@ -66,6 +66,29 @@ class TemplateObjectsTest(basetest.TestCase):
     self.assertEquals('Foo|Bar|Baz', baz.packageRelativeClassName)
     self.assertEquals('hello|world|Foo|Bar|Baz', baz.fullClassName)
 
+  def testOverlay(self):
+    foo = template_objects.CodeObject({'className': 'Foo'}, None,
+                                      language_model=self.language_model)
+    bar = template_objects.CodeObject({'className': 'Bar'}, None, parent=foo)
+    other_model = LanguageModel(class_name_delimiter='.')
+
+    def Annotate():
+      foo.SetLanguageModel(other_model)
+      bar.SetTemplateValue('className', 'Baz')
+      bar.values['codeName'] = 'baz'
+      return bar.fullClassName
+
+    overlay = template_objects.Overlay()
+    self.assertEquals('Foo.Baz', overlay.Call(Annotate))
+    # The changes are only seen while the overlay is active.
+    self.assertEquals('Foo|Bar', bar.fullClassName)
+    self.assertEquals(None, bar.GetTemplateValue('codeName'))
+    self.assertEquals('Foo.Baz', overlay.Call(lambda: bar.fullClassName))
+    self.assertEquals('baz', overlay.Call(bar.GetTemplateValue, 'codeName'))
+    self.assertEquals(None, template_objects.ActiveOverlay())
+    self.assertEquals('Foo|Bar',
+                      template_objects.Overlay().Call(lambda: bar.fullClassName))
+
 
 if __name__ == '__main__':
   basetest.main()
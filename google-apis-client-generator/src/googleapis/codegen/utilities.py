@@ -22,6 +22,19 @@ Assorted utility methods for the code generator.
 
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
+import cPickle as pickle
+import multiprocessing
+import os
+import threading
+
+# The number of tasks handed to a ParallelMap worker process at a time.
+_PARALLEL_CHUNK_SIZE = 4
+
+# The function and shared state of a ParallelMap worker process. Set once, when
+# the worker starts.
+_worker_function = None
+_worker_shared = None
+
 
 def CamelCase(s):
   """CamelCase a string so that it is more readable as a variable name.
@@ -45,3 +58,217 @@ def CamelCase(s):
       new_word = False
     ret += c
   return ret
+
+
+def SourceDateEpoch():
+  """Returns the fixed time to stamp on outputs, if there is one.
+
+  Following the reproducible builds convention, this is the SOURCE_DATE_EPOCH
+  environment variable. When it is set, timestamps in the generated library
+  and its archives are taken from it rather than the clock, so identical
+  inputs give byte identical outputs.
+
+  Returns:
+    (int) Seconds since the epoch, or None if SOURCE_DATE_EPOCH is not set.
+  Raises:
+    ValueError: if SOURCE_DATE_EPOCH is not an integer.
+  """
+  epoch = os.environ.get('SOURCE_DATE_EPOCH')
+  if not epoch:
+    return None
+  try:
+    return int(epoch)
+  except ValueError:
+    raise ValueError('SOURCE_DATE_EPOCH must be an integer, not %r' % epoch)
+
+
+def ParallelMap(function, shared, count, processes):
+  """Compute function(shared, i) for each i in range(count), possibly in parallel.
+
+  If processes is greater than 1, the calls are made by a pool of worker
+  processes. The shared state is pickled once, and each worker unpickles it
+  once, when it starts, so it is not resent for each call. The results are
+  yielded in order as they become available. Worker processes never start pools
+  of their own; nested calls are made serially.
+
+  Pools are only started from the main thread, and other threads make the calls
+  serially too. A process forked from one thread inherits any lock another
+  thread holds at that moment, still held, and may hang on it. So processes
+  should not be asked for while other threads are generating either.
+
+  Args:
+    function: (callable) A module level function, so it can be pickled. It must
+      not modify the shared state.
+    shared: (object) Picklable state passed to every call.
+    count: (int) The number of calls to make.
+    processes: (int) The number of worker processes to use.
+  Yields:
+    function(shared, i), for i in range(count).
+  """
+  processes = min(processes or 1, count)
+  # pylint: disable-msg=W0212
+  on_main_thread = isinstance(threading.current_thread(), threading._MainThread)
+  if processes <= 1 or _worker_function or not on_main_thread:
+    for i in xrange(count):
+      yield function(shared, i)
+    return
+
+  snapshot = pickle.dumps(shared, pickle.HIGHEST_PROTOCOL)
+  pool = multiprocessing.Pool(processes, _InitParallelWorker,
+                              (function, snapshot))
+  try:
+    for result in pool.imap(_RunParallelTask, xrange(count),
+                            _PARALLEL_CHUNK_SIZE):
+      yield result
+    pool.close()
+  except:
+    pool.terminate()
+    raise
+  finally:
+    pool.join()
+
+
+def _InitParallelWorker(function, snapshot):
+  global _worker_function, _worker_shared
+  _worker_function = function
+  _worker_shared = pickle.loads(snapshot)
+
+
+def _RunParallelTask(index):
+  return _worker_function(_worker_shared, index)
+
+
+class LruCache(object):
+  """A bounded mapping which discards the least recently used entries first.
+
+  The cache also counts hits and misses, so callers can report how effective
+  it is. It is safe to share between threads.
+  """
+
+  def __init__(self, capacity):
+    """Create an LruCache.
+
+    Args:
+      capacity: (int) The maximum number of entries to hold. A capacity of 0
+        disables the cache.
+    """
+    self._capacity = capacity
+    self._lock = threading.Lock()
+    self._entries = {}
+    # A circular doubly linked list of [previous, next, key, value] links, in
+    # order of use. The sentinel's next link is the least recently used entry.
+    self._sentinel = []
+    self._sentinel[:] = [self._sentinel, self._sentinel, None, None]
+    self._hits = 0
+    self._misses = 0
+
+  def __len__(self):
+    return len(self._entries)
+
+  @property
+  def capacity(self):
+    return self._capacity
+
+  @property
+  def hits(self):
+    return self._hits
+
+  @property
+  def misses(self):
+    return self._misses
+
+  @property
+  def hit_rate(self):
+    """The fraction of lookups which were hits, or 0.0 if none were made."""
+    lookups = self._hits + self._misses
+    if not lookups:
+      return 0.0
+    return float(self._hits) / lookups
+
+  def Get(self, key, default=None):
+    """Look up a key, marking it as most recently used.
+
+    Args:
+      key: (hashable) The key to look up.
+      default: (object) What to return if the key is not in the cache.
+    Returns:
+      The cached value or default.
+    """
+    self._lock.acquire()
+    try:
+      link = self._entries.get(key)
+      if link is None:
+        self._misses += 1
+        return default
+      self._hits += 1
+      self._Unlink(link)
+      self._Append(link)
+      return link[3]
+    finally:
+      self._lock.release()
+
+  def Put(self, key, value):
+    """Add or replace an entry, evicting the least recently used if full."""
+    if self._capacity <= 0:
+      return
+    self._lock.acquire()
+    try:
+      link = self._entries.get(key)
+      if link is not None:
+        self._Unlink(link)
+        link[3] = value
+      else:
+        link = [None, None, key, value]
+        self._entries[key] = link
+      self._Append(link)
+      self._Trim()
+    finally:
+      self._lock.release()
+
+  def SetCapacity(self, capacity):
+    """Change the capacity, evicting entries if needed."""
+    self._lock.acquire()
+    try:
+      self._capacity = capacity
+      self._Trim()
+    finally:
+      self._lock.release()
+
+  def Clear(self):
+    """Remove all entries and reset the statistics."""
+    self._lock.acquire()
+    try:
+      self._entries.clear()
+      self._sentinel[:] = [self._sentinel, self._sentinel, None, None]
+      self._hits = 0
+      self._misses = 0
+    finally:
+      self._lock.release()
+
+  def Statistics(self):
+    """Returns a dict of the cache size and effectiveness."""
+    return {
+        'capacity': self._capacity,
+        'size': len(self._entries),
+        'hits': self._hits,
+        'misses': self._misses,
+        'hit_rate': self.hit_rate,
+        }
+
+  def _Trim(self):
+    while len(self._entries) > max(self._capacity, 0):
+      oldest = self._sentinel[1]
+      self._Unlink(oldest)
+      del self._entries[oldest[2]]
+
+  def _Append(self, link):
+    last = self._sentinel[0]
+    link[0] = last
+    link[1] = self._sentinel
+    last[1] = link
+    self._sentinel[0] = link
+
+  @staticmethod
+  def _Unlink(link):
+    link[0][1] = link[1]
+    link[1][0] = link[0]
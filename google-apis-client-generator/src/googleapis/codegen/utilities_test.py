@@ -18,12 +18,22 @@
 
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
+import os
+import threading
 
 from google.apputils import basetest
 
 from googleapis.codegen import utilities
 
 
+def _Scale(shared, index):
+  return shared * index
+
+
+def _ProcessId(unused_shared, unused_index):
+  return os.getpid()
+
+
 class UtilitiesTest(basetest.TestCase):
 
   def testCamelCase(self):
@@ -37,6 +47,62 @@ class UtilitiesTest(basetest.TestCase):
     self.assertEquals('HelloWorld', utilities.CamelCase('hello.world'))
     self.assertEquals('HELLOWORLD', utilities.CamelCase('HELLO_WORLD'))
 
+  def testSourceDateEpoch(self):
+    saved = os.environ.pop('SOURCE_DATE_EPOCH', None)
+    try:
+      self.assertEquals(None, utilities.SourceDateEpoch())
+      os.environ['SOURCE_DATE_EPOCH'] = '1300000000'
+      self.assertEquals(1300000000, utilities.SourceDateEpoch())
+      os.environ['SOURCE_DATE_EPOCH'] = 'yesterday'
+      self.assertRaises(ValueError, utilities.SourceDateEpoch)
+    finally:
+      os.environ.pop('SOURCE_DATE_EPOCH', None)
+      if saved is not None:
+        os.environ['SOURCE_DATE_EPOCH'] = saved
+
+  def testParallelMap(self):
+    for processes in (0, 1, 3):
+      self.assertEquals(
+          [0, 5, 10, 15, 20, 25, 30],
+          list(utilities.ParallelMap(_Scale, 5, 7, processes)))
+    self.assertEquals([], list(utilities.ParallelMap(_Scale, 5, 0, 3)))
+
+  def testParallelMapOffMainThread(self):
+    process_ids = []
+    thread = threading.Thread(target=lambda: process_ids.extend(
+        utilities.ParallelMap(_ProcessId, None, 7, 3)))
+    thread.start()
+    thread.join()
+    self.assertEquals([os.getpid()] * 7, process_ids)
+    self.assertNotEquals([os.getpid()] * 7,
+                         list(utilities.ParallelMap(_ProcessId, None, 7, 3)))
+
+  def testLruCache(self):
+    cache = utilities.LruCache(2)
+    cache.Put('a', 1)
+    cache.Put('b', 2)
+    self.assertEquals(1, cache.Get('a'))  # 'b' is now least recently used
+    cache.Put('c', 3)
+    self.assertEquals(None, cache.Get('b'))
+    self.assertEquals(1, cache.Get('a'))
+    self.assertEquals(3, cache.Get('c'))
+    self.assertEquals(2, len(cache))
+    self.assertEquals(3, cache.hits)
+    self.assertEquals(1, cache.misses)
+    self.assertEquals(0.75, cache.hit_rate)
+    cache.SetCapacity(1)
+    self.assertEquals(1, len(cache))
+    self.assertEquals(3, cache.Get('c'))
+    cache.Clear()
+    self.assertEquals(0, len(cache))
+    self.assertEquals(0.0, cache.hit_rate)
+
+  def testLruCacheDisabled(self):
+    cache = utilities.LruCache(0)
+    cache.Put('a', 1)
+    self.assertEquals('x', cache.Get('a', 'x'))
+    self.assertEquals(0, len(cache))
+
 
 if __name__ == '__main__':
   basetest.main()
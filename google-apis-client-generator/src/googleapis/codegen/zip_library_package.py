@@ -22,63 +22,177 @@ components generated and required by a library.
 
 __author__ = 'aiuto@google.com (Tony Aiuto)'
 
-import array
+import binascii
+import collections
+import functools
+import multiprocessing
+import multiprocessing.pool
+import os
+import shutil
+import struct
+import tempfile
 import time
 import zipfile
+import zlib
 
+from googleapis.codegen import utilities
 from googleapis.codegen.library_package import LibraryPackage
 
+# Readers such as java.util.zip.ZipInputStream can not find the end of an
+# uncompressed entry from a data descriptor, so on a stream we can not seek
+# back on, uncompressed entries are spooled before being written. This many
+# bytes of an entry are held in memory; the rest overflow to a temporary file.
+_SPOOL_MEMORY_LIMIT = 1 << 20
 
-class ZipLibraryPackage(LibraryPackage):
-  """The library package."""
+# Included files with these extensions are already compressed, so are stored.
+_COMPRESSED_EXTENSIONS = frozenset([
+    '.bz2', '.gif', '.gz', '.jar', '.jpeg', '.jpg', '.png', '.war', '.xz',
+    '.zip'])
+# How much of an included file to copy at a time.
+_COPY_CHUNK_SIZE = 1 << 16
 
-  class _Buffer(object):
-    """An in memory buffer for a file contents.
+# Compressed entries are deflated in blocks of this many bytes, which can be
+# compressed in parallel. Every block but the last of an entry ends with a
+# sync flush, so the deflated blocks concatenate into one deflate stream.
+_DEFLATE_BLOCK_SIZE = 1 << 17
+# How many writes, per compression thread, may wait for deflated blocks.
+_PENDING_BLOCKS_PER_THREAD = 4
 
-    This implements the StringIO interface, but never interprets strings as
-    unicode.  It also implements most of a file like interface.
+# Names of the compression methods, as accepted by --compression.
+COMPRESSION_METHODS = {
+    'deflated': zipfile.ZIP_DEFLATED,
+    'stored': zipfile.ZIP_STORED,
+    }
 
-    When AppEngine move to Python 2.6, we may be able to use the io module
-    instead of this.
-    """
-    # Suppress spurious warnings about methods write, close, and getValue.
-    # pylint: disable-msg=C6409
+# The offset of the CRC and sizes within a local file header.
+_LOCAL_HEADER_CRC_OFFSET = 14
+_DATA_DESCRIPTOR = '<4s3L'
+_DATA_DESCRIPTOR_SIGNATURE = 'PK\007\010'
+# General purpose flag bit 3: the CRC and sizes follow the entry data.
+_DATA_DESCRIPTOR_FLAG = 0x08
 
-    def __init__(self):
-      self._buffer = array.array('c')
+_ZIP_VERSION = 20
+_ZIP_CREATE_SYSTEM_UNIX = 3
+# This is a chmod 0644, but you have to read the zipfile sources to know
+_ZIP_EXTERNAL_ATTR = 0644 << 16
+# Without Zip64 extensions, sizes and offsets must fit in 32 bits.
+_ZIP_LIMIT = 0xffffffff
+_ZIP_MAX_ENTRIES = 0xffff
+# 1980-01-01 00:00:00 UTC, the earliest time a zip entry can be stamped with.
+_ZIP_MIN_TIME = 315532800
 
-    #
-    # StringIO methods
-    #
 
-    def write(self, s):
-      self._buffer.fromstring(s)
+class ZipLibraryPackage(LibraryPackage):
+  """The library package.
 
-    def close(self):
-      self._buffer = None
+  Entries are streamed into the archive as they are written, so only a
+  constant amount of each one is held in memory. The CRC and sizes of an entry
+  are filled in by seeking back to its header when the output stream allows
+  it. Otherwise, compressed entries are followed by a data descriptor and
+  uncompressed ones are spooled.
+
+  Compressed entries are cut into blocks which are deflated by a pool of
+  threads, while the archive is still written strictly in order.
+  """
+
+  class _EntryWriter(object):
+    """A file-like object which checksums an entry and passes it on in blocks."""
+    # Suppress spurious warnings about methods write, close, and flush.
+    # pylint: disable-msg=C6409
+
+    def __init__(self, entry, sink, block_size=None):
+      """Create an _EntryWriter.
 
-    def getvalue(self):
-      return self._buffer.tostring()
+      Args:
+        entry: (_ZipEntry) The entry being written. Its CRC and size are
+          updated as data is written.
+        sink: (callable) Called with each block of entry data, and whether it
+          is the last one.
+        block_size: (int) The size of the blocks to pass to the sink. If None,
+          data is passed on as it is written.
+      """
+      self._entry = entry
+      self._sink = sink
+      self._block_size = block_size
+      self._block = []
+      self._block_length = 0
 
-    #
-    # file methods
-    #
+    def write(self, s):
+      if self._sink is None:
+        raise ValueError('I/O operation on closed file')
+      if isinstance(s, unicode):
+        s = str(s)
+      if not s:
+        return
+      self._entry.crc = binascii.crc32(s, self._entry.crc)
+      self._entry.file_size += len(s)
+      if not self._block_size:
+        self._sink(s, False)
+        return
+      self._block.append(s)
+      self._block_length += len(s)
+      if self._block_length >= self._block_size:
+        data = ''.join(self._block)
+        end = len(data) - len(data) % self._block_size
+        for start in xrange(0, end, self._block_size):
+          self._sink(data[start:start + self._block_size], False)
+        self._block = [data[end:]]
+        self._block_length = len(data) - end
 
     def tell(self):
-      return len(self._buffer.tostring())
+      return self._entry.file_size
 
     def flush(self):
       pass
 
-  def __init__(self, stream):
+    def close(self):
+      """Finish the entry, passing on the last block."""
+      if self._sink is None:
+        return
+      self._sink(''.join(self._block), True)
+      self._block = None
+      self._entry.crc &= 0xffffffff
+      self._sink = None
+
+  def __init__(self, stream, compression=zipfile.ZIP_STORED,
+               compression_level=None, compression_threads=None):
     """Create a new ZipLibraryPackage.
 
     Args:
-      stream: (file) A file-like object to write to.
+      stream: (file) A file-like object to write to. It need not be seekable.
+      compression: (int) zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+      compression_level: (int) The zlib compression level, from 0 to 9. If
+        None, zlib's default is used.
+      compression_threads: (int) The number of threads to deflate with. If
+        None, one per CPU is used.
+
+    Raises:
+      ValueError: if the compression method or level is not supported.
     """
     super(ZipLibraryPackage, self).__init__()
-    self._zip = zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED)
+    if compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+      raise ValueError('Unsupported zip compression method: %s' % compression)
+    if compression_level is None:
+      compression_level = zlib.Z_DEFAULT_COMPRESSION
+    elif not 0 <= compression_level <= 9:
+      raise ValueError('Unsupported zip compression level: %s'
+                       % compression_level)
+    self._stream = stream
+    self._compression = compression
+    self._compression_level = compression_level
+    self._compression_threads = compression_threads or _CpuCount()
+    self._pool = None
+    # Writes waiting for blocks being deflated by the pool, in archive order.
+    self._pending = collections.deque()
+    self._max_pending = 0
+    self._start = _SeekablePosition(stream)
+    # The number of bytes written to the stream.
+    self._offset = 0
+    self._entries = []
+    self._entry_count = 0
+    self._current_entry = None
     self._current_file_data = None
+    self._spool = None
 
   def StartFile(self, name):
     """Start writing a named file to the package.
@@ -88,23 +202,86 @@ class ZipLibraryPackage(LibraryPackage):
 
     Returns:
       A file-like object to write the contents to.
+
+    Raises:
+      zipfile.LargeZipFile: if the archive has too many entries.
+    """
+    return self._StartEntry(name, self._compression)
+
+  def IncludeFile(self, path, name):
+    """Read a file from disk into the archive.
+
+    Files which are already compressed, such as jars, are stored as they are,
+    rather than deflated again.
+
+    Args:
+      path: (str) path to the file.
+      name: (str) name the file should have in the archive.
+    """
+    if os.path.splitext(name)[1].lower() not in _COMPRESSED_EXTENSIONS:
+      super(ZipLibraryPackage, self).IncludeFile(path, name)
+      return
+    output_stream = self._StartEntry(name, zipfile.ZIP_STORED)
+    input_stream = open(path, 'rb')
+    try:
+      shutil.copyfileobj(input_stream, output_stream, _COPY_CHUNK_SIZE)
+    finally:
+      input_stream.close()
+    self.EndFile()
+
+  def _StartEntry(self, name, compression):
+    """Start writing an entry with the given compression method.
+
+    Args:
+      name: (str) path which will identify the contents in the archive.
+      compression: (int) zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+
+    Returns:
+      A file-like object to write the contents to.
+
+    Raises:
+      zipfile.LargeZipFile: if the archive has too many entries.
     """
     self.EndFile()
-    self._current_file_data = ZipLibraryPackage._Buffer()
-    self._current_file_name = '%s%s' % (self._file_path_prefix, name)
+    if self._entry_count >= _ZIP_MAX_ENTRIES:
+      raise zipfile.LargeZipFile('Zip file would have more than %d entries'
+                                 % _ZIP_MAX_ENTRIES)
+    self._entry_count += 1
+    # Note: Forcing the file name to utf-8 is needed for Python 2.5.
+    entry = _ZipEntry('%s%s' % (self._file_path_prefix, name), compression)
+    if compression == zipfile.ZIP_DEFLATED:
+      if self._start is None:
+        entry.flag_bits |= _DATA_DESCRIPTOR_FLAG
+      self._Enqueue(functools.partial(self._WriteLocalHeader, entry))
+      self._current_file_data = ZipLibraryPackage._EntryWriter(
+          entry, functools.partial(self._DeflateData, entry),
+          _DEFLATE_BLOCK_SIZE)
+    else:
+      # Stored entries are written directly, so first finish whatever is
+      # waiting to be deflated.
+      while self._pending:
+        self._pending.popleft()()
+      if self._start is None:
+        self._spool = tempfile.SpooledTemporaryFile(_SPOOL_MEMORY_LIMIT)
+      else:
+        self._WriteLocalHeader(entry)
+      self._current_file_data = ZipLibraryPackage._EntryWriter(
+          entry, functools.partial(self._StoreData, entry))
+    self._current_entry = entry
     return self._current_file_data
 
   def EndFile(self):
-    """Flush the current output file to the ZIP container."""
-    if self._current_file_data:
-      # Note: Forcing the file name to utf-8 is needed for Python 2.5.
-      info = zipfile.ZipInfo(self._current_file_name.encode('utf-8'),
-                             date_time=time.localtime(time.time())[:6])
-      # This is a chmod 0644, but you have to read the zipfile sources to know
-      info.external_attr = 0644 << 16
-      self._zip.writestr(info, self._current_file_data.getvalue())
-      self._current_file_data.close()
-      self._current_file_data = None
+    """Finish the current output file in the ZIP container.
+
+    The end of a compressed entry may not be written until its last blocks
+    have been deflated.
+    """
+    if self._current_file_data is None:
+      return
+    self._current_file_data.close()
+    self._current_file_data = None
+    self._Enqueue(functools.partial(self._FinishEntry, self._current_entry))
+    self._current_entry = None
 
   def DoneWritingArchive(self):
     """Signal that we are done writing the entire package.
@@ -112,7 +289,172 @@ class ZipLibraryPackage(LibraryPackage):
     This method must be called to flush the zip file directory to the output
     stream.
     """
-    if self._zip:
+    if self._stream is not None:
       self.EndFile()
-      self._zip.close()
-      self._zip = None
+      while self._pending:
+        self._pending.popleft()()
+      if self._pool:
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+      directory_offset = self._offset
+      for entry in self._entries:
+        self._Write(entry.CentralDirectoryRecord())
+      self._Write(struct.pack(
+          zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0,
+          len(self._entries), len(self._entries),
+          self._offset - directory_offset, directory_offset, 0))
+      self._stream.flush()
+      self._stream = None
+
+  def _Enqueue(self, operation):
+    """Queue a write, and perform the ones that have waited long enough.
+
+    Args:
+      operation: (callable) Performs the write, waiting for any block it
+        writes to be deflated.
+    """
+    self._pending.append(operation)
+    while len(self._pending) > self._max_pending:
+      self._pending.popleft()()
+
+  def _DeflateData(self, entry, data, last):
+    """Deflate a block of an entry, in the pool if there is one."""
+    if self._pool is None and self._compression_threads > 1:
+      self._pool = multiprocessing.pool.ThreadPool(self._compression_threads)
+      self._max_pending = (self._compression_threads
+                           * _PENDING_BLOCKS_PER_THREAD)
+    if self._pool:
+      deflated = self._pool.apply_async(
+          _Deflate, (data, self._compression_level, last)).get
+    else:
+      deflated = functools.partial(_Deflate, data, self._compression_level,
+                                   last)
+    self._Enqueue(lambda: self._StoreData(entry, deflated(), last))
+
+  def _StoreData(self, entry, data, unused_last):
+    if data:
+      entry.compress_size += len(data)
+      if self._spool is not None:
+        self._spool.write(data)
+      else:
+        self._Write(data)
+
+  def _WriteLocalHeader(self, entry):
+    entry.header_offset = self._offset
+    self._Write(entry.LocalHeader())
+
+  def _FinishEntry(self, entry):
+    """Record the CRC and sizes of an entry, once all of it is written.
+
+    Args:
+      entry: (_ZipEntry) The entry to finish.
+
+    Raises:
+      zipfile.LargeZipFile: if the entry or archive is too large.
+    """
+    if max(entry.compress_size, entry.file_size, self._offset) > _ZIP_LIMIT:
+      raise zipfile.LargeZipFile('Zip file would require Zip64 extensions: %s'
+                                 % entry.name)
+    if self._spool is not None:
+      self._WriteLocalHeader(entry)
+      self._spool.seek(0)
+      shutil.copyfileobj(self._spool, _Sink(self._Write))
+      self._spool.close()
+      self._spool = None
+    elif entry.flag_bits & _DATA_DESCRIPTOR_FLAG:
+      self._Write(struct.pack(_DATA_DESCRIPTOR, _DATA_DESCRIPTOR_SIGNATURE,
+                              entry.crc, entry.compress_size, entry.file_size))
+    else:
+      self._stream.seek(self._start + entry.header_offset
+                        + _LOCAL_HEADER_CRC_OFFSET)
+      self._stream.write(struct.pack('<3L', entry.crc, entry.compress_size,
+                                     entry.file_size))
+      self._stream.seek(self._start + self._offset)
+    self._entries.append(entry)
+
+  def _Write(self, data):
+    self._stream.write(data)
+    self._offset += len(data)
+
+
+class _ZipEntry(object):
+  """The header fields of one member of a zip file."""
+
+  def __init__(self, name, compress_type):
+    self.name = name.encode('utf-8')
+    self.compress_type = compress_type
+    self.flag_bits = 0
+    year, month, day, hour, minute, second = _EntryDateTime()
+    self.dosdate = (year - 1980) << 9 | month << 5 | day
+    self.dostime = hour << 11 | minute << 5 | second // 2
+    self.crc = 0
+    self.compress_size = 0
+    self.file_size = 0
+    self.header_offset = 0
+
+  def LocalHeader(self):
+    """Returns the local file header, which precedes the entry data."""
+    return struct.pack(
+        zipfile.structFileHeader, zipfile.stringFileHeader, _ZIP_VERSION, 0,
+        self.flag_bits, self.compress_type, self.dostime, self.dosdate,
+        self.crc, self.compress_size, self.file_size, len(self.name),
+        0) + self.name
+
+  def CentralDirectoryRecord(self):
+    """Returns the entry's record in the central directory."""
+    return struct.pack(
+        zipfile.structCentralDir, zipfile.stringCentralDir, _ZIP_VERSION,
+        _ZIP_CREATE_SYSTEM_UNIX, _ZIP_VERSION, 0, self.flag_bits,
+        self.compress_type, self.dostime, self.dosdate, self.crc,
+        self.compress_size, self.file_size, len(self.name), 0, 0, 0, 0,
+        _ZIP_EXTERNAL_ATTR, self.header_offset) + self.name
+
+
+class _Sink(object):
+  """Adapts a write function to the file interface of shutil.copyfileobj."""
+
+  def __init__(self, write):
+    self.write = write
+
+
+def _EntryDateTime():
+  """Returns the date and time to stamp on an entry, as a 6-tuple."""
+  epoch = utilities.SourceDateEpoch()
+  if epoch is None:
+    return time.localtime(time.time())[:6]
+  # Zip timestamps can not express times before 1980.
+  return time.gmtime(max(epoch, _ZIP_MIN_TIME))[:6]
+
+
+def _Deflate(data, level, last):
+  """Deflate one block of an entry.
+
+  Args:
+    data: (str) The block.
+    level: (int) The zlib compression level.
+    last: (bool) Whether this is the last block of the entry.
+  Returns:
+    The raw deflate data for the block.
+  """
+  compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+  if last:
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH)
+  return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _CpuCount():
+  try:
+    return multiprocessing.cpu_count()
+  except NotImplementedError:
+    return 1
+
+
+def _SeekablePosition(stream):
+  """Returns the current position of a stream, or None if it can not seek."""
+  try:
+    position = stream.tell()
+    stream.seek(position)
+  except (AttributeError, IOError):
+    return None
+  return position
@@ -29,6 +29,22 @@ from googleapis.codegen import zip_library_package
 FLAGS = flags.FLAGS
 
 
+class _UnseekableStream(object):
+  """A write only stream, like a pipe."""
+
+  def __init__(self):
+    self._buffer = cStringIO.StringIO()
+
+  def write(self, s):
+    self._buffer.write(s)
+
+  def flush(self):
+    pass
+
+  def getvalue(self):
+    return self._buffer.getvalue()
+
+
 class ZipLibraryPackageTest(basetest.TestCase):
   _FILE_NAME = 'a_test'
   _FILE_CONTENTS = 'this is a test'
@@ -139,6 +155,123 @@ class ZipLibraryPackageTest(basetest.TestCase):
     expected_name = '%s/%s' % (prefix, self._FILE_NAME)
     self.assertEquals(expected_name, info_list[0].filename)
 
+  def _WriteAndReadBack(self, package, output_stream):
+    contents = [self._FILE_CONTENTS * 1000, '', 'x' * 5]
+    for i, content in enumerate(contents):
+      stream = package.StartFile('%s_%d' % (self._FILE_NAME, i))
+      for start in range(0, len(content), 1000):
+        stream.write(content[start:start + 1000])
+      self.assertEquals(len(content), stream.tell())
+    package.DoneWritingArchive()
+
+    archive = zipfile.ZipFile(cStringIO.StringIO(output_stream.getvalue()),
+                              'r')
+    self.assertEquals(None, archive.testzip())
+    info_list = archive.infolist()
+    self.assertEquals(len(contents), len(info_list))
+    for info, content in zip(info_list, contents):
+      self.assertEquals(content, archive.read(info.filename))
+      self.assertEquals(0644, info.external_attr >> 16)
+    return info_list
+
+  def testDeflated(self):
+    package = zip_library_package.ZipLibraryPackage(self._output_stream,
+                                                    zipfile.ZIP_DEFLATED)
+    info_list = self._WriteAndReadBack(package, self._output_stream)
+    self.assertEquals(zipfile.ZIP_DEFLATED, info_list[0].compress_type)
+    self.assertTrue(info_list[0].compress_size < info_list[0].file_size)
+    # The sizes were patched into the header, so no descriptor is needed.
+    self.assertFalse(info_list[0].flag_bits & 0x08)
+
+  def testUnseekableStream(self):
+    output_stream = _UnseekableStream()
+    package = zip_library_package.ZipLibraryPackage(output_stream)
+    info_list = self._WriteAndReadBack(package, output_stream)
+    # Stored entries must not use data descriptors, for the sake of Java.
+    self.assertFalse(info_list[0].flag_bits & 0x08)
+
+  def testUnseekableStreamDeflated(self):
+    output_stream = _UnseekableStream()
+    package = zip_library_package.ZipLibraryPackage(output_stream,
+                                                    zipfile.ZIP_DEFLATED)
+    info_list = self._WriteAndReadBack(package, output_stream)
+    self.assertTrue(info_list[0].flag_bits & 0x08)
+
+  def testNestedArchive(self):
+    outer_stream = self._package.StartFile('inner.jar')
+    inner = zip_library_package.ZipLibraryPackage(outer_stream,
+                                                  zipfile.ZIP_DEFLATED)
+    stream = inner.StartFile(self._FILE_NAME)
+    stream.write(self._FILE_CONTENTS)
+    inner.DoneWritingArchive()
+    self._package.DoneWritingArchive()
+
+    archive = zipfile.ZipFile(
+        cStringIO.StringIO(self._output_stream.getvalue()), 'r')
+    inner_archive = zipfile.ZipFile(
+        cStringIO.StringIO(archive.read('inner.jar')), 'r')
+    self.assertEquals(self._FILE_CONTENTS,
+                      inner_archive.read(self._FILE_NAME))
+
+  def testParallelDeflate(self):
+    # Several blocks per entry, written in pieces which straddle the blocks.
+    contents = [''.join('line %d of file %d\n' % (line, i)
+                        for line in xrange(40000))
+                for i in xrange(3)]
+    for output_stream in (cStringIO.StringIO(), _UnseekableStream()):
+      package = zip_library_package.ZipLibraryPackage(
+          output_stream, zipfile.ZIP_DEFLATED, compression_level=9,
+          compression_threads=4)
+      for i, content in enumerate(contents):
+        stream = package.StartFile('file_%d' % i)
+        for start in xrange(0, len(content), 10000):
+          stream.write(content[start:start + 10000])
+      package.DoneWritingArchive()
+
+      archive = zipfile.ZipFile(
+          cStringIO.StringIO(output_stream.getvalue()), 'r')
+      self.assertEquals(None, archive.testzip())
+      self.assertEquals(['file_0', 'file_1', 'file_2'], archive.namelist())
+      for i, content in enumerate(contents):
+        self.assertEquals(content, archive.read('file_%d' % i))
+
+  def testIncludedArchivesAreStored(self):
+    package = zip_library_package.ZipLibraryPackage(self._output_stream,
+                                                    zipfile.ZIP_DEFLATED)
+    text_path = os.path.join(self._TEST_DATA_DIR, 'file1.txt')
+    jar_path = os.path.join(self._TEST_DATA_DIR, 'tree/abc')
+    package.IncludeFile(text_path, 'file1.txt')
+    package.IncludeFile(jar_path, 'lib/abc.jar')
+    package.DoneWritingArchive()
+
+    archive = zipfile.ZipFile(
+        cStringIO.StringIO(self._output_stream.getvalue()), 'r')
+    self.assertEquals(zipfile.ZIP_DEFLATED,
+                      archive.getinfo('file1.txt').compress_type)
+    self.assertEquals(zipfile.ZIP_STORED,
+                      archive.getinfo('lib/abc.jar').compress_type)
+    self.assertEquals(open(jar_path, 'rb').read(), archive.read('lib/abc.jar'))
+
+  def testSourceDateEpoch(self):
+    os.environ['SOURCE_DATE_EPOCH'] = '1300000000'
+    try:
+      stream = self._package.StartFile(self._FILE_NAME)
+      stream.write(self._FILE_CONTENTS)
+      self._package.DoneWritingArchive()
+    finally:
+      del os.environ['SOURCE_DATE_EPOCH']
+
+    archive = zipfile.ZipFile(
+        cStringIO.StringIO(self._output_stream.getvalue()), 'r')
+    self.assertEquals((2011, 3, 13, 7, 6, 40),
+                      archive.infolist()[0].date_time)
+
+  def testUnsupportedCompression(self):
+    self.assertRaises(ValueError, zip_library_package.ZipLibraryPackage,
+                      self._output_stream, 99)
+    self.assertRaises(ValueError, zip_library_package.ZipLibraryPackage,
+                      self._output_stream, zipfile.ZIP_DEFLATED, 10)
+
 
 if __name__ == '__main__':
   basetest.main()